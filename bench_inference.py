@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server"))
+
+import numpy as np
+import torch
+
+from tts_engine import TextToSpeechEngine
+from audio_format import SAMPLE_RATE
+from inference_backends import audio_similarity
+
+# Default modes: precision, optionally "+" a vocoder backend; "onnx" (after export_onnx.py) runs onnxruntime
+MODES = ["fp32", "int8", "bf16", "fp32+trace", "fp32+compile", "int8+trace"]
+
+SENTENCES = [
+    "Once upon a time, in a village of twelve houses, there lived a little fox.",
+    "\"Why?\" asked the bear. \"Because I said so!\" laughed the owl.",
+    "They walked seven miles before stopping at four thirty for tea.",
+    "And so, with a yawn and a smile, everyone went to sleep.",
+]
+
+
+def load_sentences(args):
+    if not args.files:
+        return SENTENCES
+    sentences = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            sentences.extend(line.strip() for line in f if line.strip())
+    return sentences
+
+
+def parse_mode(mode):
+    """(runtime, precision, vocoder backend) of a mode"""
+    if mode == "onnx":
+        return "onnx", "fp32", "eager"
+    precision, _, vocoder_backend = mode.partition("+")
+    return "torch", precision, vocoder_backend or "eager"
+
+
+def load_engine(args, mode):
+    runtime, precision, vocoder_backend = parse_mode(mode)
+    start = time.perf_counter()
+    engine = TextToSpeechEngine(
+        model_dir=args.model_dir,
+        cache_dir=tempfile.mkdtemp(prefix="bench-inference-"),
+        disk_cache_max_bytes=0,
+        precision=precision,
+        vocoder_backend=vocoder_backend,
+        runtime=runtime,
+    )
+    return engine, time.perf_counter() - start
+
+
+def synthesize(engine, sentences, voice_id, seed):
+    """Render every sentence on its own and return the waveforms"""
+    waveforms = []
+    for i, sentence in enumerate(sentences):
+        # The decoder prenet keeps dropout on at inference, seed it so modes are comparable
+        torch.manual_seed(seed + i)
+        if engine.onnx_model is not None:
+            engine.onnx_model.seed(seed + i)
+        waveforms.append(engine._synthesize_batch([sentence], [voice_id])[0])
+    return waveforms
+
+
+def bench(engine, sentences, voice_id, args):
+    # The first pass warms up allocators and lazily compiled kernels
+    synthesize(engine, sentences[:1], voice_id, args.seed)
+    best = float("inf")
+    waveforms = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        waveforms = synthesize(engine, sentences, voice_id, args.seed)
+        best = min(best, time.perf_counter() - start)
+    return waveforms, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference backends by real-time factor")
+    parser.add_argument("files", nargs="*", help="Text files with one sentence per line")
+    parser.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", "./models"))
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated precision[+vocoder backend] list")
+    parser.add_argument("--voice", default="slt")
+    parser.add_argument("--threads", type=int, default=0, help="PyTorch intra-op threads, 0 keeps the default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-similarity", type=float, default=0.9,
+                        help="Lowest spectral similarity to the fp32 output a mode may have")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    sentences = load_sentences(args)
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    if "fp32" in modes:
+        modes.remove("fp32")
+    modes.insert(0, "fp32")
+    print(f"{len(sentences)} sentences, {torch.get_num_threads()} threads")
+    print(f"{'mode':<16} {'load':>7} {'compute':>8} {'audio':>7} {'RTF':>7} {'speedup':>8} {'similarity':>11} {'length':>7}")
+
+    baseline = None
+    failed = []
+    for mode in modes:
+        engine, load_time = load_engine(args, mode)
+        voice_id = engine._resolve_voice_id(args.voice)
+        waveforms, compute = bench(engine, sentences, voice_id, args)
+        engine.batch_scheduler.shutdown()
+
+        audio_seconds = sum(len(w) for w in waveforms) / SAMPLE_RATE
+        # Real-time factor: seconds of compute per second of audio, below 1 is faster than real time
+        rtf = compute / audio_seconds
+        if baseline is None:
+            baseline = (waveforms, rtf)
+        scores = [audio_similarity(ref, out) for ref, out in zip(baseline[0], waveforms)]
+        similarity = min(score for score, _ in scores)
+        length_ratio = float(np.mean([ratio for _, ratio in scores]))
+        _, precision, vocoder_backend = parse_mode(mode)
+        # Modes the machine cannot run fall back to fp32 / eager
+        fallback = (engine.precision, engine.vocoder_backend) != (precision, vocoder_backend)
+
+        passed = similarity >= args.min_similarity and 0.8 <= length_ratio <= 1.25
+        if not passed:
+            failed.append(mode)
+        print(f"{mode:<16} {load_time:6.1f}s {compute:7.2f}s {audio_seconds:6.1f}s {rtf:7.3f} "
+              f"{baseline[1] / rtf:7.2f}x {similarity:11.3f} {length_ratio:7.2f}"
+              f"{'' if passed else '  FAIL'}"
+              f"{f'  (ran as {engine.precision}+{engine.vocoder_backend})' if fallback else ''}")
+
+    if failed:
+        print(f"Below the similarity threshold: {', '.join(failed)}")
+        sys.exit(1)
+    print("All modes within the similarity threshold")
+
+
+if __name__ == "__main__":
+    main()
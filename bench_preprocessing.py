@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server"))
+
+from num2words import num2words
+import text_preprocessing as tp
+
+# Sentence templates for a synthetic storybook corpus, when no files are given
+TEMPLATES = [
+    "Once upon a time, in a village of {n} houses, there lived a little fox.",
+    "On {date}, the {ord} day of the fair, she bought {cur}{n}.{d2} worth of apples.",
+    "The clock struck {h}:{m2} and {n} owls began to sing.",
+    "Nearly {n}% of the forest was covered in snow by the {ord} morning.",
+    "\"Why?\" asked the bear. \"Because I said so!\" laughed the owl.",
+    "They walked {n} miles before stopping at {h}:{m2} for tea.",
+    "The old map, drawn on {date}, promised {cur}{n} in gold to the {ord} traveller.",
+    "And so, with a yawn and a smile, everyone went to sleep.",
+]
+
+
+def legacy_normalize(text):
+    """The multi-pass normalization used before normalize_numbers()"""
+    text = unicodedata.normalize("NFKC", text)
+    text = tp.convert_currency(text)
+    text = tp.convert_percentages(text)
+    text = tp.convert_ordinals(text)
+    text = tp.convert_time(text)
+    text = tp.convert_dates(text)
+    text = re.sub(r'\b\d+\b', lambda x: num2words(int(x.group())), text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def ordinal_suffix(n):
+    if 10 <= n % 100 <= 20:
+        return "th"
+    return {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+
+
+def make_story(rng, sentences):
+    parts = []
+    for _ in range(sentences):
+        o = rng.randint(1, 31)
+        parts.append(rng.choice(TEMPLATES).format(
+            n=rng.choice([rng.randint(0, 12), rng.randint(0, 100), rng.randint(0, 5000)]),
+            d2=f"{rng.randint(0, 99):02d}",
+            ord=f"{o}{ordinal_suffix(o)}",
+            h=rng.randint(1, 12),
+            m2=f"{rng.randint(0, 59):02d}",
+            cur=rng.choice("$€£"),
+            date=f"{rng.randint(1900, 2030)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        ))
+    return " ".join(parts)
+
+
+def load_corpus(args):
+    if args.files:
+        stories = []
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                # Each paragraph is normalized on its own, like one request
+                stories.extend(p for p in f.read().split("\n\n") if p.strip())
+        return stories
+
+    rng = random.Random(args.seed)
+    stories = []
+    size = 0
+    while size < args.size_mb * 1024 * 1024:
+        story = make_story(rng, rng.randint(5, 60))
+        stories.append(story)
+        size += len(story.encode("utf-8"))
+    return stories
+
+
+def bench(name, fn, stories, total_mb, repeat):
+    best = float("inf")
+    outputs = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [fn(story) for story in stories]
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<28} {best:8.3f}s  {total_mb / best:8.2f} MB/s")
+    return outputs, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text normalization throughput")
+    parser.add_argument("files", nargs="*", help="Story files (paragraphs separated by blank lines)")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Size of the synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stories = load_corpus(args)
+    total_mb = sum(len(s.encode("utf-8")) for s in stories) / (1024 * 1024)
+    print(f"Corpus: {len(stories)} stories, {total_mb:.2f} MB")
+
+    legacy_out, legacy_time = bench("multi-pass (legacy)", legacy_normalize, stories, total_mb, args.repeat)
+    single_out, single_time = bench("single-pass normalize_text", tp.normalize_text, stories, total_mb, args.repeat)
+    bench("preprocess_for_tts", tp.preprocess_for_tts, stories, total_mb, args.repeat)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(legacy_out, single_out)) if a != b]
+    print(f"Speedup: {legacy_time / single_time:.2f}x")
+    if mismatches:
+        print(f"Output differs for {len(mismatches)} stories, first: {stories[mismatches[0]][:200]!r}")
+        sys.exit(1)
+    print("Outputs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import json
+import uuid
+from urllib.parse import quote
+
+from fastapi import Response
+
+JSON_MEDIA_TYPE = "application/json"
+MULTIPART_MEDIA_TYPE = "multipart/mixed"
+
+# Media type -> audio format name used by the gRPC service
+AUDIO_MEDIA_TYPES = {
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/flac": "flac",
+}
+
+# Audio format name from the gRPC reply -> media type of the response body
+FORMAT_MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+    "mp3": "audio/mpeg",
+    "flac": "audio/flac",
+}
+
+# Chunk texts only go in a header when small; proxies commonly cap headers around 8 KB
+MAX_CHUNKS_HEADER_BYTES = 4096
+
+
+def parse_accept(accept):
+    """Media ranges from an Accept header as (media type, q), highest preference first"""
+    ranges = []
+    for position, item in enumerate(accept.split(",")):
+        parts = [part.strip() for part in item.split(";")]
+        media_type = parts[0].lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranges.append((media_type, q, position))
+    # Stable on position so equally weighted types keep the client's order
+    ranges.sort(key=lambda r: (-r[1], r[2]))
+    return [(media_type, q) for media_type, q, _ in ranges if q > 0]
+
+
+def negotiate(accept, audio_media_types=AUDIO_MEDIA_TYPES):
+    """Pick the response media type for an Accept header, or None when nothing offered is acceptable.
+
+    JSON is the default (no Accept header, */*) so existing clients keep working.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    for media_type, _ in parse_accept(accept):
+        if media_type in (JSON_MEDIA_TYPE, "*/*", "application/*"):
+            return JSON_MEDIA_TYPE
+        if media_type == MULTIPART_MEDIA_TYPE:
+            return MULTIPART_MEDIA_TYPE
+        if media_type == "audio/*":
+            return next(iter(audio_media_types))
+        if media_type in audio_media_types:
+            return media_type
+    return None
+
+
+def metadata_headers(chunks, time_taken):
+    headers = {
+        "X-Time-Taken": f"{time_taken:.3f}",
+        "X-Chunk-Count": str(len(chunks)),
+    }
+    encoded = quote(json.dumps(list(chunks), ensure_ascii=False))
+    if len(encoded) <= MAX_CHUNKS_HEADER_BYTES:
+        headers["X-Chunks"] = encoded
+    return headers
+
+
+def audio_response(audio, media_type, chunks, time_taken):
+    """Raw audio body; chunk texts and timings travel in headers"""
+    headers = metadata_headers(chunks, time_taken)
+    headers["Vary"] = "Accept"
+    return Response(content=audio, media_type=media_type, headers=headers)
+
+
+def multipart_response(audio, audio_media_type, metadata):
+    """A JSON metadata part followed by the raw audio part, for clients that need every chunk text"""
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\nContent-Type: {JSON_MEDIA_TYPE}\r\n\r\n".encode("ascii"),
+        json.dumps(metadata, ensure_ascii=False).encode("utf-8"),
+        f"\r\n--{boundary}\r\nContent-Type: {audio_media_type}\r\nContent-Length: {len(audio)}\r\n\r\n".encode("ascii"),
+        audio,
+        f"\r\n--{boundary}--\r\n".encode("ascii"),
+    ])
+    return Response(
+        content=body,
+        media_type=f'{MULTIPART_MEDIA_TYPE}; boundary="{boundary}"',
+        headers={"Vary": "Accept"},
+    )
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from common import service_pb2_grpc
+
+logger = logging.getLogger("grpc_channels")
+
+HEALTH_SERVICE_NAME = "tts.TTSService"
+
+
+def channel_options(max_message_mb=64, keepalive_time_ms=30000, keepalive_timeout_ms=10000):
+    """Options for long-lived channels carrying multi-MB audio replies"""
+    max_message_bytes = max_message_mb * 1024 * 1024
+    return [
+        ("grpc.max_receive_message_length", max_message_bytes),
+        ("grpc.max_send_message_length", max_message_bytes),
+        # Notice dead connections (server restarts, idle NAT timeouts) before a request is sent on them
+        ("grpc.keepalive_time_ms", keepalive_time_ms),
+        ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        # A dns:/// target resolving to several replicas gets a subchannel per address
+        ("grpc.lb_policy_name", "round_robin"),
+    ]
+
+
+class ChannelPool:
+    """Process-wide grpc.aio channels to the TTS servers, created once and reused by every request.
+
+    Each target gets `channels_per_target` channels (separate HTTP/2 connections, so
+    concurrent streams are not all multiplexed on one socket) and stubs are handed out
+    round-robin across all of them. Must be created and used on the event loop that
+    serves the requests.
+    """
+
+    def __init__(self, targets, channels_per_target=1, options=None):
+        if not targets:
+            raise ValueError("At least one gRPC target is required")
+
+        self.targets = list(targets)
+        options = options if options is not None else channel_options()
+
+        self._channels = []
+        for target in self.targets:
+            for _ in range(channels_per_target):
+                self._channels.append((target, grpc.aio.insecure_channel(target, options=options)))
+        self._stubs = [service_pb2_grpc.TTSServiceStub(channel) for _, channel in self._channels]
+        self._health_stubs = [health_pb2_grpc.HealthStub(channel) for _, channel in self._channels]
+
+        self._next = 0
+        logger.info(f"Opened {len(self._channels)} gRPC channels to {', '.join(self.targets)}")
+
+    def stub(self):
+        # Only called from the event loop thread, so no lock is needed
+        stub = self._stubs[self._next]
+        self._next = (self._next + 1) % len(self._stubs)
+        return stub
+
+    async def _check(self, health_stub, timeout):
+        try:
+            response = await health_stub.Check(
+                health_pb2.HealthCheckRequest(service=HEALTH_SERVICE_NAME),
+                timeout=timeout,
+            )
+            return health_pb2.HealthCheckResponse.ServingStatus.Name(response.status)
+        except grpc.RpcError as rpc_error:
+            return rpc_error.code().name
+
+    async def check_health(self, timeout=2.0):
+        """Probe the grpc_health service over every channel at once; returns {target: status name}"""
+        results = await asyncio.gather(*(self._check(health_stub, timeout) for health_stub in self._health_stubs))
+        statuses = {}
+        for (target, _), status in zip(self._channels, results):
+            # With several channels per target, any one that is not serving marks the target down
+            if statuses.get(target, "SERVING") == "SERVING":
+                statuses[target] = status
+        return statuses
+
+    async def close(self, grace=None):
+        await asyncio.gather(*(channel.close(grace) for _, channel in self._channels))
+        logger.info(f"Closed {len(self._channels)} gRPC channels")
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel, Field
 import grpc
 import base64
@@ -8,10 +8,22 @@ import time
 import traceback
 import logging
 import os
-import io
-from typing import List
+import json
+import ipaddress
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
 from common import service_pb2, service_pb2_grpc
+from grpc_channels import ChannelPool, channel_options
+from audio_responses import (
+    negotiate,
+    audio_response,
+    multipart_response,
+    JSON_MEDIA_TYPE,
+    MULTIPART_MEDIA_TYPE,
+    AUDIO_MEDIA_TYPES,
+    FORMAT_MEDIA_TYPES,
+)
 
 log_dir = os.environ.get("LOG_DIR", ".client/logs")
 if not os.path.exists(log_dir):
@@ -28,12 +40,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger("rest_gateway")
 
+# Created once per gateway process and shared by all requests
+channel_pool = None
+
+# Reverse proxies (addresses or CIDR ranges) whose X-Client-Id header names the end user
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.environ.get("TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+def grpc_targets():
+    # GRPC_SERVERS lists replicas ("tts-1:50051,tts-2:50051"); a single "dns:///tts:50051"
+    # target is balanced across every address the name resolves to
+    targets = os.environ.get("GRPC_SERVERS") or os.environ.get("GRPC_SERVER", "server:50051")
+    return [target.strip() for target in targets.split(",") if target.strip()]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global channel_pool
+    channel_pool = ChannelPool(
+        grpc_targets(),
+        channels_per_target=int(os.environ.get("GRPC_CHANNELS_PER_TARGET", "1")),
+        options=channel_options(
+            max_message_mb=int(os.environ.get("GRPC_MAX_MESSAGE_MB", "64")),
+            keepalive_time_ms=int(os.environ.get("GRPC_KEEPALIVE_MS", "30000")),
+        ),
+    )
+    yield
+    await channel_pool.close()
+
 app = FastAPI(
     title="TTS API",
     description="Text-to-Speech API for generating audio from text",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -49,6 +91,10 @@ app.add_middleware(
 class TextInput(BaseModel):
     text: str = Field(..., description="The text to convert to speech", example="Hello, world!")
     voice: str = Field("Default", description="The voice to use for synthesis")
+    format: str = Field("wav", description="Audio encoding: wav, flac, ogg (Opus) or mp3. An audio/* Accept header takes precedence")
+    stop_threshold: Optional[float] = Field(None, description="Stop probability that ends a chunk; lower values cut chunks shorter")
+    min_len_ratio: Optional[float] = Field(None, description="Minimum decoder steps per text token, times the reduction factor")
+    max_len_ratio: Optional[float] = Field(None, description="Maximum decoder steps per text token, times the reduction factor; capped by the server")
 
 class AudioResponse(BaseModel):
     format: str = Field(..., description="Audio format (e.g., 'wav')")
@@ -56,16 +102,65 @@ class AudioResponse(BaseModel):
     chunks: List[str] = Field([], description="Text chunks used for synthesis")
     time_taken: float = Field(..., description="Time taken to generate audio in seconds")
 
-# Create a gRPC channel and stub
-def get_grpc_stub():
-    grpc_server = os.environ.get("GRPC_SERVER", "server:50051")
-    try:
-        channel = grpc.insecure_channel(grpc_server)
-        stub = service_pb2_grpc.TTSServiceStub(channel)
-        return stub
-    except Exception as e:
-        logger.error(f"Failed to create gRPC stub: {str(e)}")
+# Stub on one of the pooled channels; async so it runs on the event loop, not the threadpool
+async def get_grpc_stub():
+    if channel_pool is None:
         raise HTTPException(status_code=503, detail="TTS service unavailable")
+    return channel_pool.stub()
+
+def text_request(request: TextInput, audio_format):
+    # Decoding options left out of the body keep the server's defaults
+    decoding = {name: getattr(request, name) for name in ("stop_threshold", "min_len_ratio", "max_len_ratio")}
+    return service_pb2.TextRequest(
+        text=request.text,
+        voice=request.voice or "Default",
+        format=audio_format,
+        **{name: value for name, value in decoding.items() if value is not None},
+    )
+
+def is_trusted_proxy(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def client_metadata(request: Request):
+    # Lets the server apply per-client concurrency limits to the end user instead of the gateway.
+    # Any other caller could rotate X-Client-Id to get around them, so it is keyed by address
+    peer = request.client.host if request.client else "unknown"
+    client_id = request.headers.get("X-Client-Id") if is_trusted_proxy(peer) else None
+    return (("x-client-id", client_id or peer),)
+
+def retry_after_header(rpc_error):
+    for key, value in rpc_error.trailing_metadata() or ():
+        if key == "retry-after":
+            return {"Retry-After": value}
+    return None
+
+def http_error(rpc_error):
+    """HTTPException matching a failed gRPC call"""
+    error_code = rpc_error.code()
+    http_status = 500
+    headers = None
+
+    if error_code == grpc.StatusCode.INVALID_ARGUMENT:
+        http_status = 400
+    elif error_code == grpc.StatusCode.NOT_FOUND:
+        http_status = 404
+    elif error_code == grpc.StatusCode.DEADLINE_EXCEEDED:
+        http_status = 504
+    elif error_code == grpc.StatusCode.RESOURCE_EXHAUSTED:
+        http_status = 429
+        headers = retry_after_header(rpc_error)
+    elif error_code == grpc.StatusCode.UNAVAILABLE:
+        http_status = 503
+
+    logger.error(f"gRPC error {error_code}: {rpc_error.details()}")
+    return HTTPException(status_code=http_status, detail=f"TTS service error: {rpc_error.details()}", headers=headers)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
@@ -78,90 +173,162 @@ async def add_process_time_header(request: Request, call_next):
 # Health check endpoint
 @app.get("/health", summary="Health Check", tags=["Health"])
 async def health_check():
-    try:
-        stub = get_grpc_stub()
-        return {"status": "healthy", "dependencies": {"grpc_server": "up"}}
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return {"status": "unhealthy", "dependencies": {"grpc_server": "down"}, "details": str(e)}, 503
+    # Asks each server's grpc_health service, so a server that is up but not serving counts as down
+    statuses = {}
+    if channel_pool is not None:
+        statuses = await channel_pool.check_health(timeout=float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2")))
+    healthy = any(status == "SERVING" for status in statuses.values())
+    if not healthy:
+        logger.error(f"Health check failed: {statuses}")
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={
+            "status": "healthy" if healthy else "unhealthy",
+            "dependencies": {"grpc_server": "up" if healthy else "down"},
+            "servers": statuses,
+        },
+    )
 
-# Main generation endpoint
-@app.post("/generate", response_model=AudioResponse, summary="Generate speech from text", tags=["TTS"])
-def generate_tts(request: TextInput, stub: service_pb2_grpc.TTSServiceStub = Depends(get_grpc_stub)):
+# Main generation endpoint; the response body follows the Accept header:
+# JSON with base64 audio (default), raw audio with metadata in X-* headers, or
+# multipart/mixed with a JSON part and a raw audio part
+@app.post(
+    "/generate",
+    response_model=AudioResponse,
+    summary="Generate speech from text",
+    tags=["TTS"],
+    responses={200: {"content": {media_type: {} for media_type in [MULTIPART_MEDIA_TYPE, *AUDIO_MEDIA_TYPES]}}},
+)
+async def generate_tts(request: TextInput, http_request: Request, response: Response, stub: service_pb2_grpc.TTSServiceStub = Depends(get_grpc_stub)):
     start_time = time.time()
 
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Input text cannot be empty.")
 
+    media_type = negotiate(http_request.headers.get("accept"))
+    if media_type is None:
+        supported = ", ".join([JSON_MEDIA_TYPE, MULTIPART_MEDIA_TYPE, *AUDIO_MEDIA_TYPES])
+        raise HTTPException(status_code=406, detail=f"Supported response types: {supported}")
+    # A specific audio media type fixes the encoding, otherwise the body's format field decides
+    audio_format = AUDIO_MEDIA_TYPES.get(media_type, request.format)
+
     try:
         logger.info(f"Received TTS request: text='{request.text[:50]}...', voice='{request.voice}'")
-        grpc_request = service_pb2.TextRequest(text=request.text, voice=request.voice or "Default")
+        grpc_request = text_request(request, audio_format)
         
-        grpc_response = stub.Generate(grpc_request, timeout=60.0)
+        grpc_response = await stub.Generate(
+            grpc_request,
+            timeout=float(os.environ.get("GENERATE_TIMEOUT", "60")),
+            metadata=client_metadata(http_request),
+        )
         
-        b64_audio = base64.b64encode(grpc_response.audio_data).decode("utf-8")
         elapsed = time.time() - start_time
+        time_taken = grpc_response.time_taken or elapsed
+        chunks = list(grpc_response.chunks)
 
         logger.info(f"Successfully generated audio ({len(grpc_response.audio_data)} bytes) in {elapsed:.2f}s")
 
+        # Binary responses skip the base64 copy and its 33% size overhead
+        if media_type == MULTIPART_MEDIA_TYPE:
+            metadata = {"format": grpc_response.format, "chunks": chunks, "time_taken": time_taken}
+            return multipart_response(grpc_response.audio_data, FORMAT_MEDIA_TYPES[grpc_response.format], metadata)
+        if media_type != JSON_MEDIA_TYPE:
+            return audio_response(grpc_response.audio_data, media_type, chunks, time_taken)
+
+        response.headers["Vary"] = "Accept"
         return {
             "format": grpc_response.format,
-            "audio_data": b64_audio,
-            "chunks": list(grpc_response.chunks),
-            "time_taken": grpc_response.time_taken or elapsed
+            "audio_data": base64.b64encode(grpc_response.audio_data).decode("utf-8"),
+            "chunks": chunks,
+            "time_taken": time_taken
         }
 
     except grpc.RpcError as rpc_error:
-        error_code = rpc_error.code()
-        http_status = 500
-
-        if error_code == grpc.StatusCode.INVALID_ARGUMENT:
-            http_status = 400
-        elif error_code == grpc.StatusCode.NOT_FOUND:
-            http_status = 404
-        elif error_code == grpc.StatusCode.DEADLINE_EXCEEDED:
-            http_status = 504
-        elif error_code == grpc.StatusCode.RESOURCE_EXHAUSTED:
-            http_status = 429
-        elif error_code == grpc.StatusCode.UNAVAILABLE:
-            http_status = 503
-
-        logger.error(f"gRPC error {error_code}: {rpc_error.details()}")
-        raise HTTPException(status_code=http_status, detail=f"TTS service error: {rpc_error.details()}")
+        raise http_error(rpc_error)
 
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-# Streaming version of the generate endpoint
+# Streaming version of the generate endpoint. The body is one progressive file: for WAV
+# a header with an open-ended size followed by raw PCM as each chunk is synthesized (or a
+# continuous FLAC/Ogg/MP3 stream), sent with chunked transfer encoding. With
+# Accept: text/event-stream each chunk instead arrives as an SSE event carrying its
+# text, timing and base64 audio.
 @app.post("/generate/stream", summary="Stream speech generation", tags=["TTS"])
-async def stream_generate_tts(request: TextInput, stub: service_pb2_grpc.TTSServiceStub = Depends(get_grpc_stub)):
+async def stream_generate_tts(request: TextInput, http_request: Request, stub: service_pb2_grpc.TTSServiceStub = Depends(get_grpc_stub)):
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Input text cannot be empty.")
+
+    logger.info(f"Received streaming TTS request: text='{request.text[:50]}...', voice='{request.voice}'")
+    grpc_request = text_request(request, request.format)
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+    start_time = time.time()
+
+    # The deadline covers the whole stream; the server schedules and stops synthesis by it
+    call = stub.StreamGenerate(
+        grpc_request,
+        timeout=float(os.environ.get("STREAM_TIMEOUT", "300")),
+        metadata=client_metadata(http_request),
+    )
     try:
-        logger.info(f"Received streaming TTS request: text='{request.text[:50]}...', voice='{request.voice}'")
-        grpc_request = service_pb2.TextRequest(text=request.text, voice=request.voice or "Default")
-
-        def audio_stream_generator():
-            audio_buffer = io.BytesIO()
-            try:
-                for response in stub.StreamGenerate(grpc_request):
-                    audio_buffer.write(response.audio_data)
-                    yield response.audio_data
+        # Wait for the first chunk before answering, so admission and validation errors
+        # still map to a proper HTTP status instead of an empty 200
+        first = await call.read()
+    except grpc.RpcError as rpc_error:
+        raise http_error(rpc_error)
+    except BaseException:
+        call.cancel()
+        raise
 
-                logger.info(f"Completed streaming response, total size: {audio_buffer.tell()} bytes")
+    async def audio_stream_generator():
+        response = first
+        chunk_count = 0
+        total_bytes = 0
+        try:
+            while response is not grpc.aio.EOF:
+                chunk_count += 1
+                total_bytes += len(response.audio_data)
+                if use_sse:
+                    yield sse_event("chunk", {
+                        "index": response.chunk_index,
+                        "text": list(response.chunks),
+                        "format": response.format,
+                        "time_taken": response.time_taken,
+                        "elapsed": time.time() - start_time,
+                        "audio_data": base64.b64encode(response.audio_data).decode("ascii"),
+                    })
+                else:
+                    yield response.audio_data
+                response = await call.read()
 
-            except grpc.RpcError as rpc_error:
-                logger.error(f"gRPC streaming error: {rpc_error.details()}")
+            logger.info(f"Completed streaming response: {chunk_count} chunks, {total_bytes} bytes in {time.time() - start_time:.2f}s")
+            if use_sse:
+                yield sse_event("end", {"chunks": chunk_count, "bytes": total_bytes, "elapsed": time.time() - start_time})
 
-        return StreamingResponse(
-            audio_stream_generator(),
-            media_type="audio/wav",
-            headers={"X-Content-Type-Options": "nosniff"}
-        )
+        except grpc.RpcError as rpc_error:
+            # Headers are already sent; the truncated body (or an error event) is all we can signal
+            logger.error(f"gRPC streaming error: {rpc_error.details()}")
+            if use_sse:
+                yield sse_event("error", {"code": rpc_error.code().name, "detail": rpc_error.details()})
+        finally:
+            # The HTTP client went away mid-stream: cancel the RPC so the server stops synthesizing
+            call.cancel()
 
-    except Exception as e:
-        logger.error(f"Error in streaming endpoint: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Streaming error: {str(e)}")
+    headers = {
+        "X-Content-Type-Options": "nosniff",
+        "Cache-Control": "no-cache",
+        # Keep reverse proxies (nginx) from buffering the stream
+        "X-Accel-Buffering": "no",
+    }
+    if use_sse:
+        return StreamingResponse(audio_stream_generator(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(
+        audio_stream_generator(),
+        media_type=FORMAT_MEDIA_TYPES.get(request.format, "audio/wav"),
+        headers=headers
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -24,17 +24,17 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rservice.proto\x12\x03tts\">\n\x0bTextRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\r\n\x05voice\x18\x02 \x01(\t\x12\x12\n\nmessage_id\x18\x03 \x01(\t\"\x93\x01\n\nAudioReply\x12\x12\n\naudio_data\x18\x01 \x01(\x0c\x12\x0e\n\x06\x66ormat\x18\x02 \x01(\t\x12\x0e\n\x06\x63hunks\x18\x03 \x03(\t\x12\x12\n\ntime_taken\x18\x04 \x01(\x02\x12\x13\n\x0b\x63hunk_index\x18\x05 \x01(\x05\x12\x14\n\x0ctotal_chunks\x18\x06 \x01(\x05\x12\x12\n\nmessage_id\x18\x07 \x01(\t2\xaa\x01\n\nTTSService\x12/\n\x08Generate\x12\x10.tts.TextRequest\x1a\x0f.tts.AudioReply\"\x00\x12\x37\n\x0eStreamGenerate\x12\x10.tts.TextRequest\x1a\x0f.tts.AudioReply\"\x00\x30\x01\x12\x32\n\x07\x43hatTTS\x12\x10.tts.TextRequest\x1a\x0f.tts.AudioReply\"\x00(\x01\x30\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rservice.proto\x12\x03tts\"\xda\x01\n\x0bTextRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\r\n\x05voice\x18\x02 \x01(\t\x12\x12\n\nmessage_id\x18\x03 \x01(\t\x12\x0e\n\x06\x66ormat\x18\x04 \x01(\t\x12\x1b\n\x0estop_threshold\x18\x05 \x01(\x02H\x00\x88\x01\x01\x12\x1a\n\rmin_len_ratio\x18\x06 \x01(\x02H\x01\x88\x01\x01\x12\x1a\n\rmax_len_ratio\x18\x07 \x01(\x02H\x02\x88\x01\x01\x42\x11\n\x0f_stop_thresholdB\x10\n\x0e_min_len_ratioB\x10\n\x0e_max_len_ratio\"\x93\x01\n\nAudioReply\x12\x12\n\naudio_data\x18\x01 \x01(\x0c\x12\x0e\n\x06\x66ormat\x18\x02 \x01(\t\x12\x0e\n\x06\x63hunks\x18\x03 \x03(\t\x12\x12\n\ntime_taken\x18\x04 \x01(\x02\x12\x13\n\x0b\x63hunk_index\x18\x05 \x01(\x05\x12\x14\n\x0ctotal_chunks\x18\x06 \x01(\x05\x12\x12\n\nmessage_id\x18\x07 \x01(\t2\xaa\x01\n\nTTSService\x12/\n\x08Generate\x12\x10.tts.TextRequest\x1a\x0f.tts.AudioReply\"\x00\x12\x37\n\x0eStreamGenerate\x12\x10.tts.TextRequest\x1a\x0f.tts.AudioReply\"\x00\x30\x01\x12\x32\n\x07\x43hatTTS\x12\x10.tts.TextRequest\x1a\x0f.tts.AudioReply\"\x00(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'service_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_TEXTREQUEST']._serialized_start=22
-  _globals['_TEXTREQUEST']._serialized_end=84
-  _globals['_AUDIOREPLY']._serialized_start=87
-  _globals['_AUDIOREPLY']._serialized_end=234
-  _globals['_TTSSERVICE']._serialized_start=237
-  _globals['_TTSSERVICE']._serialized_end=407
+  _globals['_TEXTREQUEST']._serialized_start=23
+  _globals['_TEXTREQUEST']._serialized_end=241
+  _globals['_AUDIOREPLY']._serialized_start=244
+  _globals['_AUDIOREPLY']._serialized_end=391
+  _globals['_TTSSERVICE']._serialized_start=394
+  _globals['_TTSSERVICE']._serialized_end=564
 # @@protoc_insertion_point(module_scope)
@@ -6,17 +6,37 @@ from typing import ClassVar as _ClassVar, Iterable as _Iterable, Optional as _Op
 DESCRIPTOR: _descriptor.FileDescriptor
 
 class TextRequest(_message.Message):
-    __slots__ = ("text",)
+    __slots__ = ("text", "voice", "message_id", "format", "stop_threshold", "min_len_ratio", "max_len_ratio")
     TEXT_FIELD_NUMBER: _ClassVar[int]
+    VOICE_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_ID_FIELD_NUMBER: _ClassVar[int]
+    FORMAT_FIELD_NUMBER: _ClassVar[int]
+    STOP_THRESHOLD_FIELD_NUMBER: _ClassVar[int]
+    MIN_LEN_RATIO_FIELD_NUMBER: _ClassVar[int]
+    MAX_LEN_RATIO_FIELD_NUMBER: _ClassVar[int]
     text: str
-    def __init__(self, text: _Optional[str] = ...) -> None: ...
+    voice: str
+    message_id: str
+    format: str
+    stop_threshold: float
+    min_len_ratio: float
+    max_len_ratio: float
+    def __init__(self, text: _Optional[str] = ..., voice: _Optional[str] = ..., message_id: _Optional[str] = ..., format: _Optional[str] = ..., stop_threshold: _Optional[float] = ..., min_len_ratio: _Optional[float] = ..., max_len_ratio: _Optional[float] = ...) -> None: ...
 
 class AudioReply(_message.Message):
-    __slots__ = ("audio_data", "format", "chunks")
+    __slots__ = ("audio_data", "format", "chunks", "time_taken", "chunk_index", "total_chunks", "message_id")
     AUDIO_DATA_FIELD_NUMBER: _ClassVar[int]
     FORMAT_FIELD_NUMBER: _ClassVar[int]
     CHUNKS_FIELD_NUMBER: _ClassVar[int]
+    TIME_TAKEN_FIELD_NUMBER: _ClassVar[int]
+    CHUNK_INDEX_FIELD_NUMBER: _ClassVar[int]
+    TOTAL_CHUNKS_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_ID_FIELD_NUMBER: _ClassVar[int]
     audio_data: bytes
     format: str
     chunks: _containers.RepeatedScalarFieldContainer[str]
-    def __init__(self, audio_data: _Optional[bytes] = ..., format: _Optional[str] = ..., chunks: _Optional[_Iterable[str]] = ...) -> None: ...
+    time_taken: float
+    chunk_index: int
+    total_chunks: int
+    message_id: str
+    def __init__(self, audio_data: _Optional[bytes] = ..., format: _Optional[str] = ..., chunks: _Optional[_Iterable[str]] = ..., time_taken: _Optional[float] = ..., chunk_index: _Optional[int] = ..., total_chunks: _Optional[int] = ..., message_id: _Optional[str] = ...) -> None: ...
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The server modules import each other as top-level modules, like they do inside the container
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "server"))
+sys.path.insert(0, os.path.join(ROOT, "client"))
+sys.path.insert(0, ROOT)
+
+# tts_test.py is a manual end-to-end script that loads the real models, not a unit test
+collect_ignore = ["tts_test.py"]
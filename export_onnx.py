@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import math
+import argparse
+
+import numpy as np
+import torch
+from torch import nn
+from transformers import SpeechT5ForTextToSpeech, SpeechT5HifiGan
+
+ONNX_OPSET = 17
+
+# Runtime settings copied from the model configs into onnx/config.json
+CONFIG_KEYS = [
+    "reduction_factor",
+    "num_mel_bins",
+    "pad_token_id",
+    "decoder_layers",
+    "max_text_positions",
+    "speech_decoder_prenet_layers",
+    "speech_decoder_prenet_units",
+    "speech_decoder_prenet_dropout",
+    "speech_decoder_postnet_layers",
+    "speech_decoder_postnet_kernel",
+]
+
+
+class Encoder(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.speecht5.encoder
+
+    def forward(self, input_ids, attention_mask):
+        return self.encoder(input_values=input_ids, attention_mask=attention_mask, return_dict=True).last_hidden_state
+
+
+class DecoderStep(nn.Module):
+    """One autoregressive step on the newest mel frame.
+
+    The prenet runs on that frame only, with the dropout masks passed in (the
+    original reruns it over the whole sequence with fresh random masks and keeps
+    the last position, which is the same computation). Without `with_past` this is
+    the first step, which also returns the cross-attention keys and values.
+    """
+
+    def __init__(self, model, with_past):
+        super().__init__()
+        self.config = model.config
+        self.prenet = model.speecht5.decoder.prenet
+        self.decoder = model.speecht5.decoder.wrapped_decoder
+        self.postnet = model.speech_decoder_postnet
+        self.with_past = with_past
+
+    def forward(self, frame, position, prenet_masks, speaker_embeddings, encoder_hidden_states,
+                encoder_attention_mask, *past):
+        hidden_states = frame
+        for i, layer in enumerate(self.prenet.layers):
+            hidden_states = nn.functional.relu(layer(hidden_states)) * prenet_masks[i]
+        hidden_states = self.prenet.final_layer(hidden_states)
+        positions = self.prenet.encode_positions
+        hidden_states = hidden_states + positions.alpha * positions.pe[:, position]
+
+        speaker_embeddings = nn.functional.normalize(speaker_embeddings).unsqueeze(1)
+        hidden_states = torch.cat([hidden_states, speaker_embeddings], dim=-1)
+        hidden_states = nn.functional.relu(self.prenet.speaker_embeds_layer(hidden_states))
+
+        past_key_values = None
+        if self.with_past:
+            past_key_values = tuple(tuple(past[4 * i:4 * i + 4]) for i in range(self.config.decoder_layers))
+        decoder_out = self.decoder(
+            hidden_states=hidden_states,
+            attention_mask=None,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+            past_key_values=past_key_values,
+            use_cache=True,
+            return_dict=True,
+        )
+        last_decoder_output = decoder_out.last_hidden_state.squeeze(1)
+        spectrum = self.postnet.feat_out(last_decoder_output)
+        spectrum = spectrum.view(-1, self.config.reduction_factor, self.config.num_mel_bins)
+        prob = torch.sigmoid(self.postnet.prob_out(last_decoder_output))
+
+        present = []
+        for layer_past in decoder_out.past_key_values:
+            # Later steps only append to the self-attention cache, the cross-attention one is fixed
+            present.extend(layer_past[:2] if self.with_past else layer_past)
+        return (spectrum, prob, *present)
+
+
+class Postnet(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.postnet = model.speech_decoder_postnet
+
+    def forward(self, spectrogram):
+        return self.postnet.postnet(spectrogram)
+
+
+def cache_names(prefix, layers, cross=True):
+    kinds = ["self_key", "self_value", "cross_key", "cross_value"] if cross else ["self_key", "self_value"]
+    return [f"{prefix}.{layer}.{kind}" for layer in range(layers) for kind in kinds]
+
+
+def export(module, args, path, input_names, output_names, dynamic_axes):
+    # The exporter puts the module back in its previous mode afterwards, which for a
+    # wrapper left in training mode would also switch the wrapped model to training
+    module.eval()
+    torch.onnx.export(
+        module,
+        args,
+        path,
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=ONNX_OPSET,
+        do_constant_folding=True,
+        dynamo=False,
+    )
+    print(f"Wrote {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+
+
+def export_all(model, vocoder, output_dir):
+    config = model.config
+    layers = config.decoder_layers
+    bsz, text_len, frames = 2, 12, 20
+
+    input_ids = torch.randint(4, config.vocab_size, (bsz, text_len))
+    attention_mask = torch.ones(bsz, text_len, dtype=torch.int64)
+    export(
+        Encoder(model),
+        (input_ids, attention_mask),
+        os.path.join(output_dir, "encoder.onnx"),
+        ["input_ids", "attention_mask"],
+        ["encoder_hidden_states"],
+        {"input_ids": {0: "batch", 1: "text"}, "attention_mask": {0: "batch", 1: "text"},
+         "encoder_hidden_states": {0: "batch", 1: "text"}},
+    )
+
+    encoder_hidden_states = Encoder(model)(input_ids, attention_mask)
+    step_inputs = (
+        torch.zeros(bsz, 1, config.num_mel_bins),
+        torch.tensor([0], dtype=torch.int64),
+        torch.ones(config.speech_decoder_prenet_layers, config.speech_decoder_prenet_units),
+        torch.randn(bsz, config.speaker_embedding_dim),
+        encoder_hidden_states,
+        attention_mask,
+    )
+    step_names = ["frame", "position", "prenet_masks", "speaker_embeddings", "encoder_hidden_states", "encoder_attention_mask"]
+    step_axes = {
+        "frame": {0: "batch"},
+        "speaker_embeddings": {0: "batch"},
+        "encoder_hidden_states": {0: "batch", 1: "text"},
+        "encoder_attention_mask": {0: "batch", 1: "text"},
+        "spectrum": {0: "batch"},
+        "prob": {0: "batch"},
+    }
+
+    present_names = cache_names("present", layers)
+    export(
+        DecoderStep(model, with_past=False),
+        step_inputs,
+        os.path.join(output_dir, "decoder_init.onnx"),
+        step_names,
+        ["spectrum", "prob", *present_names],
+        {**step_axes, **{name: {0: "batch", 2: "text" if "cross" in name else "steps"} for name in present_names}},
+    )
+
+    past = DecoderStep(model, with_past=False)(*step_inputs)[2:]
+    past_names = cache_names("past", layers)
+    step_present_names = cache_names("present", layers, cross=False)
+    axes = dict(step_axes)
+    axes.update({name: {0: "batch", 2: "text" if "cross" in name else "steps"} for name in past_names})
+    axes.update({name: {0: "batch", 2: "steps"} for name in step_present_names})
+    export(
+        DecoderStep(model, with_past=True),
+        (*step_inputs, *past),
+        os.path.join(output_dir, "decoder_step.onnx"),
+        step_names + past_names,
+        ["spectrum", "prob", *step_present_names],
+        axes,
+    )
+
+    spectrogram = torch.randn(bsz, frames, config.num_mel_bins)
+    export(
+        Postnet(model),
+        (spectrogram,),
+        os.path.join(output_dir, "postnet.onnx"),
+        ["spectrogram"],
+        ["postnet_spectrogram"],
+        {"spectrogram": {0: "batch", 1: "frames"}, "postnet_spectrogram": {0: "batch", 1: "frames"}},
+    )
+    export(
+        vocoder,
+        (spectrogram,),
+        os.path.join(output_dir, "vocoder.onnx"),
+        ["spectrogram"],
+        ["waveform"],
+        {"spectrogram": {0: "batch", 1: "frames"}, "waveform": {0: "batch", 1: "samples"}},
+    )
+
+    runtime_config = {key: getattr(config, key) for key in CONFIG_KEYS}
+    runtime_config["hop_length"] = math.prod(vocoder.config.upsample_rates)
+    with open(os.path.join(output_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(runtime_config, f, indent=2)
+
+
+def verify(model, vocoder, output_dir, steps=8):
+    """Run the exported graphs next to the PyTorch modules on the same inputs and compare"""
+    import onnxruntime as ort
+
+    sessions = {
+        name: ort.InferenceSession(os.path.join(output_dir, f"{name}.onnx"), providers=["CPUExecutionProvider"])
+        for name in ("encoder", "decoder_init", "decoder_step", "postnet", "vocoder")
+    }
+    config = model.config
+    layers = config.decoder_layers
+    input_ids = torch.randint(4, config.vocab_size, (2, 17))
+    attention_mask = torch.ones_like(input_ids)
+    attention_mask[1, 11:] = 0
+    input_ids[1, 11:] = config.pad_token_id
+    speaker_embeddings = torch.randn(2, config.speaker_embedding_dim)
+
+    def run(name, feeds):
+        return sessions[name].run(None, {i.name: feeds[i.name] for i in sessions[name].get_inputs()})
+
+    diffs = {}
+    with torch.inference_mode():
+        encoder_hidden_states = Encoder(model)(input_ids, attention_mask)
+        onnx_states = sessions["encoder"].run(None, {"input_ids": input_ids.numpy(), "attention_mask": attention_mask.numpy()})[0]
+        diffs["encoder"] = np.abs(onnx_states - encoder_hidden_states.numpy()).max()
+
+        frame = torch.zeros(2, 1, config.num_mel_bins)
+        past = None
+        feeds = {
+            "speaker_embeddings": speaker_embeddings.numpy(),
+            "encoder_hidden_states": encoder_hidden_states.numpy(),
+            "encoder_attention_mask": attention_mask.numpy(),
+        }
+        for step in range(steps):
+            p = config.speech_decoder_prenet_dropout
+            masks = (torch.rand(config.speech_decoder_prenet_layers, config.speech_decoder_prenet_units) < p).float() / (1 - p)
+            position = torch.tensor([step], dtype=torch.int64)
+            inputs = (frame, position, masks, speaker_embeddings, encoder_hidden_states, attention_mask)
+            feeds.update(frame=frame.numpy(), position=position.numpy(), prenet_masks=masks.numpy())
+            if past is None:
+                spectrum, prob, *past = DecoderStep(model, with_past=False)(*inputs)
+                onnx_spectrum, onnx_prob, *_ = run("decoder_init", feeds)
+                feeds.update({name: tensor.numpy() for name, tensor in zip(cache_names("past", layers), past)})
+            else:
+                spectrum, prob, *present = DecoderStep(model, with_past=True)(*inputs, *past)
+                onnx_spectrum, onnx_prob, *onnx_present = run("decoder_step", feeds)
+                for layer in range(layers):
+                    past[4 * layer:4 * layer + 2] = present[2 * layer:2 * layer + 2]
+                    feeds[f"past.{layer}.self_key"] = onnx_present[2 * layer]
+                    feeds[f"past.{layer}.self_value"] = onnx_present[2 * layer + 1]
+            diffs["decoder"] = max(diffs.get("decoder", 0.0), np.abs(onnx_spectrum - spectrum.numpy()).max())
+            frame = spectrum[:, -1:, :]
+
+        spectrogram = torch.randn(2, 40, config.num_mel_bins)
+        mel = Postnet(model)(spectrogram)
+        onnx_mel = sessions["postnet"].run(None, {"spectrogram": spectrogram.numpy()})[0]
+        diffs["postnet"] = np.abs(onnx_mel - mel.numpy()).max()
+        onnx_waveform = sessions["vocoder"].run(None, {"spectrogram": mel.numpy()})[0]
+        diffs["vocoder"] = np.abs(onnx_waveform - vocoder(mel).numpy()).max()
+
+    for name, diff in diffs.items():
+        print(f"{name:<8} max abs difference {diff:.2e}")
+    return max(diffs.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SpeechT5 and the HiFi-GAN vocoder to ONNX")
+    parser.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", "./models"))
+    parser.add_argument("--output-dir", help="Defaults to <model-dir>/onnx, where the engine looks for it")
+    parser.add_argument("--skip-verify", action="store_true", help="Do not compare the graphs against PyTorch")
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join(args.model_dir, "onnx")
+    os.makedirs(output_dir, exist_ok=True)
+
+    model = SpeechT5ForTextToSpeech.from_pretrained(os.path.join(args.model_dir, "speecht5_tts")).eval()
+    vocoder = SpeechT5HifiGan.from_pretrained(os.path.join(args.model_dir, "speecht5_hifigan")).eval()
+    with torch.inference_mode():
+        export_all(model, vocoder, output_dir)
+
+    if not args.skip_verify:
+        if verify(model, vocoder, output_dir) > args.tolerance:
+            print(f"Exported graphs differ from PyTorch by more than {args.tolerance}")
+            sys.exit(1)
+        print("Exported graphs match PyTorch")
+
+
+if __name__ == "__main__":
+    main()
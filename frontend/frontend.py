@@ -5,6 +5,26 @@ import json
 import os
 import io
 
+def parse_story_response(response):
+    """Split the gateway's multipart/mixed reply into its JSON metadata and raw WAV bytes"""
+    boundary = response.headers["Content-Type"].split("boundary=", 1)[1].strip('"').encode("ascii")
+    parts = {}
+    body = response.content
+    position = body.index(b"--" + boundary) + len(boundary) + 4
+    while not body.startswith(b"--", position - 2):
+        header_end = body.index(b"\r\n\r\n", position)
+        headers = dict(
+            line.split(": ", 1) for line in body[position:header_end].decode("ascii").split("\r\n")
+        )
+        start = header_end + 4
+        if "Content-Length" in headers:
+            end = start + int(headers["Content-Length"])
+        else:
+            end = body.index(b"\r\n--" + boundary, start)
+        parts[headers["Content-Type"]] = body[start:end]
+        position = end + len(boundary) + 6
+    return json.loads(parts["application/json"]), parts["audio/wav"]
+
 # Page configuration
 st.set_page_config(page_title="📚 TTS Storybook", page_icon="📖", layout="centered")
 
@@ -152,10 +172,14 @@ if generate:
     else:
         with st.spinner("🔄 Turning your story into sound magic..."):
             try:
-                response = requests.post("http://tts-rest-client:8000/generate", json={"text": text, "voice": voice})
+                # Raw audio in a multipart reply instead of base64 inside JSON
+                response = requests.post(
+                    "http://tts-rest-client:8000/generate",
+                    json={"text": text, "voice": voice},
+                    headers={"Accept": "multipart/mixed"},
+                )
                 if response.status_code == 200:
-                    data = response.json()
-                    audio_bytes = base64.b64decode(data["audio_data"])
+                    data, audio_bytes = parse_story_response(response)
                     time_taken = response.headers.get("X-Time-Taken") or data.get("time_taken")
                     st.markdown("🧮 Character count: `{}`".format(len(st.session_state.get("text", ""))))
                     chunks = data.get("chunks", [])
@@ -0,0 +1,168 @@
+import math
+import time
+import asyncio
+import threading
+import logging
+from collections import Counter
+
+logger = logging.getLogger("admission")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; `retry_after` is a hint in whole seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Server overloaded ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    __slots__ = ("client_id", "cost", "admitted_at")
+
+    def __init__(self, client_id, cost):
+        self.client_id = client_id
+        self.cost = cost
+        self.admitted_at = time.monotonic()
+
+
+# Extra characters a digit adds once numbers are spelled out ("2024" -> "two thousand
+# and twenty-four"); about 5.5 on the synthetic stories in bench_preprocessing.py
+DIGIT_EXPANSION = 6
+
+
+def estimate_cost(text):
+    """Estimated synthesis work for `text`, in tokens.
+
+    The SpeechT5 tokenizer is character level, so the token count is about the length
+    of the normalized text. Normalizing runs on the event loop before admission, so
+    count digits with str.count instead and charge each one its spelled-out length.
+    """
+    digits = sum(text.count(d) for d in "0123456789")
+    return len(text) + DIGIT_EXPANSION * digits
+
+
+class AdmissionController:
+    """Admits requests against a budget of in-flight tokens, the engine queue depth and
+    a per-client concurrency limit. A limit of 0 disables that check.
+
+    A request that does not fit may wait up to `max_wait_ms` for capacity before it is
+    rejected with a retry-after hint derived from the observed token throughput. A
+    request larger than the whole budget is still admitted when nothing else is running.
+    """
+
+    def __init__(self, max_inflight_tokens=6000, max_queue_depth=0, max_requests_per_client=0,
+                 max_wait_ms=0.0, queue_depth_fn=None, initial_tokens_per_second=100.0, max_retry_after=60):
+        self.max_inflight_tokens = max_inflight_tokens
+        self.max_queue_depth = max_queue_depth
+        self.max_requests_per_client = max_requests_per_client
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_retry_after = max_retry_after
+        self._queue_depth_fn = queue_depth_fn
+
+        self._cond = threading.Condition()
+        self._inflight_tokens = 0
+        self._inflight_requests = 0
+        self._per_client = Counter()
+        # Exponential moving average of tokens completed per second, across all requests
+        self._tokens_per_second = initial_tokens_per_second
+        self._last_release = None
+
+        self.admitted = 0
+        self.deferred = 0
+        self.rejected = Counter()
+
+    def _check_locked(self, client_id, cost):
+        """Return the reason the request cannot run right now, or None"""
+        if self.max_requests_per_client and self._per_client[client_id] >= self.max_requests_per_client:
+            return "client_concurrency"
+        if self.max_inflight_tokens and self._inflight_requests and self._inflight_tokens + cost > self.max_inflight_tokens:
+            return "token_budget"
+        if self.max_queue_depth and self._queue_depth_fn and self._queue_depth_fn() >= self.max_queue_depth:
+            return "queue_depth"
+        return None
+
+    def _retry_after_locked(self, cost):
+        # Time for the work ahead of this request to drain at the current throughput
+        backlog = max(self._inflight_tokens + cost - self.max_inflight_tokens, cost)
+        seconds = math.ceil(backlog / max(self._tokens_per_second, 1.0))
+        return min(max(seconds, 1), self.max_retry_after)
+
+    def admit(self, client_id, cost):
+        """Admit, waiting up to `max_wait_ms` for capacity; returns a Ticket or raises AdmissionRejected"""
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            reason = self._check_locked(client_id, cost)
+            if reason is not None and self.max_wait > 0:
+                self.deferred += 1
+                while reason is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    # Releases notify; the timeout also covers queue depth, which drains without one
+                    self._cond.wait(min(remaining, 0.05))
+                    reason = self._check_locked(client_id, cost)
+
+            if reason is not None:
+                raise self._reject_locked(client_id, reason, cost)
+            return self._admit_locked(client_id, cost)
+
+    async def admit_async(self, client_id, cost):
+        """admit() for the event loop: waits with asyncio.sleep instead of blocking the thread"""
+        deadline = time.monotonic() + self.max_wait
+        deferred = False
+        while True:
+            with self._cond:
+                reason = self._check_locked(client_id, cost)
+                if reason is None:
+                    return self._admit_locked(client_id, cost)
+                if time.monotonic() >= deadline:
+                    raise self._reject_locked(client_id, reason, cost)
+                if not deferred:
+                    self.deferred += 1
+                    deferred = True
+            await asyncio.sleep(0.05)
+
+    def _reject_locked(self, client_id, reason, cost):
+        self.rejected[reason] += 1
+        retry_after = self._retry_after_locked(cost)
+        logger.debug(f"Rejected {cost} tokens from {client_id} ({reason}), retry after {retry_after}s")
+        return AdmissionRejected(reason, retry_after)
+
+    def _admit_locked(self, client_id, cost):
+        self._inflight_tokens += cost
+        self._inflight_requests += 1
+        self._per_client[client_id] += 1
+        self.admitted += 1
+        return Ticket(client_id, cost)
+
+    def release(self, ticket):
+        now = time.monotonic()
+        with self._cond:
+            self._inflight_tokens -= ticket.cost
+            self._inflight_requests -= 1
+            self._per_client[ticket.client_id] -= 1
+            if self._per_client[ticket.client_id] <= 0:
+                del self._per_client[ticket.client_id]
+
+            # Throughput is measured over the gap since the previous completion, so concurrent
+            # requests add up instead of each reporting its own (slower) rate. Idle time
+            # before this request was admitted does not count.
+            since = ticket.admitted_at if self._last_release is None else max(self._last_release, ticket.admitted_at)
+            if now > since:
+                rate = ticket.cost / (now - since)
+                self._tokens_per_second = 0.8 * self._tokens_per_second + 0.2 * rate
+            self._last_release = now
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "inflight_tokens": self._inflight_tokens,
+                "inflight_requests": self._inflight_requests,
+                "clients": len(self._per_client),
+                "tokens_per_second": round(self._tokens_per_second, 1),
+                "admitted": self.admitted,
+                "deferred": self.deferred,
+                "rejected": dict(self.rejected),
+            }
@@ -0,0 +1,115 @@
+import io
+import struct
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+BITS_PER_SAMPLE = 16
+
+# Placeholder size used when the total length is unknown up front (streaming)
+STREAMING_DATA_SIZE = 0xFFFFFFFF
+WAV_HEADER_SIZE = 44
+
+# Compressed output formats -> (libsndfile container, codec)
+CODECS = {
+    "flac": ("FLAC", "PCM_16"),
+    "ogg": ("OGG", "OPUS"),
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+}
+OUTPUT_FORMATS = ("wav", *CODECS)
+
+
+def float_to_pcm16(samples):
+    """Convert float samples in [-1, 1] to little-endian 16-bit PCM bytes"""
+    samples = np.asarray(samples, dtype=np.float32)
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).round().astype("<i2").tobytes()
+
+
+def pcm16_to_float(pcm):
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32767.0
+
+
+def wav_header(data_size, sample_rate=SAMPLE_RATE, channels=CHANNELS, bits_per_sample=BITS_PER_SAMPLE):
+    """Build a canonical 44-byte RIFF/WAVE header for `data_size` bytes of PCM"""
+    block_align = channels * bits_per_sample // 8
+    riff_size = STREAMING_DATA_SIZE if data_size == STREAMING_DATA_SIZE else 36 + data_size
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+        b"data", data_size,
+    )
+
+
+def streaming_wav_header(sample_rate=SAMPLE_RATE, channels=CHANNELS, bits_per_sample=BITS_PER_SAMPLE):
+    """Header for a WAV stream of unknown length, PCM frames are appended as they arrive"""
+    return wav_header(STREAMING_DATA_SIZE, sample_rate, channels, bits_per_sample)
+
+
+def build_wav(pcm_chunks, sample_rate=SAMPLE_RATE):
+    """Join PCM chunks behind a single header with one copy of the sample data"""
+    data_size = sum(len(chunk) for chunk in pcm_chunks)
+    return b"".join([wav_header(data_size, sample_rate), *pcm_chunks])
+
+
+def encode_pcm(pcm, audio_format):
+    """Encode PCM16 samples as a complete file in one of OUTPUT_FORMATS"""
+    if audio_format == "wav":
+        return build_wav([pcm])
+    container, codec = CODECS[audio_format]
+    buffer = io.BytesIO()
+    with sf.SoundFile(buffer, "w", SAMPLE_RATE, CHANNELS, format=container, subtype=codec) as f:
+        f.write(np.frombuffer(pcm, dtype="<i2"))
+    return buffer.getvalue()
+
+
+def transcode_wav(wav, audio_format):
+    """Re-encode a WAV produced by build_wav() (canonical 44-byte header)"""
+    if audio_format == "wav":
+        return wav
+    return encode_pcm(memoryview(wav)[WAV_HEADER_SIZE:], audio_format)
+
+
+class StreamEncoder:
+    """Encodes audio chunk by chunk; the bytes returned by successive encode() calls
+    concatenate into one file of the requested format.
+
+    WAV streams get the open-ended header in front of the first chunk. Compressed
+    formats keep one encoder open for the whole stream and hand out whatever it has
+    written so far, so codec state carries across chunk boundaries. Not thread-safe:
+    call encode() for one chunk at a time, in order.
+    """
+
+    def __init__(self, audio_format):
+        self.audio_format = audio_format
+        self._started = False
+        self._file = None
+        if audio_format != "wav":
+            container, codec = CODECS[audio_format]
+            self._buffer = io.BytesIO()
+            self._sent = 0
+            self._file = sf.SoundFile(self._buffer, "w", SAMPLE_RATE, CHANNELS, format=container, subtype=codec)
+
+    def encode(self, pcm, last=False):
+        if self._file is None:
+            data = pcm if self._started else streaming_wav_header() + pcm
+            self._started = True
+            return data
+
+        self._file.write(np.frombuffer(pcm, dtype="<i2"))
+        if last:
+            # Flushes buffered frames. FLAC and MP3 then seek back to fill in their length
+            # fields, which were already sent as "unknown"; that is valid for both.
+            self._file.close()
+        return self._take()
+
+    def _take(self):
+        with self._buffer.getbuffer() as view:
+            data = bytes(view[self._sent:])
+            self._sent = len(view)
+        return data
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
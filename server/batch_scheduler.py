@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger("batch_scheduler")
+
+
+class _PendingItem:
+    __slots__ = ("text", "voice_id", "future", "enqueued_at", "deadline", "listener", "decoding")
+
+    def __init__(self, text, voice_id, deadline=None, listener=None, decoding=None):
+        self.text = text
+        self.voice_id = voice_id
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+        self.listener = listener
+        self.decoding = decoding
+
+
+class BatchScheduler:
+    """Collects chunks from concurrent callers and synthesizes them in batches.
+
+    `batch_fn(texts, voice_ids, listeners, decodings)` must return one waveform per
+    input, in order; `listeners[i]` is None or a callable the batch function hands
+    partial audio of input i to while it is being synthesized, and `decodings[i]`
+    the decoding options of input i (None for the defaults).
+    A batch is dispatched once `max_batch_size` items are queued or the oldest
+    item has waited `max_wait_ms`, whichever comes first. Items with the earliest
+    deadline go first (items without one last, in arrival order), and items whose
+    future was cancelled while queued are dropped without being synthesized.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = []  # heap of (deadline, seq, item)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Stats, guarded by self._cond
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+        self._total_wait = 0.0
+        self._total_compute = 0.0
+        self._dropped = 0
+
+        self._worker = threading.Thread(target=self._run, name="tts-batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, text, voice_id, deadline=None, listener=None, decoding=None):
+        """Queue a chunk for synthesis and return a Future for its waveform.
+
+        `deadline` is a time.monotonic() value used to order the queue; cancel the
+        future to take the chunk out of it. `listener` is passed on to the batch
+        function to receive the audio progressively, `decoding` as the item's
+        decoding options.
+        """
+        item = _PendingItem(text, voice_id, deadline, listener, decoding)
+        priority = deadline if deadline is not None else float("inf")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batch scheduler has been shut down")
+            heapq.heappush(self._queue, (priority, next(self._seq), item))
+            self._cond.notify()
+        return item.future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            # Hold the batch open until it is full or the oldest item has waited long enough
+            flush_at = min(item.enqueued_at for _, _, item in self._queue) + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                item = heapq.heappop(self._queue)[2]
+                if item.future.cancelled():
+                    # The request went away while the chunk was queued
+                    self._dropped += 1
+                    continue
+                batch.append(item)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            running = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if len(running) < len(batch):
+                with self._cond:
+                    self._dropped += len(batch) - len(running)
+            batch = running
+            if not batch:
+                continue
+
+            start_time = time.monotonic()
+            try:
+                waveforms = self._batch_fn(
+                    [item.text for item in batch],
+                    [item.voice_id for item in batch],
+                    [item.listener for item in batch],
+                    [item.decoding for item in batch],
+                )
+                if len(waveforms) != len(batch):
+                    raise RuntimeError(f"Batch function returned {len(waveforms)} results for {len(batch)} inputs")
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} chunks failed: {str(e)}", exc_info=True)
+                for item in batch:
+                    item.future.set_exception(e)
+            else:
+                for item, waveform in zip(batch, waveforms):
+                    item.future.set_result(waveform)
+
+            elapsed = time.monotonic() - start_time
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._total_wait += sum(start_time - item.enqueued_at for item in batch)
+                self._total_compute += elapsed
+
+            logger.debug(f"Synthesized batch of {len(batch)} chunks in {elapsed:.2f}s")
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def get_stats(self):
+        with self._cond:
+            compute_per_item = self._total_compute / self._items if self._items else 0.0
+            return {
+                "queue_depth": len(self._queue),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": 1000.0 * self._total_wait / self._items if self._items else 0.0,
+                "avg_batch_compute_ms": 1000.0 * self._total_compute / self._batches if self._batches else 0.0,
+                "dropped_cancelled": self._dropped,
+                # Estimated at the average compute per synthesized chunk
+                "saved_compute_ms": 1000.0 * compute_per_item * self._dropped,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._worker.join()
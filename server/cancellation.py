@@ -0,0 +1,91 @@
+import math
+import time
+import threading
+
+
+class RequestCancelled(Exception):
+    """The caller went away or its deadline passed before the result was ready"""
+
+
+class CancellationToken:
+    """Cancellation state of one request.
+
+    A token is cancelled explicitly (the client disconnected) or implicitly once
+    its `deadline`, a time.monotonic() value, has passed.
+    """
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks = []
+
+    @classmethod
+    def with_timeout(cls, timeout):
+        # Sync gRPC reports a call without a deadline as a time_remaining() of about 9.2e18s,
+        # more than Event.wait accepts, so anything that large means no deadline
+        if timeout is None or not math.isfinite(timeout) or timeout > threading.TIMEOUT_MAX:
+            return cls()
+        return cls(time.monotonic() + timeout)
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Call `callback()` on cancel(), or right away if that already happened"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def cancelled(self):
+        return self._cancelled or self.expired()
+
+    def check(self):
+        if self._cancelled:
+            raise RequestCancelled("Request was cancelled")
+        if self.expired():
+            raise RequestCancelled("Request deadline exceeded")
+
+    def wait(self, future):
+        """Return the future's result, or raise RequestCancelled if the token fires first"""
+        if not future.done():
+            done = threading.Event()
+            future.add_done_callback(lambda _: done.set())
+            # Unregistered afterwards, long-lived tokens like NEVER_CANCELLED would collect one per wait
+            wake = done.set
+            self.add_callback(wake)
+            try:
+                remaining = self.remaining()
+                done.wait(None if remaining is None else min(remaining, threading.TIMEOUT_MAX))
+            finally:
+                self.remove_callback(wake)
+            if not future.done():
+                self.check()
+                # Woken by the deadline a moment before it is reached
+                raise RequestCancelled("Request deadline exceeded")
+        return future.result()
+
+
+# Token for callers without a deadline or a way to cancel
+NEVER_CANCELLED = CancellationToken()
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: processes sharing a directory are not coordinated
+    fcntl = None
+
+logger = logging.getLogger("disk_cache")
+
+INDEX_FILE = "index.json"
+INDEX_LOCK_FILE = "index.lock"
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on `path` held across processes"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+class DiskCache:
+    """Content-addressed audio cache on disk with a byte budget and LRU eviction.
+
+    Keys are hex digests; each entry is stored in its own file and written
+    atomically, so several processes can share one cache directory. The LRU
+    order lives in a small JSON index that is loaded at startup instead of
+    scanning the entry files.
+
+    Reads and inserts only update the index in memory. A background thread
+    writes it every `index_flush_interval` seconds, and flush() writes it on
+    shutdown. Each write merges in the entries other processes added or
+    evicted, under a lock on the index, so the byte budget covers every
+    process sharing the directory (up to one flush interval behind).
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024, suffix=".wav", index_flush_interval=30.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.index_flush_interval = index_flush_interval
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.lock_path = os.path.join(cache_dir, INDEX_LOCK_FILE)
+
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        # Changes since the last index write, so merging does not undo them
+        self._added = set()
+        self._removed = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for key, size in self._read_index():
+            self._entries[key] = size
+            self._total_bytes += size
+        if self._entries:
+            logger.info(f"Loaded disk cache index with {len(self._entries)} entries ({self._total_bytes} bytes)")
+
+        if index_flush_interval > 0:
+            threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + self.suffix)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache index {self.index_path}: {str(e)}")
+            return []
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _add_locked(self, key, size):
+        self._entries[key] = size
+        self._total_bytes += size
+        self._added.add(key)
+        self._removed.discard(key)
+        self._dirty = True
+
+    def _remove_locked(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+            self._added.discard(key)
+            self._removed.add(key)
+            self._dirty = True
+        return size
+
+    def _merge_locked(self, on_disk):
+        disk_keys = set(key for key, _ in on_disk)
+        # Entries in our last write that are gone from the index were evicted by another process
+        for key in [key for key in self._entries if key not in disk_keys and key not in self._added]:
+            self._total_bytes -= self._entries.pop(key)
+        # Entries only other processes know about count against the budget as the least recently used
+        for key, size in reversed(on_disk):
+            if key not in self._entries and key not in self._removed:
+                self._entries[key] = size
+                self._entries.move_to_end(key, last=False)
+                self._total_bytes += size
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove_locked(key)
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                # Evicted by another process sharing the directory
+                self._remove_locked(key)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._dirty = True
+            else:
+                # Written by another process sharing the directory
+                self._add_locked(key, len(data))
+                self._evict_locked()
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return False
+
+        self._write_atomic(self._path(key), data)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._add_locked(key, len(data))
+            self._evict_locked()
+        return True
+
+    def flush(self):
+        """Write the index if it changed since the last write"""
+        with self._lock:
+            if not self._dirty:
+                return
+        with _file_lock(self.lock_path):
+            on_disk = self._read_index()
+            with self._lock:
+                self._merge_locked(on_disk)
+                self._evict_locked()
+                data = json.dumps([[key, size] for key, size in self._entries.items()]).encode("utf-8")
+                added, removed = self._added, self._removed
+                self._added, self._removed = set(), set()
+                self._dirty = False
+            try:
+                self._write_atomic(self.index_path, data)
+            except BaseException:
+                with self._lock:
+                    # Nothing was written, keep the changes the next write has to merge
+                    self._added |= added - self._removed
+                    self._removed |= removed - self._added
+                    self._dirty = True
+                raise
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.index_flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"Could not write cache index {self.index_path}: {str(e)}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
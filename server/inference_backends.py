@@ -0,0 +1,94 @@
+import contextlib
+import logging
+
+import numpy as np
+import torch
+
+logger = logging.getLogger("inference_backends")
+
+# Numeric precision of the acoustic model (and of the vocoder for bf16)
+PRECISIONS = ("fp32", "int8", "bf16")
+# How the HiFi-GAN vocoder is executed
+VOCODER_BACKENDS = ("eager", "trace", "compile")
+
+
+def bf16_supported(device):
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    # CPU autocast works everywhere but is only faster with native bf16 (AVX512-BF16, AMX)
+    return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+def resolve_precision(precision, device):
+    """The precision to run with, falling back to fp32 where the requested one cannot run"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of: {', '.join(PRECISIONS)}")
+    if precision == "int8" and device.type != "cpu":
+        logger.warning("Dynamic int8 quantization only runs on CPU, using fp32")
+        return "fp32"
+    if precision == "bf16" and not bf16_supported(device):
+        logger.warning(f"No native bf16 support on {device}, using fp32")
+        return "fp32"
+    return precision
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the Linear layers: weights are quantized once, activations per call.
+
+    Covers the encoder, decoder and pre/postnet projections; convolutions stay fp32.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def optimize_vocoder(vocoder, backend, num_mel_bins, device):
+    """Trace or compile the vocoder; falls back to eager when the backend is not available here"""
+    if backend not in VOCODER_BACKENDS:
+        raise ValueError(f"Unknown vocoder backend '{backend}', expected one of: {', '.join(VOCODER_BACKENDS)}")
+    if backend == "eager":
+        return vocoder
+
+    example = torch.zeros(1, 32, num_mel_bins, device=device)
+    try:
+        with torch.inference_mode():
+            if backend == "trace":
+                # Only tensor ops remain after tracing, the graph works for any batch and length
+                optimized = torch.jit.freeze(torch.jit.trace(vocoder, example))
+            else:
+                optimized = torch.compile(vocoder, dynamic=True)
+            # Compile now instead of on the first request
+            optimized(example)
+        return optimized
+    except Exception as e:
+        logger.warning(f"Vocoder backend '{backend}' failed, using eager: {str(e)}")
+        return vocoder
+
+
+def inference_context(precision, device):
+    """Context for every forward pass: inference_mode, with bf16 autocast when selected"""
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if precision == "bf16":
+        stack.enter_context(torch.autocast(device.type, dtype=torch.bfloat16))
+    return stack
+
+
+def log_spectrogram(samples, n_fft=1024, hop_length=256):
+    frames = np.lib.stride_tricks.sliding_window_view(samples, n_fft)[::hop_length] * np.hanning(n_fft)
+    return np.log(np.abs(np.fft.rfft(frames, axis=-1)) + 1e-5)
+
+
+def audio_similarity(reference, candidate, n_fft=1024, hop_length=256):
+    """Compare two renderings of the same text: (cosine similarity of their log spectrograms, length ratio).
+
+    The spectrograms are compared over the common length, so small timing drift
+    at the end does not dominate; the length ratio catches a missed stop token.
+    """
+    if min(len(reference), len(candidate)) < n_fft:
+        return 0.0, len(candidate) / max(len(reference), 1)
+    ref = log_spectrogram(reference, n_fft, hop_length)
+    cand = log_spectrogram(candidate, n_fft, hop_length)
+    frames = min(len(ref), len(cand))
+    ref, cand = ref[:frames].ravel(), cand[:frames].ravel()
+    ref, cand = ref - ref.mean(), cand - cand.mean()
+    similarity = float(np.dot(ref, cand) / (np.linalg.norm(ref) * np.linalg.norm(cand) + 1e-12))
+    return similarity, len(candidate) / len(reference)
@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import Future
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by the total size of its values.
+
+    Values are expected to be bytes-like unless `size_fn` says otherwise.
+    """
+
+    def __init__(self, max_bytes, size_fn=len):
+        self.max_bytes = max_bytes
+        self._size_fn = size_fn
+        self._entries = OrderedDict()  # key -> (value, size), least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._size_fn(value)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time; concurrent callers share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._waiters = Counter()  # callers of share() still interested in each call
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def do(self, key, fn, wait=None):
+        """Run `fn()` unless a call for `key` is in flight; `wait(future)` replaces future.result() for followers"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return wait(future) if wait else future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._forget(key, future)
+
+    def share(self, key, start):
+        """Like do() for asynchronous work: `start()` returns a Future that concurrent callers share"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._waiters[key] += 1
+                self.coalesced += 1
+                return future
+            future = start()
+            self._calls[key] = future
+            self._waiters[key] = 1
+            self.executions += 1
+
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def abandon(self, key, future):
+        """Drop interest in a future from share(); the last caller to leave cancels it"""
+        with self._lock:
+            if self._calls.get(key) is not future:
+                return False
+            self._waiters[key] -= 1
+            if self._waiters[key] > 0:
+                return False
+            # Forget it now so a new caller starts a fresh call instead of joining a cancelled one
+            del self._calls[key]
+            del self._waiters[key]
+            self.abandoned += 1
+        return future.cancel()
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+                del self._waiters[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "abandoned": self.abandoned,
+            }
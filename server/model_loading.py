@@ -0,0 +1,97 @@
+import os
+import json
+import tempfile
+import logging
+
+import numpy as np
+import torch
+
+logger = logging.getLogger("model_loading")
+
+# Packed voice embeddings: one row per voice, names in the same order
+PACKED_EMBEDDINGS = "voices.npy"
+PACKED_NAMES = "voices.json"
+
+
+def load_pretrained(model_cls, config_cls, model_path, device):
+    """`model_cls.from_pretrained(model_path)` with the safetensors weights memory-mapped into the model.
+
+    The modules are built without initializing weights the checkpoint replaces
+    anyway and adopt the mapped tensors instead of copying them (on CPU), so a
+    restart only touches pages already in the page cache and processes loading
+    the same file share them. Checkpoints this cannot map fall back to
+    from_pretrained.
+    """
+    from transformers.modeling_utils import no_init_weights
+    from safetensors.torch import load_file
+
+    weights_path = os.path.join(model_path, "model.safetensors")
+    if os.path.exists(weights_path):
+        with no_init_weights():
+            model = model_cls(config_cls.from_pretrained(model_path))
+        state_dict = load_file(weights_path, device=str(device))
+        missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+        if not missing:
+            if unexpected:
+                logger.debug(f"Ignored {len(unexpected)} unexpected weights in {weights_path}")
+            return model.to(device).eval()
+        logger.warning(f"{weights_path} lacks {len(missing)} weights ({missing[0]}, ...), using from_pretrained")
+
+    return model_cls.from_pretrained(model_path).to(device).eval()
+
+
+def _read_embeddings(emb_dir, names):
+    """The (names, rows) of the .pt embeddings that load, skipping broken files"""
+    loaded, rows = [], []
+    for name in names:
+        emb_path = os.path.join(emb_dir, f"{name}.pt")
+        try:
+            rows.append(torch.load(emb_path, map_location="cpu").reshape(-1).float().numpy())
+            loaded.append(name)
+        except Exception as e:
+            logger.info(f"Failed to load embedding {emb_path}: {str(e)}")
+    return loaded, rows
+
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_voice_embeddings(emb_dir, device):
+    """{voice: (1, dim) tensor} for the .pt speaker embeddings in `emb_dir`.
+
+    They are packed into voices.npy / voices.json on first use (and again when a
+    .pt file changes), later starts memory-map that one array instead of
+    unpickling every file. A read-only directory just skips the packing.
+    """
+    names = sorted(fname[:-len(".pt")] for fname in os.listdir(emb_dir) if fname.endswith(".pt"))
+    packed_path = os.path.join(emb_dir, PACKED_EMBEDDINGS)
+    names_path = os.path.join(emb_dir, PACKED_NAMES)
+
+    if os.path.exists(packed_path) and os.path.exists(names_path):
+        newest = max((os.path.getmtime(os.path.join(emb_dir, f"{name}.pt")) for name in names), default=0.0)
+        with open(names_path, encoding="utf-8") as f:
+            packed_names = json.load(f)
+        if packed_names == names and os.path.getmtime(packed_path) >= newest:
+            # Copy-on-write keeps the mapped rows writable for torch.from_numpy
+            packed = np.load(packed_path, mmap_mode="c")
+            return {name: torch.from_numpy(packed[i:i + 1]).to(device) for i, name in enumerate(names)}
+
+    names, rows = _read_embeddings(emb_dir, names)
+    if not names:
+        return {}
+    packed = np.stack(rows)
+    try:
+        _write_atomic(packed_path, lambda f: np.save(f, packed))
+        _write_atomic(names_path, lambda f: f.write(json.dumps(names).encode("utf-8")))
+        logger.info(f"Packed {len(names)} voice embeddings into {packed_path}")
+    except OSError as e:
+        logger.warning(f"Could not write {packed_path}, the next start loads the .pt files again: {str(e)}")
+    return {name: torch.from_numpy(packed[i:i + 1]).to(device) for i, name in enumerate(names)}
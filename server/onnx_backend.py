@@ -0,0 +1,108 @@
+import os
+import json
+import types
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("onnx_backend")
+
+# Graphs written by export_onnx.py
+ONNX_GRAPHS = ("encoder", "decoder_init", "decoder_step", "postnet", "vocoder")
+
+
+class OnnxSpeechT5:
+    """SpeechT5 and the HiFi-GAN vocoder exported by export_onnx.py, run on onnxruntime's CPU provider.
+
+    Offers the same decode_steps() contract as speecht5_decoding.decode_steps on
+    numpy arrays, and render() for the postnet and vocoder, so the engine can
+    swap it in for the PyTorch modules.
+    """
+
+    def __init__(self, onnx_dir, intra_op_threads=0, inter_op_threads=1):
+        import onnxruntime as ort
+
+        with open(os.path.join(onnx_dir, "config.json"), encoding="utf-8") as f:
+            self.config = types.SimpleNamespace(**json.load(f))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Each graph is a chain of dependent ops, so parallelism comes from inside the ops
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads  # 0 lets onnxruntime use one per physical core
+        options.inter_op_num_threads = inter_op_threads
+
+        self.sessions = {
+            name: ort.InferenceSession(os.path.join(onnx_dir, f"{name}.onnx"), options, providers=["CPUExecutionProvider"])
+            for name in ONNX_GRAPHS
+        }
+        # The step graph has no encoder_hidden_states input since its cross-attention keys and values are cached
+        self._input_names = {name: [i.name for i in session.get_inputs()] for name, session in self.sessions.items()}
+        self._rng = np.random.default_rng()
+        logger.info(f"onnxruntime {ort.__version__} sessions ready, intra-op threads {intra_op_threads or 'auto'}, inter-op {inter_op_threads}")
+
+    def seed(self, seed):
+        """Make the prenet dropout masks reproducible"""
+        self._rng = np.random.default_rng(seed)
+
+    def _prenet_masks(self):
+        # The decoder prenet keeps dropout on at inference; like torch.bernoulli(x, p) in the
+        # original a unit is kept with probability p and scaled by 1 / (1 - p)
+        p = self.config.speech_decoder_prenet_dropout
+        shape = (self.config.speech_decoder_prenet_layers, self.config.speech_decoder_prenet_units)
+        return (self._rng.random(shape) < p).astype(np.float32) / (1.0 - p)
+
+    def _run(self, name, feeds):
+        return self.sessions[name].run(None, {key: feeds[key] for key in self._input_names[name]})
+
+    def decode_steps(self, input_ids, attention_mask, speaker_embeddings, stopping):
+        """Yield (spectrum, rows, stopped) per decoder step, see speecht5_decoding.decode_steps"""
+        config = self.config
+        input_ids = input_ids.astype(np.int64)
+        attention_mask = attention_mask.astype(np.int64)
+        speaker_embeddings = speaker_embeddings.astype(np.float32)
+
+        encoder_hidden_states = self._run("encoder", {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+        feeds = {
+            "frame": np.zeros((input_ids.shape[0], 1, config.num_mel_bins), dtype=np.float32),
+            "speaker_embeddings": speaker_embeddings,
+            "encoder_hidden_states": encoder_hidden_states,
+            "encoder_attention_mask": attention_mask,
+        }
+
+        while stopping.active:
+            feeds["position"] = np.array([stopping.steps], dtype=np.int64)
+            feeds["prenet_masks"] = self._prenet_masks()
+
+            if stopping.steps == 0:
+                # The first step also computes the cross-attention keys and values, reused by every later step
+                spectrum, prob, *present = self._run("decoder_init", feeds)
+                for layer in range(config.decoder_layers):
+                    self_key, self_value, cross_key, cross_value = present[4 * layer:4 * layer + 4]
+                    feeds[f"past.{layer}.self_key"] = self_key
+                    feeds[f"past.{layer}.self_value"] = self_value
+                    feeds[f"past.{layer}.cross_key"] = cross_key
+                    feeds[f"past.{layer}.cross_value"] = cross_value
+            else:
+                spectrum, prob, *present = self._run("decoder_step", feeds)
+                for layer in range(config.decoder_layers):
+                    feeds[f"past.{layer}.self_key"] = present[2 * layer]
+                    feeds[f"past.{layer}.self_value"] = present[2 * layer + 1]
+
+            rows = stopping.active
+            stopped = stopping.step(prob.sum(axis=-1).tolist())
+            yield spectrum, rows, [rows[i] for i in stopped]
+
+            feeds["frame"] = spectrum[:, -1:, :]
+            if stopped and stopping.active:
+                # Rows that stopped leave the batch, every per-row input shrinks with them
+                keep = [i for i in range(len(rows)) if i not in stopped]
+                for name in feeds:
+                    if name not in ("position", "prenet_masks"):
+                        feeds[name] = feeds[name][keep]
+
+    def render(self, mel, start, stop):
+        """Postnet over a (frames, num_mel_bins) array, then the vocoded samples of rows start:stop"""
+        mel = self.sessions["postnet"].run(None, {"spectrogram": mel[np.newaxis].astype(np.float32)})[0]
+        return self.sessions["vocoder"].run(None, {"spectrogram": mel[:, start:stop]})[0][0]
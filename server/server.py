@@ -1,8 +1,18 @@
 import grpc
+import asyncio
 from concurrent import futures
+import threading
 import time
+import math
 import logging
 import os
+import signal
+import ipaddress
+
+# Cold-start clock, the breakdown is logged once the server reports SERVING
+process_start = time.perf_counter()
+startup_times = {}
+
 from common import service_pb2, service_pb2_grpc
 # Import health service
 from grpc_health.v1 import health_pb2_grpc
@@ -24,87 +34,240 @@ logging.basicConfig(
 )
 logger = logging.getLogger("tts_server")
 
-# Fix the imports by ensuring proper order
-from text_preprocessing import preprocess_for_tts
-from tts_engine import TextToSpeechEngine
+# The engine (torch, transformers) is imported in create_engine(), after the port is open
+from audio_format import StreamEncoder, transcode_wav, OUTPUT_FORMATS
+from admission import AdmissionController, AdmissionRejected, estimate_cost
+from cancellation import CancellationToken, RequestCancelled
 
 # Lazy model loading in worker scope
 tts_engine = None
+admission_controller = None
+# Set once the engine is loaded and warmed up; RPCs before that get UNAVAILABLE
+engine_ready = threading.Event()
+# Compressed encodings run here, off the threads that wait on synthesis
+encoder_pool = None
+
+# Seconds running calls get to finish on SIGTERM, below docker stop's 10s before SIGKILL
+SHUTDOWN_GRACE = float(os.environ.get("SHUTDOWN_GRACE_SECONDS", "5"))
+
+# Metadata key identifying the caller for per-client limits, falls back to the peer address
+CLIENT_ID_METADATA_KEY = os.environ.get("CLIENT_ID_METADATA_KEY", "x-client-id")
+# Peers (the REST gateway) allowed to name the client in that metadata; anyone else
+# could rotate it to get around the limits, so they are keyed by their address
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.environ.get("TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+def _is_trusted_proxy(peer):
+    # "ipv4:10.0.0.5:53422" / "ipv6:[::1]:53422"; unix sockets and the rest are not trusted
+    scheme, _, address = peer.partition(":")
+    if scheme not in ("ipv4", "ipv6"):
+        return False
+    try:
+        host = ipaddress.ip_address(address.rsplit(":", 1)[0].strip("[]"))
+    except ValueError:
+        return False
+    return any(host in network for network in TRUSTED_PROXIES)
+
+def _client_id(context):
+    peer = context.peer()
+    if _is_trusted_proxy(peer):
+        for key, value in context.invocation_metadata():
+            if key == CLIENT_ID_METADATA_KEY:
+                return value
+    # "ipv4:10.0.0.5:53422" -> "ipv4:10.0.0.5", so every connection of a host shares its limit
+    return peer.rsplit(":", 1)[0]
+
+def _reject(context, rejection):
+    logger.warning(f"Rejecting request from {_client_id(context)}: {str(rejection)}")
+    context.set_trailing_metadata((("retry-after", str(rejection.retry_after)),))
+    context.set_details(str(rejection))
+    context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+
+def _cancellation_token(context):
+    """Token that fires when the RPC terminates (client gone) or its deadline passes"""
+    token = CancellationToken.with_timeout(context.time_remaining())
+    context.add_callback(token.cancel)
+    return token
+
+def _stopped(context, token, error):
+    logger.info(f"Stopped synthesis early: {str(error)}")
+    context.set_details(str(error))
+    context.set_code(grpc.StatusCode.DEADLINE_EXCEEDED if token.expired() else grpc.StatusCode.CANCELLED)
+
+def _output_format(request, context):
+    """The requested output format, or None after setting INVALID_ARGUMENT"""
+    audio_format = (request.format or "wav").lower()
+    if audio_format not in OUTPUT_FORMATS:
+        context.set_details(f"Unsupported format '{request.format}', expected one of: {', '.join(OUTPUT_FORMATS)}")
+        context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+        return None
+    return audio_format
+
+def _decoding_options(request, context):
+    """Decoding option overrides set on the request, or None after setting INVALID_ARGUMENT"""
+    decoding = {}
+    for field, option in (("stop_threshold", "threshold"), ("min_len_ratio", "minlenratio"), ("max_len_ratio", "maxlenratio")):
+        if request.HasField(field):
+            decoding[option] = getattr(request, field)
+
+    error = None
+    if any(not math.isfinite(value) or value < 0 for value in decoding.values()):
+        error = "Decoding options must be finite and not negative"
+    elif decoding.get("threshold", 1.0) == 0 or decoding.get("maxlenratio", 1.0) == 0:
+        error = "stop_threshold and max_len_ratio must be above 0"
+    elif decoding.get("minlenratio", 0.0) > decoding.get("maxlenratio", float("inf")):
+        error = "min_len_ratio cannot exceed max_len_ratio"
+    if error:
+        context.set_details(error)
+        context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+        return None
+    return decoding
+
+def _encode(audio_format, fn, *args):
+    # WAV only prepends a header, not worth a thread hop
+    if audio_format == "wav":
+        return fn(*args)
+    return encoder_pool.submit(fn, *args).result()
+
+def _not_ready(context):
+    """Set UNAVAILABLE and return True while the engine is still starting"""
+    if engine_ready.is_set():
+        return False
+    context.set_details("Server is starting up")
+    context.set_code(grpc.StatusCode.UNAVAILABLE)
+    return True
+
+def _admit(request, context):
+    """Admit the request or set RESOURCE_EXHAUSTED with a retry-after hint and return None"""
+    if _not_ready(context):
+        return None
+    try:
+        return admission_controller.admit(_client_id(context), estimate_cost(request.text))
+    except AdmissionRejected as rejection:
+        _reject(context, rejection)
+        return None
+
+def _stream_reply(first, chunk_index, text_chunk, audio_chunk, elapsed, is_last, audio_format):
+    # For WAV only the first reply carries a (streaming) header, the rest are raw PCM
+    # frames; compressed formats continue one encoded stream. Either way the concatenated
+    # audio_data of the stream is one file. chunk_index counts text chunks, not replies,
+    # and the total is only known on the last reply.
+    if audio_format == "wav" and not first:
+        audio_format = "pcm_s16le"
+
+    return service_pb2.AudioReply(
+        audio_data=audio_chunk,
+        format=audio_format,
+        # A text chunk vocoded incrementally spans several replies, only its first carries the text
+        chunks=[text_chunk] if text_chunk else [],
+        time_taken=elapsed,
+        chunk_index=chunk_index,
+        total_chunks=chunk_index if is_last else 0
+    )
 
 class TTSServiceServicer(service_pb2_grpc.TTSServiceServicer):
     def Generate(self, request, context):
         global tts_engine
         logger.info(f"[gRPC Server] Received: text='{request.text[:50]}...', voice='{request.voice or 'default'}'")
 
+        audio_format = _output_format(request, context)
+        if audio_format is None:
+            return service_pb2.AudioReply()
+        decoding = _decoding_options(request, context)
+        if decoding is None:
+            return service_pb2.AudioReply()
+
+        ticket = _admit(request, context)
+        if ticket is None:
+            return service_pb2.AudioReply()
+
+        token = _cancellation_token(context)
         try:
-            audio, chunks, elapsed = tts_engine.generate(request.text, voice=request.voice)
-            logger.info(f"Generated {len(audio)} bytes of audio in {elapsed:.2f}s")
+            audio, chunks, elapsed = tts_engine.generate(request.text, voice=request.voice, token=token, decoding=decoding)
+            audio = _encode(audio_format, transcode_wav, audio, audio_format)
+            logger.info(f"Generated {len(audio)} bytes of {audio_format} audio in {elapsed:.2f}s")
             return service_pb2.AudioReply(
                 audio_data=audio,
-                format="wav",
+                format=audio_format,
                 chunks=chunks,
                 time_taken=elapsed
             )
+        except RequestCancelled as e:
+            _stopped(context, token, e)
+            return service_pb2.AudioReply()
         except Exception as e:
             logger.error(f"Error generating audio: {str(e)}", exc_info=True)
             context.set_details(str(e))
             context.set_code(grpc.StatusCode.INTERNAL)
             return service_pb2.AudioReply()
+        finally:
+            admission_controller.release(ticket)
 
     def StreamGenerate(self, request, context):
         global tts_engine
         logger.info(f"Received StreamGenerate request: text='{request.text[:50]}...', voice='{request.voice or 'default'}'")
-        
+
+        audio_format = _output_format(request, context)
+        if audio_format is None:
+            return
+        decoding = _decoding_options(request, context)
+        if decoding is None:
+            return
+
+        ticket = _admit(request, context)
+        if ticket is None:
+            return
+
+        token = _cancellation_token(context)
+        encoder = StreamEncoder(audio_format)
         try:
-            # First, preprocess the text into chunks
-            text_chunks = preprocess_for_tts(request.text)
-            if not text_chunks:
-                context.set_details("No valid text chunks after preprocessing")
-                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-                return
-            
-            # Get voice embedding once to reuse for all chunks
-            voice_id = tts_engine.voice_map.get(request.voice, "slt")
-            
             start_time = time.time()
             chunk_index = 0
-            
-            # Process each text chunk separately and stream results
-            for text_chunk in text_chunks:
-                chunk_start = time.time()
-                
-                # Generate audio for this chunk
-                audio_chunk, _, chunk_elapsed = tts_engine.generate_single_chunk(
-                    text_chunk, 
-                    voice=voice_id
-                )
-                
-                chunk_index += 1
-                logger.debug(f"Generated chunk {chunk_index}/{len(text_chunks)} in {chunk_elapsed:.2f}s")
-                
+            replies = 0
+
+            # Chunks are preprocessed incrementally and synthesized as soon as they are available;
+            # the engine stops queueing them once the client disconnects or the deadline passes
+            for text_chunk, pcm, chunk_elapsed, is_last in tts_engine.stream(request.text, voice=request.voice, token=token, decoding=decoding):
+                replies += 1
+                # Only the first piece of an incrementally vocoded chunk carries its text
+                if text_chunk:
+                    chunk_index += 1
+                logger.debug(f"Generated reply {replies} (chunk {chunk_index}) in {chunk_elapsed:.2f}s")
+
+                # The following chunks keep synthesizing on the batch scheduler while this one is encoded
+                audio_chunk = _encode(audio_format, encoder.encode, pcm, is_last)
+
                 # Stream this chunk back to the client
-                yield service_pb2.AudioReply(
-                    audio_data=audio_chunk,
-                    format="wav",
-                    chunks=[text_chunk],
-                    time_taken=chunk_elapsed,
-                    chunk_index=chunk_index,
-                    total_chunks=len(text_chunks)
-                )
-                
+                yield _stream_reply(replies == 1, chunk_index, text_chunk, audio_chunk, chunk_elapsed, is_last, audio_format)
+
+            if chunk_index == 0:
+                context.set_details("No valid text chunks after preprocessing")
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                return
+
             total_elapsed = time.time() - start_time
-            logger.info(f"Completed streaming {len(text_chunks)} chunks in {total_elapsed:.2f}s")
+            logger.info(f"Completed streaming {chunk_index} chunks in {replies} replies in {total_elapsed:.2f}s")
 
+        except RequestCancelled as e:
+            _stopped(context, token, e)
+            return
         except Exception as e:
             logger.error(f"Error in streaming audio generation: {str(e)}", exc_info=True)
             context.set_details(str(e))
             context.set_code(grpc.StatusCode.INTERNAL)
             return
+        finally:
+            # Also runs when the client cancels and the generator is closed
+            admission_controller.release(ticket)
+            encoder.close()
 
     def ChatTTS(self, request_iterator, context):
         global tts_engine
         logger.info("Received ChatTTS request stream")
-        
+
+        token = _cancellation_token(context)
         try:
             message_count = 0
             
@@ -115,61 +278,450 @@ class TTSServiceServicer(service_pb2_grpc.TTSServiceServicer):
                 if not request.text.strip():
                     logger.warning("Skipping empty message")
                     continue
+
+                audio_format = _output_format(request, context)
+                if audio_format is None:
+                    return
+                decoding = _decoding_options(request, context)
+                if decoding is None:
+                    return
                 
+                ticket = _admit(request, context)
+                if ticket is None:
+                    return
+
                 # Generate audio for this message
-                audio, chunks, elapsed = tts_engine.generate(request.text, voice=request.voice)
+                try:
+                    audio, chunks, elapsed = tts_engine.generate(request.text, voice=request.voice, token=token, decoding=decoding)
+                finally:
+                    admission_controller.release(ticket)
+                audio = _encode(audio_format, transcode_wav, audio, audio_format)
                 
                 logger.info(f"Generated response for message {message_count} in {elapsed:.2f}s")
                 
                 # Send back the audio reply
                 yield service_pb2.AudioReply(
                     audio_data=audio,
-                    format="wav",
+                    format=audio_format,
                     chunks=chunks,
                     time_taken=elapsed,
                     message_id=request.message_id if hasattr(request, 'message_id') else str(message_count)
                 )
                 
             logger.info(f"Completed ChatTTS session with {message_count} messages")
-            
+
+        except RequestCancelled as e:
+            _stopped(context, token, e)
+            return
         except Exception as e:
             logger.error(f"Error in ChatTTS session: {str(e)}", exc_info=True)
             context.set_details(str(e))
             context.set_code(grpc.StatusCode.INTERNAL)
             return
 
-def serve():
-    global tts_engine
+class AsyncTTSServiceServicer(service_pb2_grpc.TTSServiceServicer):
+    """grpc.aio servicer: RPCs and streaming run on the event loop, inference on an executor.
+
+    A stream only occupies an executor thread while its next chunk is being produced,
+    so idle or slow-consuming clients do not hold workers.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _encode(self, audio_format, fn, *args):
+        if audio_format == "wav":
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(encoder_pool, fn, *args)
+
+    def _cancellation_token(self, context):
+        token = CancellationToken.with_timeout(context.time_remaining())
+        context.add_done_callback(lambda _: token.cancel())
+        return token
+
+    async def _admit(self, request, context):
+        if _not_ready(context):
+            return None
+        try:
+            return await admission_controller.admit_async(_client_id(context), estimate_cost(request.text))
+        except AdmissionRejected as rejection:
+            _reject(context, rejection)
+            return None
+
+    async def Generate(self, request, context):
+        logger.info(f"[gRPC Server] Received: text='{request.text[:50]}...', voice='{request.voice or 'default'}'")
+
+        audio_format = _output_format(request, context)
+        if audio_format is None:
+            return service_pb2.AudioReply()
+        decoding = _decoding_options(request, context)
+        if decoding is None:
+            return service_pb2.AudioReply()
+
+        ticket = await self._admit(request, context)
+        if ticket is None:
+            return service_pb2.AudioReply()
+
+        token = self._cancellation_token(context)
+        try:
+            audio, chunks, elapsed = await self._run(tts_engine.generate, request.text, request.voice, token, decoding)
+            audio = await self._encode(audio_format, transcode_wav, audio, audio_format)
+            logger.info(f"Generated {len(audio)} bytes of {audio_format} audio in {elapsed:.2f}s")
+            return service_pb2.AudioReply(
+                audio_data=audio,
+                format=audio_format,
+                chunks=chunks,
+                time_taken=elapsed
+            )
+        except RequestCancelled as e:
+            _stopped(context, token, e)
+            return service_pb2.AudioReply()
+        except Exception as e:
+            logger.error(f"Error generating audio: {str(e)}", exc_info=True)
+            context.set_details(str(e))
+            context.set_code(grpc.StatusCode.INTERNAL)
+            return service_pb2.AudioReply()
+        finally:
+            admission_controller.release(ticket)
 
+    async def StreamGenerate(self, request, context):
+        logger.info(f"Received StreamGenerate request: text='{request.text[:50]}...', voice='{request.voice or 'default'}'")
+
+        audio_format = _output_format(request, context)
+        if audio_format is None:
+            return
+        decoding = _decoding_options(request, context)
+        if decoding is None:
+            return
+
+        ticket = await self._admit(request, context)
+        if ticket is None:
+            return
+
+        token = self._cancellation_token(context)
+        encoder = StreamEncoder(audio_format)
+        chunk_stream = tts_engine.stream(request.text, voice=request.voice, token=token, decoding=decoding)
+        try:
+            start_time = time.time()
+            chunk_index = 0
+            replies = 0
+
+            while True:
+                item = await self._run(next, chunk_stream, None)
+                if item is None:
+                    break
+                text_chunk, pcm, chunk_elapsed, is_last = item
+                replies += 1
+                if text_chunk:
+                    chunk_index += 1
+                logger.debug(f"Generated reply {replies} (chunk {chunk_index}) in {chunk_elapsed:.2f}s")
+                audio_chunk = await self._encode(audio_format, encoder.encode, pcm, is_last)
+
+                # The yield waits on flow control, so the next chunk is not requested
+                # from the engine until a slow client has caught up
+                yield _stream_reply(replies == 1, chunk_index, text_chunk, audio_chunk, chunk_elapsed, is_last, audio_format)
+
+            if chunk_index == 0:
+                context.set_details("No valid text chunks after preprocessing")
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                return
+
+            total_elapsed = time.time() - start_time
+            logger.info(f"Completed streaming {chunk_index} chunks in {replies} replies in {total_elapsed:.2f}s")
+
+        except RequestCancelled as e:
+            _stopped(context, token, e)
+        except Exception as e:
+            logger.error(f"Error in streaming audio generation: {str(e)}", exc_info=True)
+            context.set_details(str(e))
+            context.set_code(grpc.StatusCode.INTERNAL)
+        finally:
+            admission_controller.release(ticket)
+            encoder.close()
+            try:
+                # Drops the chunks queued ahead; a generator still running on the executor
+                # stops by itself through the token
+                chunk_stream.close()
+            except ValueError:
+                pass
+
+    async def ChatTTS(self, request_iterator, context):
+        logger.info("Received ChatTTS request stream")
+
+        token = self._cancellation_token(context)
+        try:
+            message_count = 0
+
+            async for request in request_iterator:
+                message_count += 1
+                logger.info(f"Processing message {message_count}: text='{request.text[:50]}...', voice='{request.voice or 'default'}'")
+
+                if not request.text.strip():
+                    logger.warning("Skipping empty message")
+                    continue
+
+                audio_format = _output_format(request, context)
+                if audio_format is None:
+                    return
+                decoding = _decoding_options(request, context)
+                if decoding is None:
+                    return
+
+                ticket = await self._admit(request, context)
+                if ticket is None:
+                    return
+
+                try:
+                    audio, chunks, elapsed = await self._run(tts_engine.generate, request.text, request.voice, token, decoding)
+                finally:
+                    admission_controller.release(ticket)
+                audio = await self._encode(audio_format, transcode_wav, audio, audio_format)
+
+                logger.info(f"Generated response for message {message_count} in {elapsed:.2f}s")
+
+                yield service_pb2.AudioReply(
+                    audio_data=audio,
+                    format=audio_format,
+                    chunks=chunks,
+                    time_taken=elapsed,
+                    message_id=request.message_id or str(message_count)
+                )
+
+            logger.info(f"Completed ChatTTS session with {message_count} messages")
+
+        except RequestCancelled as e:
+            _stopped(context, token, e)
+        except Exception as e:
+            logger.error(f"Error in ChatTTS session: {str(e)}", exc_info=True)
+            context.set_details(str(e))
+            context.set_code(grpc.StatusCode.INTERNAL)
+
+def _log_stats_periodically(interval, engine, admission):
+    while True:
+        time.sleep(interval)
+        logger.info(f"Engine stats: {engine.get_stats()}")
+        logger.info(f"Admission stats: {admission.get_stats()}")
+
+def create_engine():
     # Create TTS engine instance
-    max_workers = int(os.environ.get("MAX_WORKERS", "10"))
     model_dir = os.environ.get("MODEL_DIR", "./models")
+    cache_dir = os.environ.get("CACHE_DIR", "./cache")
+    disk_cache_max_mb = int(os.environ.get("DISK_CACHE_MAX_MB", "1024"))
+    chunk_cache_max_mb = int(os.environ.get("CHUNK_CACHE_MAX_MB", "256"))
+    audio_cache_max_mb = int(os.environ.get("AUDIO_CACHE_MAX_MB", "256"))
+    max_chunk_tokens = int(os.environ.get("MAX_CHUNK_TOKENS", "250"))
+    min_chunk_tokens = int(os.environ.get("MIN_CHUNK_TOKENS", "30"))
+    max_batch_size = int(os.environ.get("MAX_BATCH_SIZE", "8"))
+    max_batch_wait_ms = float(os.environ.get("MAX_BATCH_WAIT_MS", "10"))
+    parallel_chunks = os.environ.get("PARALLEL_CHUNKS", "1") == "1"
+    worker_processes = int(os.environ.get("WORKER_PROCESSES", "0"))
+    threads_per_worker = int(os.environ.get("THREADS_PER_WORKER", "0")) or None
+    pin_worker_cores = os.environ.get("PIN_WORKER_CORES", "1") == "1"
+    share_worker_weights = os.environ.get("SHARE_WORKER_WEIGHTS", "0") == "1"
+    incremental_vocoding = os.environ.get("INCREMENTAL_VOCODING", "1") == "1"
+    vocoder_window_frames = int(os.environ.get("VOCODER_WINDOW_FRAMES", "16"))
+    precision = os.environ.get("INFERENCE_PRECISION", "fp32")
+    vocoder_backend = os.environ.get("VOCODER_BACKEND", "eager")
+    runtime = os.environ.get("TTS_RUNTIME", "torch")
+    onnx_intra_op_threads = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))
+    onnx_inter_op_threads = int(os.environ.get("ONNX_INTER_OP_THREADS", "1"))
+    stop_threshold = float(os.environ.get("STOP_THRESHOLD", "0.5"))
+    min_len_ratio = float(os.environ.get("MIN_LEN_RATIO", "0.0"))
+    max_len_ratio = float(os.environ.get("MAX_LEN_RATIO", "20.0"))
+    warm_up = os.environ.get("WARM_UP", "1") == "1"
+    warm_up_batch_sizes = [int(size) for size in
+                           os.environ.get("WARM_UP_BATCH_SIZES", f"1,{max_batch_size}").split(",") if size.strip()]
+
+    engine_kwargs = dict(
+        model_dir=model_dir,
+        cache_dir=cache_dir,
+        max_batch_size=max_batch_size,
+        max_batch_wait_ms=max_batch_wait_ms,
+        parallel_chunks=parallel_chunks,
+        disk_cache_max_bytes=disk_cache_max_mb * 1024 * 1024,
+        chunk_cache_max_bytes=chunk_cache_max_mb * 1024 * 1024,
+        audio_cache_max_bytes=audio_cache_max_mb * 1024 * 1024,
+        max_chunk_tokens=max_chunk_tokens,
+        min_chunk_tokens=min_chunk_tokens,
+        incremental_vocoding=incremental_vocoding,
+        vocoder_window_frames=vocoder_window_frames,
+        precision=precision,
+        vocoder_backend=vocoder_backend,
+        runtime=runtime,
+        onnx_intra_op_threads=onnx_intra_op_threads,
+        onnx_inter_op_threads=onnx_inter_op_threads,
+        stop_threshold=stop_threshold,
+        min_len_ratio=min_len_ratio,
+        max_len_ratio=max_len_ratio,
+    )
+
+    from tts_engine import TextToSpeechEngine
+    from worker_pool import ProcessWorkerPool
+    startup_times["imports"] = time.perf_counter() - process_start
 
     logger.info(f"Initializing TTS engine with model directory: {model_dir}")
-    tts_engine = TextToSpeechEngine(model_dir=model_dir)
+    if worker_processes > 0:
+        # Each worker process owns a model replica; the gRPC threads only dispatch work
+        engine = ProcessWorkerPool(
+            worker_processes,
+            engine_kwargs,
+            threads_per_worker=threads_per_worker,
+            pin_cores=pin_worker_cores,
+            share_weights=share_worker_weights,
+        )
+    else:
+        engine = TextToSpeechEngine(**engine_kwargs)
+    if warm_up:
+        # The first synthesis pays for lazily initialized kernels and allocators, not a request;
+        # a pool runs it in every worker
+        engine.warm_up(warm_up_batch_sizes)
+    # Phases of a single engine; pool workers load and warm up in parallel
+    startup_times.update(engine.startup_times)
+    logger.info(f"Batching up to {max_batch_size} chunks per forward pass, waiting at most {max_batch_wait_ms}ms")
+    return engine
+
+def server_options():
+    max_message_bytes = int(os.environ.get("GRPC_MAX_MESSAGE_MB", "64")) * 1024 * 1024
+    return [
+        ("grpc.max_receive_message_length", max_message_bytes),
+        ("grpc.max_send_message_length", max_message_bytes),
+        # Accept the REST gateway's keepalive pings on idle pooled channels instead of
+        # answering them with GOAWAY (too_many_pings)
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.min_recv_ping_interval_without_data_ms", 10000),
+        ("grpc.http2.max_ping_strikes", 0),
+    ]
+
+def create_admission_controller(engine):
+    # Work is estimated from the normalized text, so overload is refused up front with a
+    # retry-after hint instead of queueing until the caller's deadline expires
+    return AdmissionController(
+        max_inflight_tokens=int(os.environ.get("ADMISSION_MAX_TOKENS", "6000")),
+        max_queue_depth=int(os.environ.get("ADMISSION_MAX_QUEUE_DEPTH", "0")),
+        max_requests_per_client=int(os.environ.get("MAX_REQUESTS_PER_CLIENT", "4")),
+        max_wait_ms=float(os.environ.get("ADMISSION_MAX_WAIT_MS", "200")),
+        queue_depth_fn=engine.queue_depth,
+    )
+
+def create_encoder_pool():
+    return futures.ThreadPoolExecutor(
+        max_workers=int(os.environ.get("ENCODER_THREADS", "2")),
+        thread_name_prefix="tts-encoder",
+    )
+
+def load_phrases(path):
+    """Phrases to precompute, one per line; blank lines and # comments are skipped"""
+    if not path:
+        return []
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    except OSError as e:
+        logger.warning(f"Could not read warm-up phrases from {path}: {str(e)}")
+        return []
+
+def start_engine():
+    """Load the engine and warm it up, then accept requests and log where the cold start went"""
+    global tts_engine, admission_controller, encoder_pool
+
+    engine = create_engine()
+    phrases = load_phrases(os.environ.get("WARM_UP_PHRASES", ""))
+    if phrases:
+        # Common phrases land in the caches before the first request asks for them
+        start_time = time.perf_counter()
+        engine.precompute(phrases)
+        startup_times["phrases"] = time.perf_counter() - start_time
+    admission_controller = create_admission_controller(engine)
+    encoder_pool = create_encoder_pool()
+    tts_engine = engine
+    engine_ready.set()
+
+    # Queue depth and batch sizes are logged so the wait window can be tuned against latency
+    stats_interval = float(os.environ.get("STATS_LOG_INTERVAL", "60"))
+    if stats_interval > 0:
+        threading.Thread(
+            target=_log_stats_periodically,
+            args=(stats_interval, engine, admission_controller),
+            daemon=True,
+        ).start()
+
+    total = time.perf_counter() - process_start
+    phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_times.items())
+    logger.info(f"Cold start took {total:.2f}s ({phases}, other {total - sum(startup_times.values()):.2f}s)")
+
+def stop_engine():
+    if tts_engine is not None:
+        logger.info("Shutting down the TTS engine")
+        tts_engine.shutdown()
+
+async def serve_async():
+    max_workers = int(os.environ.get("MAX_WORKERS", "10"))
+
+    # Threads that wait on the engine; RPC handling and streaming stay on the event loop
+    inference_executor = futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-inference")
+
+    server = grpc.aio.server(options=server_options())
+    service_pb2_grpc.add_TTSServiceServicer_to_server(AsyncTTSServiceServicer(inference_executor), server)
+
+    health_service = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_service, server)
+
+    port = os.environ.get("PORT", "50051")
+    server.add_insecure_port(f"[::]:{port}")
+
+    # The port opens right away so the process shows as alive, but not ready until the engine is warm
+    await health_service.set('tts.TTSService', health_pb2.HealthCheckResponse.NOT_SERVING)
+    logger.info(f"Starting asyncio gRPC server on port {port} with {max_workers} inference threads")
+    await server.start()
+
+    await asyncio.get_running_loop().run_in_executor(None, start_engine)
+    await health_service.set('tts.TTSService', health_pb2.HealthCheckResponse.SERVING)
+
+    logger.info("Server started successfully")
+    # docker stop sends SIGTERM: let running calls finish, then persist the caches
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(server.stop(SHUTDOWN_GRACE)))
+    await server.wait_for_termination()
+    stop_engine()
+
+def serve():
+    if os.environ.get("GRPC_ASYNC", "0") == "1":
+        asyncio.run(serve_async())
+        return
+
+    max_workers = int(os.environ.get("MAX_WORKERS", "10"))
 
     # Set up server with thread pool
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), options=server_options())
     service_pb2_grpc.add_TTSServiceServicer_to_server(TTSServiceServicer(), server)
 
+    # Add health service; services must be registered before the server starts
+    health_service = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_service, server)
+
     # Configure server address
     port = os.environ.get("PORT", "50051")
     server_address = f"[::]:{port}"
     server.add_insecure_port(server_address)
 
-    # Start the server
+    # The port opens right away so the process shows as alive, but not ready until the engine is warm
+    health_service.set('tts.TTSService', health_pb2.HealthCheckResponse.NOT_SERVING)
     logger.info(f"Starting gRPC server on port {port} with {max_workers} workers")
     server.start()
 
-    # Add health service
-    health_service = health.HealthServicer()
-    health_pb2_grpc.add_HealthServicer_to_server(health_service, server)
-
-    # Register health status
+    start_engine()
     health_service.set('tts.TTSService', health_pb2.HealthCheckResponse.SERVING)
 
     logger.info("Server started successfully")
-    server.wait_for_termination()
+    # docker stop sends SIGTERM: let running calls finish, then persist the caches
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop(SHUTDOWN_GRACE))
+    try:
+        server.wait_for_termination()
+    finally:
+        server.stop(0)
+        stop_engine()
 
 if __name__ == "__main__":
-    serve()
\ No newline at end of file
+    serve()
@@ -0,0 +1,264 @@
+import collections
+import threading
+
+import numpy as np
+import torch
+from torch import nn
+
+
+# Stop rules of the decoding loop, defaults as in transformers' generate_speech
+DecodingOptions = collections.namedtuple("DecodingOptions", ["threshold", "minlenratio", "maxlenratio"])
+DEFAULT_DECODING = DecodingOptions(threshold=0.5, minlenratio=0.0, maxlenratio=20.0)
+
+
+class StoppingCriteria:
+    """Decides when each row of a batch stops decoding, and tracks the rows still active.
+
+    A row stops once its summed stop probability reaches its `threshold`, but
+    not before `minlenratio` and at the latest after `maxlenratio` decoder steps
+    per token of its own text, divided by the reduction factor (transformers
+    measures both against the padded length, so a short chunk batched with a
+    long one could run on far past its end).
+    """
+
+    def __init__(self, text_lengths, reduction_factor, options):
+        self.options = list(options)
+        self.minlens = [int(n * o.minlenratio / reduction_factor) for n, o in zip(text_lengths, self.options)]
+        self.maxlens = [int(n * o.maxlenratio / reduction_factor) for n, o in zip(text_lengths, self.options)]
+        self.active = list(range(len(self.options)))  # rows still decoding, in batch order
+        self.steps = 0
+        self.row_steps = [0] * len(self.options)
+        self.truncated = []  # rows stopped by maxlenratio before their stop token fired
+        self.skipped_row_steps = 0  # steps not run for rows that had already stopped
+
+    def step(self, stop_scores):
+        """Count one decoder step from each active row's summed stop probability.
+
+        Returns the positions within the active rows of those that stop with it.
+        """
+        self.steps += 1
+        self.skipped_row_steps += len(self.options) - len(self.active)
+        stopped = []
+        for pos, row in enumerate(self.active):
+            if self.steps < self.minlens[row]:
+                continue
+            reached = stop_scores[pos] >= self.options[row].threshold
+            if reached or self.steps >= self.maxlens[row]:
+                if not reached:
+                    self.truncated.append(row)
+                self.row_steps[row] = self.steps
+                stopped.append(pos)
+        if stopped:
+            self.active = [row for pos, row in enumerate(self.active) if pos not in stopped]
+        return stopped
+
+
+class DecodingStats:
+    """Decoder step counts across batches, for the stats log"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks = 0
+        self._steps = 0
+        self._chunk_steps = 0
+        self._max_chunk_steps = 0
+        self._truncated = 0
+        self._skipped_row_steps = 0
+        self._decode_time = 0.0
+
+    def record(self, stopping, decode_time):
+        with self._lock:
+            self._chunks += len(stopping.row_steps)
+            self._steps += stopping.steps
+            self._chunk_steps += sum(stopping.row_steps)
+            self._max_chunk_steps = max(self._max_chunk_steps, *stopping.row_steps)
+            self._truncated += len(stopping.truncated)
+            self._skipped_row_steps += stopping.skipped_row_steps
+            self._decode_time += decode_time
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "chunks": self._chunks,
+                "decoder_steps": self._steps,
+                "avg_steps_per_chunk": self._chunk_steps / self._chunks if self._chunks else 0.0,
+                "max_steps_per_chunk": self._max_chunk_steps,
+                # Chunks cut off by maxlenratio, their stop token never fired
+                "stopped_at_max_length": self._truncated,
+                # Steps finished chunks did not run because they left the batch
+                "skipped_row_steps": self._skipped_row_steps,
+                "avg_step_ms": 1000.0 * self._decode_time / self._steps if self._steps else 0.0,
+            }
+
+
+def prenet_step(prenet, frame, position, speaker_embeddings):
+    """The decoder prenet on the newest frame only.
+
+    transformers reruns the prenet over the whole output sequence every step and
+    keeps the last position; its dropout stays on at inference with a fresh mask
+    per call, so this is the same computation without the quadratic cost.
+    """
+    hidden_states = frame
+    for layer in prenet.layers:
+        hidden_states = nn.functional.relu(layer(hidden_states))
+        hidden_states = prenet._consistent_dropout(hidden_states, prenet.config.speech_decoder_prenet_dropout)
+    hidden_states = prenet.final_layer(hidden_states)
+    positions = prenet.encode_positions
+    hidden_states = hidden_states + positions.alpha * positions.pe[:, position:position + 1]
+
+    speaker_embeddings = nn.functional.normalize(speaker_embeddings).unsqueeze(1)
+    hidden_states = torch.cat([hidden_states, speaker_embeddings], dim=-1)
+    return nn.functional.relu(prenet.speaker_embeds_layer(hidden_states))
+
+
+@torch.inference_mode()
+def decode_steps(model, input_ids, speaker_embeddings, stopping, attention_mask=None):
+    """Step-by-step version of the SpeechT5 autoregressive decoding loop (transformers' `_generate_speech`).
+
+    Yields (spectrum, rows, stopped) after every decoder step: `spectrum` holds the
+    step's `reduction_factor` mel frames, before the postnet, with shape
+    (len(rows), reduction_factor, num_mel_bins) for the batch rows listed in
+    `rows`, and `stopped` lists the rows whose spectrogram ends with this step.
+    `stopping` (a StoppingCriteria) decides that; rows that stopped are dropped
+    from the batch and the decoder's key/value cache instead of decoding on.
+    """
+    config = model.config
+    if attention_mask is None:
+        attention_mask = 1 - (input_ids == config.pad_token_id).int()
+
+    bsz = input_ids.size(0)
+    encoder_out = model.speecht5.encoder(input_values=input_ids, attention_mask=attention_mask, return_dict=True)
+    encoder_hidden_states = encoder_out.last_hidden_state
+
+    # The output sequence starts with a mel spectrum of zeros
+    frame = encoder_hidden_states.new_zeros(bsz, 1, config.num_mel_bins)
+    past_key_values = None
+
+    while stopping.active:
+        # Only the newest position runs through the decoder layers thanks to the key/value cache
+        decoder_hidden_states = prenet_step(model.speecht5.decoder.prenet, frame, stopping.steps, speaker_embeddings)
+        decoder_out = model.speecht5.decoder.wrapped_decoder(
+            hidden_states=decoder_hidden_states,
+            attention_mask=None,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            use_cache=True,
+            return_dict=True,
+        )
+        last_decoder_output = decoder_out.last_hidden_state.squeeze(1)
+        past_key_values = decoder_out.past_key_values
+
+        spectrum = model.speech_decoder_postnet.feat_out(last_decoder_output)
+        spectrum = spectrum.view(-1, config.reduction_factor, config.num_mel_bins)
+        prob = torch.sigmoid(model.speech_decoder_postnet.prob_out(last_decoder_output))
+
+        rows = stopping.active
+        stopped = stopping.step(prob.sum(dim=-1).tolist())
+        yield spectrum, rows, [rows[i] for i in stopped]
+
+        frame = spectrum[:, -1:, :]
+        if stopped and stopping.active:
+            keep = torch.tensor([i for i in range(len(rows)) if i not in stopped], device=frame.device)
+            frame = frame.index_select(0, keep)
+            speaker_embeddings = speaker_embeddings.index_select(0, keep)
+            encoder_hidden_states = encoder_hidden_states.index_select(0, keep)
+            attention_mask = attention_mask.index_select(0, keep)
+            past_key_values = tuple(
+                tuple(tensor.index_select(0, keep) for tensor in layer_past) for layer_past in past_key_values
+            )
+
+
+def postnet_context_frames(config):
+    """Frames on either side that one output frame of the postnet convolutions depends on"""
+    return config.speech_decoder_postnet_layers * ((config.speech_decoder_postnet_kernel - 1) // 2)
+
+
+class IncrementalVocoder:
+    """Turns the mel frames of one utterance into audio while they are being decoded.
+
+    Frames are vocoded in windows of `window_frames` once enough frames past the
+    window are known for the postnet and the vocoder to see `context_frames` of
+    real context on both sides; each window overlaps the next by `overlap_frames`,
+    which are crossfaded to hide what context could not. `listener(samples, last)`
+    receives every window's float samples as it is ready. Without a listener the
+    frames are only collected and vocoded in one pass by finish(), like the
+    non-incremental path.
+
+    `render(mel, start, stop)` runs the postnet over the (frames, num_mel_bins)
+    array `mel` and returns the vocoded samples of its rows start:stop, which keeps
+    this independent of the runtime (PyTorch or ONNX) executing the model.
+    """
+
+    def __init__(self, render, postnet_frames, hop_length, listener=None, window_frames=16, context_frames=8,
+                 overlap_frames=2):
+        self.render = render
+        self.listener = listener
+        self.window_frames = window_frames
+        self.context_frames = context_frames
+        self.overlap_frames = overlap_frames
+        self.postnet_frames = postnet_frames
+        self.hop_length = hop_length
+
+        self._frames = []
+        self._num_frames = 0
+        self._mel = None  # self._frames joined, rebuilt lazily
+        self._emitted = 0  # frames whose audio has been handed to the listener
+        self._tail = None  # samples of the overlap region past _emitted, faded into the next window
+        self._pieces = []
+
+    def feed(self, frames):
+        """Add the (reduction_factor, num_mel_bins) frames of one decoder step"""
+        self._frames.append(frames)
+        self._num_frames += len(frames)
+        self._mel = None
+        if self.listener is None:
+            return
+        lookahead = self.overlap_frames + self.context_frames + self.postnet_frames
+        while self._num_frames - self._emitted >= self.window_frames + lookahead:
+            self._emit(self._emitted + self.window_frames)
+
+    def finish(self):
+        """Vocode the remaining frames and return the samples of the whole utterance"""
+        if self.listener is None:
+            return self.render(self._joined(), 0, self._num_frames)
+        self._emit(self._num_frames, last=True)
+        return np.concatenate(self._pieces)
+
+    def _joined(self):
+        if self._mel is None:
+            self._mel = np.concatenate(self._frames)
+        return self._mel
+
+    def _emit(self, end, last=False):
+        start = self._emitted
+        # Audio is produced up to end + overlap, the overlap is held back for the crossfade
+        stop = self._num_frames if last else end + self.overlap_frames
+        if stop <= start:
+            self._pieces.append(np.zeros(0, dtype=np.float32))
+            self.listener(self._pieces[-1], last)
+            return
+
+        voc_start = max(0, start - self.context_frames)
+        voc_stop = min(self._num_frames, stop + self.context_frames)
+        mel_start = max(0, voc_start - self.postnet_frames)
+        mel_stop = min(self._num_frames, voc_stop + self.postnet_frames)
+
+        samples = self.render(self._joined()[mel_start:mel_stop], voc_start - mel_start, voc_stop - mel_start)
+        samples = samples[(start - voc_start) * self.hop_length:(stop - voc_start) * self.hop_length]
+
+        if self._tail is not None:
+            fade = len(self._tail)
+            ramp = np.linspace(0.0, 1.0, fade, endpoint=False, dtype=np.float32)
+            samples = samples.copy()
+            samples[:fade] = self._tail * (1.0 - ramp) + samples[:fade] * ramp
+
+        if last:
+            self._tail = None
+        else:
+            held = self.overlap_frames * self.hop_length
+            samples, self._tail = samples[:len(samples) - held], samples[len(samples) - held:]
+
+        self._emitted = end
+        self._pieces.append(samples)
+        self.listener(samples, last)
@@ -1,10 +1,16 @@
 import re
 import unicodedata
+from functools import lru_cache
 from num2words import num2words
 from dateutil import parser as dateparser
 
 MAX_CHUNK_LENGTH = 500
 
+# Chunk sizes for iter_tts_chunks, in tokens as counted by `count_tokens`. The default
+# counter is len(), which matches SpeechT5's character-level tokenizer up to special tokens.
+DEFAULT_CHUNK_TOKENS = 250
+MIN_CHUNK_TOKENS = 30
+
 def convert_currency(text):
     return re.sub(
         r'(\$|\u20ac|\u00a3)(\d+\.?\d*)',
@@ -40,8 +46,80 @@ def convert_dates(text):
             continue
     return text
 
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!])\s+')
+CLAUSE_BOUNDARY = re.compile(r'(?<=[,;:])\s+')
+WHITESPACE = re.compile(r'\s+')
+
+# One alternation covering every conversion above plus bare numbers, tried in the same
+# priority order as the individual passes. The passes used to rewrite the text one after
+# another, so a match could be claimed or blocked by an earlier pass converting its
+# neighbour into words. END reproduces that on the right-hand side: digits followed by
+# "%" or by a currency amount were converted first and no longer end at a word boundary.
+END = r'\b(?!%)(?![$\u20ac\u00a3]\d)'
+NORMALIZE_PATTERN = re.compile(
+    r'(?P<currency>[$\u20ac\u00a3])(?P<amount>\d+\.?\d*)'
+    r'|(?P<percent>\d+)%'
+    r'|\b(?P<ordinal>\d+)(?:st|nd|rd|th)\b(?![$\u20ac\u00a3]\d)'
+    r'|\b(?P<hour>\d{1,2}):(?P<minute>\d{2})' + END +
+    r'|\b(?P<date>\d{4}-\d{2}-\d{2})' + END + r'(?!:\d{2}' + END + r')'
+    r'|\b(?P<number>\d+)' + END
+)
+# Only these alternatives can match right after a converted token, all others need a
+# word boundary and the converted token ends in a letter
+UNANCHORED_KINDS = ('amount', 'percent')
+DIGITS = re.compile(r'\d+')
+CURRENCY_NAMES = {'$': 'dollars', '\u20ac': 'euros', '\u00a3': 'pounds'}
+
+@lru_cache(maxsize=16384)
+def cached_num2words(number, to='cardinal'):
+    return num2words(number, to=to)
+
+def _spell_numbers(text):
+    return DIGITS.sub(lambda m: cached_num2words(int(m.group())), text)
+
+@lru_cache(maxsize=4096)
+def _spoken_date(date_str):
+    try:
+        date_str = dateparser.parse(date_str).strftime('%B %-d, %Y')
+    except Exception:
+        pass
+    # Spoken dates still contain digits, which the bare number pass used to convert
+    return _spell_numbers(date_str)
+
+def _convert_match(m):
+    kind = m.lastgroup
+    if kind == 'amount':
+        return f"{cached_num2words(float(m.group('amount')))} {CURRENCY_NAMES[m.group('currency')]}"
+    if kind == 'percent':
+        return cached_num2words(int(m.group('percent'))) + " percent"
+    if kind == 'ordinal':
+        return cached_num2words(int(m.group('ordinal')), to='ordinal')
+    if kind == 'minute':
+        return f"{cached_num2words(int(m.group('hour')))} {cached_num2words(int(m.group('minute')))}"
+    if kind == 'date':
+        return _spoken_date(m.group('date'))
+    return cached_num2words(int(m.group('number')))
+
+def normalize_numbers(text):
+    """Single-pass equivalent of the convert_* functions followed by the bare number pass"""
+    parts = []
+    pos = 0
+    converted_end = -1
+    m = NORMALIZE_PATTERN.search(text)
+    while m:
+        start = m.start()
+        if start == converted_end and m.lastgroup not in UNANCHORED_KINDS:
+            m = NORMALIZE_PATTERN.search(text, start + 1)
+            continue
+        parts.append(text[pos:start])
+        parts.append(_convert_match(m))
+        pos = converted_end = m.end()
+        m = NORMALIZE_PATTERN.search(text, pos)
+    parts.append(text[pos:])
+    return "".join(parts)
+
 def split_into_chunks(ssml_text, max_len=MAX_CHUNK_LENGTH):
-    sentences = re.split(r'(?<=[.?!])\s+', ssml_text)
+    sentences = SENTENCE_BOUNDARY.split(ssml_text)
     chunks = []
     current = ""
     for sentence in sentences:
@@ -54,21 +132,102 @@ def split_into_chunks(ssml_text, max_len=MAX_CHUNK_LENGTH):
         chunks.append(current.strip())
     return chunks
 
-def preprocess_for_tts(text):
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", text)
+    text = normalize_numbers(text)
+    return WHITESPACE.sub(' ', text).strip()
+
+def iter_raw_sentences(text):
+    """Lazily split raw text on sentence boundaries without scanning ahead"""
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    yield text[start:]
+
+def iter_normalized_sentences(text):
+    for raw_sentence in iter_raw_sentences(text):
+        normalized = normalize_text(raw_sentence)
+        # Normalization can expose new boundaries (e.g. full-width punctuation under NFKC)
+        for sentence in SENTENCE_BOUNDARY.split(normalized):
+            if sentence:
+                yield sentence
+
+def iter_final_sentences(text):
+    """Normalized sentences, with a period added to the last one if it has no end punctuation"""
+    previous = None
+    # The last sentence is held back by one step so it can be completed before chunking
+    for sentence in iter_normalized_sentences(text):
+        if previous is not None:
+            yield previous
+        previous = sentence
 
+    if previous is not None:
+        if not previous.endswith(('.', '?', '!')):
+            previous += '.'
+        yield previous
+
+def split_long_sentence(sentence, max_tokens, count_tokens=len):
+    """Yield (piece, tokens) so that no piece exceeds max_tokens where the text allows it.
+
+    Over-budget sentences are split at clause boundaries (commas, semicolons, colons),
+    and clauses that are still too long at spaces.
+    """
+    tokens = count_tokens(sentence)
+    if tokens <= max_tokens:
+        yield sentence, tokens
+        return
+
+    for clause in CLAUSE_BOUNDARY.split(sentence):
+        clause_tokens = count_tokens(clause)
+        if clause_tokens <= max_tokens:
+            yield clause, clause_tokens
+        else:
+            for word in clause.split(' '):
+                if word:
+                    yield word, count_tokens(word)
+
+def iter_tts_chunks(text, max_tokens=DEFAULT_CHUNK_TOKENS, min_tokens=MIN_CHUNK_TOKENS, count_tokens=len):
+    """Normalize and chunk text incrementally, yielding each chunk as soon as it is complete.
+
+    Sentences are packed into chunks of at most `max_tokens`; long sentences are split
+    at clause boundaries and the pieces packed again. A fragment shorter than
+    `min_tokens` is merged into its neighbour when the result stays within
+    `max_tokens + min_tokens`, so chunk sizes (and batch shapes) stay uniform.
+    """
     if not text or not text.strip():
-        return []
-        
-    text = unicodedata.normalize("NFKC", text)
-    text = convert_currency(text)
-    text = convert_percentages(text)
-    text = convert_ordinals(text)
-    text = convert_time(text)
-    text = convert_dates(text)
-    text = re.sub(r'\b\d+\b', lambda x: num2words(int(x.group())), text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    if not text.endswith(('.', '?', '!')):
-        text += '.'
-        
-    return split_into_chunks(text)
\ No newline at end of file
+        return
+
+    parts = []
+    used = 0
+    held = None  # last finished chunk, kept back one step so a tiny follower can merge into it
+
+    def finish(chunk, held):
+        # Returns (chunk to yield or None, new held chunk)
+        if held is None:
+            return None, chunk
+        tiny = min(held[1], chunk[1]) < min_tokens
+        if tiny and held[1] + 1 + chunk[1] <= max_tokens + min_tokens:
+            return None, (held[0] + " " + chunk[0], held[1] + 1 + chunk[1])
+        return held, chunk
+
+    for sentence in iter_final_sentences(text):
+        for piece, tokens in split_long_sentence(sentence, max_tokens, count_tokens):
+            if parts and used + 1 + tokens > max_tokens:
+                ready, held = finish((" ".join(parts), used), held)
+                if ready:
+                    yield ready[0]
+                parts = []
+                used = 0
+            used += tokens + (1 if parts else 0)
+            parts.append(piece)
+
+    if parts:
+        ready, held = finish((" ".join(parts), used), held)
+        if ready:
+            yield ready[0]
+    if held:
+        yield held[0]
+
+def preprocess_for_tts(text, max_tokens=DEFAULT_CHUNK_TOKENS, min_tokens=MIN_CHUNK_TOKENS, count_tokens=len):
+    return list(iter_tts_chunks(text, max_tokens, min_tokens, count_tokens))
\ No newline at end of file
@@ -1,18 +1,67 @@
 import os
+import json
 import time
-import io
+import hashlib
+import math
+import threading
 import torch
-import torchaudio
-from transformers import SpeechT5Processor, SpeechT5ForTextToSpeech, SpeechT5HifiGan
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
 import logging
 
-from text_preprocessing import preprocess_for_tts
+from text_preprocessing import preprocess_for_tts, iter_tts_chunks, DEFAULT_CHUNK_TOKENS, MIN_CHUNK_TOKENS
+from batch_scheduler import BatchScheduler
+from audio_format import float_to_pcm16, build_wav, SAMPLE_RATE
+from disk_cache import DiskCache
+from memory_cache import LRUCache, SingleFlight
+from cancellation import RequestCancelled, NEVER_CANCELLED
+from speecht5_decoding import (
+    decode_steps,
+    postnet_context_frames,
+    IncrementalVocoder,
+    DecodingOptions,
+    DecodingStats,
+    StoppingCriteria,
+)
+from inference_backends import resolve_precision, quantize_int8, optimize_vocoder, inference_context
+from model_loading import load_pretrained, load_voice_embeddings
+
+# Bump when the output encoding changes so stale disk cache entries are not served
+AUDIO_FORMAT_ID = f"wav/pcm_s16le/{SAMPLE_RATE}"
 
 # Log to track to better handle errors in any case of setback
 logger = logging.getLogger("tts_engine")
 
+
+class _PcmPieces:
+    """PCM16 pieces of a chunk that is vocoded incrementally, readable by any number of callers.
+
+    A chain of futures: `first` resolves to (pcm, next) with next None after the
+    last piece, so everyone sharing the chunk can follow it from the start.
+    """
+
+    def __init__(self):
+        self.first = Future()
+        self._next = self.first
+
+    def push(self, pcm, last):
+        current, self._next = self._next, None if last else Future()
+        current.set_result((pcm, self._next))
+
+    def fail(self, error):
+        if self._next is not None and not self._next.done():
+            self._next.set_exception(error)
+
+
 class TextToSpeechEngine:
-    def __init__(self, model_dir="./models", cache_dir="./cache"):
+    def __init__(self, model_dir="./models", cache_dir="./cache", max_batch_size=8, max_batch_wait_ms=10.0,
+                 parallel_chunks=True, disk_cache_max_bytes=1024 * 1024 * 1024,
+                 chunk_cache_max_bytes=256 * 1024 * 1024, audio_cache_max_bytes=256 * 1024 * 1024,
+                 max_chunk_tokens=DEFAULT_CHUNK_TOKENS, min_chunk_tokens=MIN_CHUNK_TOKENS, shared_weights=None,
+                 incremental_vocoding=True, vocoder_window_frames=16, precision="fp32", vocoder_backend="eager",
+                 runtime="torch", onnx_intra_op_threads=0, onnx_inter_op_threads=1, stop_threshold=0.5,
+                 min_len_ratio=0.0, max_len_ratio=20.0):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {self.device}")
 
@@ -26,7 +75,26 @@ class TextToSpeechEngine:
         self.tts_dir = os.path.join(model_dir, "speecht5_tts")
         self.vocoder_dir = os.path.join(model_dir, "speecht5_hifigan")
         self.emb_dir = os.path.join(model_dir, "spk_embs")
+        self.onnx_dir = os.path.join(model_dir, "onnx")
         self.cache_dir = cache_dir
+        self.parallel_chunks = parallel_chunks
+        # stream() hands out audio every `vocoder_window_frames` mel frames instead of per chunk
+        self.incremental_vocoding = incremental_vocoding
+        self.vocoder_window_frames = vocoder_window_frames
+        # Optional {"model": state_dict, "vocoder": state_dict} of tensors in shared memory
+        self.shared_weights = shared_weights
+        # "torch", or "onnx" for the graphs written by export_onnx.py run on onnxruntime
+        if runtime not in ("torch", "onnx"):
+            raise ValueError(f"Unknown runtime '{runtime}', expected 'torch' or 'onnx'")
+        self.runtime = runtime
+        self.onnx_threads = (onnx_intra_op_threads, onnx_inter_op_threads)
+        self.onnx_model = None
+        # Inference backend, see inference_backends.py; falls back to fp32 where unsupported
+        self.precision = resolve_precision(precision, self.device) if runtime == "torch" else "fp32"
+        self.vocoder_backend = vocoder_backend if runtime == "torch" else "eager"
+        # Default stop rules; requests may override them, but max_len_ratio is also their ceiling
+        self.decoding = DecodingOptions(stop_threshold, min_len_ratio, max_len_ratio)
+        self.decoding_stats = DecodingStats()
 
         self.voice_map = {
             "Default": "slt",  # US Female (default fallback)
@@ -41,130 +109,513 @@ class TextToSpeechEngine:
 
         os.makedirs(self.cache_dir, exist_ok=True)
 
+        # Seconds spent in each startup phase, for the cold-start breakdown
+        self.startup_times = {}
+        start_time = time.perf_counter()
         self._load_models()
+        self.startup_times["models"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
         self._load_embeddings()
+        self.startup_times["embeddings"] = time.perf_counter() - start_time
+
+        # Chunks are measured in processor tokens and kept below the model's text position limit
+        max_text_positions = getattr(self.model_config, "max_text_positions", None)
+        if max_text_positions and max_chunk_tokens + min_chunk_tokens >= max_text_positions:
+            max_chunk_tokens = max_text_positions - min_chunk_tokens - 1
+            logger.warning(f"Chunk token budget capped at {max_chunk_tokens} by max_text_positions={max_text_positions}")
+        self.chunking = {
+            "max_tokens": max_chunk_tokens,
+            "min_tokens": min_chunk_tokens,
+            "count_tokens": self._count_tokens,
+        }
+
+        # Whole-request results, shared by the gRPC worker threads
+        self.audio_cache = LRUCache(max_bytes=audio_cache_max_bytes, size_fn=lambda result: len(result[0]))
+        self.inflight_requests = SingleFlight()
+
+        # PCM per (chunk text, voice), so overlapping texts and streaming calls reuse work
+        self.chunk_cache = LRUCache(max_bytes=chunk_cache_max_bytes)
+        self.inflight_chunks = SingleFlight()
 
-        self.audio_cache = {}
-        self.max_cache_size = 100
+        # Persistent cache shared across restarts and replicas mounting the same cache_dir
+        self.model_revision = self._get_model_revision()
+        self.disk_cache = None
+        if disk_cache_max_bytes > 0:
+            self.disk_cache = DiskCache(os.path.join(self.cache_dir, "audio"), max_bytes=disk_cache_max_bytes)
+
+        # Work skipped because the caller cancelled or ran out of time
+        self._cancel_lock = threading.Lock()
+        self.cancelled_requests = 0
+        self.abandoned_chunks = 0
+
+        # All chunk synthesis goes through one scheduler so concurrent requests share forward passes
+        self.batch_scheduler = BatchScheduler(
+            self._synthesize_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_batch_wait_ms,
+        )
     
     def _load_models(self):
         logger.info("Loading TTS Models")
+        # Imported here: the transformers modeling code takes seconds to import and the onnx runtime never needs it
+        from transformers import SpeechT5Processor
+
         self.processor = SpeechT5Processor.from_pretrained(self.processor_dir, local_files_only=True)
-        self.model = SpeechT5ForTextToSpeech.from_pretrained(self.tts_dir).to(self.device).eval()
-        self.vocoder = SpeechT5HifiGan.from_pretrained(self.vocoder_dir).to(self.device).eval()
-        logger.info("Successfully loaded TTS Models")
+        if self.runtime == "onnx":
+            from onnx_backend import OnnxSpeechT5
+            self.onnx_model = OnnxSpeechT5(self.onnx_dir, *self.onnx_threads)
+            self.model_config = self.onnx_model.config
+            self.hop_length = self.onnx_model.config.hop_length
+            logger.info(f"Successfully loaded ONNX models from {self.onnx_dir}")
+            return
+
+        from transformers import SpeechT5ForTextToSpeech, SpeechT5HifiGan, SpeechT5Config, SpeechT5HifiGanConfig
+
+        if self.shared_weights is not None:
+            # Build the modules from their configs and adopt the shared tensors without copying
+            self.model = SpeechT5ForTextToSpeech(SpeechT5Config.from_pretrained(self.tts_dir))
+            self.model.load_state_dict(self.shared_weights["model"], assign=True)
+            self.vocoder = SpeechT5HifiGan(SpeechT5HifiGanConfig.from_pretrained(self.vocoder_dir))
+            self.vocoder.load_state_dict(self.shared_weights["vocoder"], assign=True)
+            self.model = self.model.to(self.device).eval()
+            self.vocoder = self.vocoder.to(self.device).eval()
+        else:
+            self.model = load_pretrained(SpeechT5ForTextToSpeech, SpeechT5Config, self.tts_dir, self.device)
+            self.vocoder = load_pretrained(SpeechT5HifiGan, SpeechT5HifiGanConfig, self.vocoder_dir, self.device)
+
+        self.model_config = self.model.config
+        self.hop_length = math.prod(self.vocoder.config.upsample_rates)
+        if self.precision == "int8":
+            self.model = quantize_int8(self.model)
+        vocoder = optimize_vocoder(self.vocoder, self.vocoder_backend, self.model.config.num_mel_bins, self.device)
+        if vocoder is self.vocoder:
+            self.vocoder_backend = "eager"
+        self.vocoder = vocoder
+        logger.info(f"Successfully loaded TTS Models ({self.precision}, {self.vocoder_backend} vocoder)")
 
     def _load_embeddings(self):
         logger.info("Loading voice embeddings...")
         if not os.path.exists(self.emb_dir):
             raise FileNotFoundError(f"Embedding directory {self.emb_dir} does not exist")
-            
-        for fname in os.listdir(self.emb_dir):
-            if fname.endswith(".pt"):
-                voice_name = fname.replace(".pt", "")
-                emb_path = os.path.join(self.emb_dir, fname)
-                try:
-                    # Load the embedding
-                    embedding = torch.load(emb_path).to(self.device)
-                    
-                    # Ensure it has the correct shape with batch dimension
-                    if embedding.dim() == 1:  # If it's just [512]
-                        embedding = embedding.unsqueeze(0)  # Make it [1, 512]
-                    
-                    # Store the correctly shaped embedding
-                    self.voice_embeddings[voice_name] = embedding
-                    logger.info(f"Speaker {voice_name}: tensor shape {embedding.shape}, dtype {embedding.dtype}")
-                except Exception as e:
-                    logger.info(f"Failed to load embedding {emb_path}: {str(e)}")
-                    
+
+        self.voice_embeddings = load_voice_embeddings(self.emb_dir, self.device)
+        for voice_name, embedding in self.voice_embeddings.items():
+            logger.info(f"Speaker {voice_name}: tensor shape {embedding.shape}, dtype {embedding.dtype}")
+
         if not self.voice_embeddings:
             raise ValueError(f"No voice embeddings found in {self.emb_dir}")
-            
+
         if "default" not in self.voice_embeddings:
             self.voice_embeddings["default"] = list(self.voice_embeddings.values())[0]
-            
-    def _get_cache_key(self, text, voice):
+
+    def warm_up(self, batch_sizes=(1,), text="Hello there."):
+        """Run `text` through the model and vocoder before serving, so the first requests do not
+        hit cold kernels and allocators.
+
+        Every batch size in `batch_sizes` runs with its rows going through all
+        voices in voice_map, and one more pass goes through the incremental
+        vocoder that streaming uses.
+        """
+        start_time = time.perf_counter()
+        voice_ids = sorted({self._resolve_voice_id(name) for name in self.voice_map})
+        for batch_size in batch_sizes:
+            for first in range(0, len(voice_ids), batch_size):
+                rows = [voice_ids[(first + i) % len(voice_ids)] for i in range(batch_size)]
+                self._synthesize_batch([text] * batch_size, rows)
+        if self.incremental_vocoding:
+            self._synthesize_batch([text], voice_ids[:1], [lambda samples, last: None])
+        self.startup_times["warm_up"] = time.perf_counter() - start_time
+        logger.info(f"Warm-up of batch sizes {list(batch_sizes)} took {self.startup_times['warm_up']:.2f}s")
+
+    def precompute(self, phrases):
+        """Synthesize `phrases` for every voice in voice_map so they are answered from the caches"""
+        start_time = time.perf_counter()
+        voice_ids = sorted({self._resolve_voice_id(name) for name in self.voice_map})
+
+        # Queue every chunk up front so they share forward passes; phrases already in the disk
+        # cache (an earlier start, another worker) are loaded from there instead
+        futures = []
+        for phrase in phrases:
+            chunks = preprocess_for_tts(phrase, **self.chunking)
+            for voice_id in voice_ids:
+                if self.disk_cache and self._get_disk_cache_key(chunks, voice_id, self.decoding) in self.disk_cache:
+                    continue
+                futures.extend(self._get_chunk_future(chunk, voice_id, self.decoding) for chunk in chunks)
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning(f"Precomputing a chunk failed: {str(e)}")
+
+        # Fills the whole-request and disk caches from the chunk cache, under each name clients send
+        for phrase in phrases:
+            for voice in self.voice_map:
+                try:
+                    self.generate(phrase, voice)
+                except Exception as e:
+                    logger.warning(f"Could not precompute '{phrase[:50]}' for {voice}: {str(e)}")
+
+        self.startup_times["phrases"] = time.perf_counter() - start_time
+        logger.info(f"Precomputed {len(phrases)} phrases for {len(self.voice_map)} voices in {self.startup_times['phrases']:.2f}s")
+
+    def _get_cache_key(self, text, voice, decoding):
         """Generate a cache key for the text+voice combination"""
-        return f"{voice}:{hash(text)}"
-        
-    def generate(self, text, voice="default"):
+        return (voice, text, decoding)
+
+    def _get_model_revision(self):
+        """Identify the loaded weights so cached audio is invalidated when the models change"""
+        revision = os.environ.get("MODEL_REVISION")
+        if revision:
+            return revision
+
+        digest = hashlib.sha256()
+        model_paths = (self.onnx_dir,) if self.runtime == "onnx" else (self.tts_dir, self.vocoder_dir)
+        for model_path in model_paths:
+            for fname in sorted(os.listdir(model_path)):
+                path = os.path.join(model_path, fname)
+                digest.update(fname.encode("utf-8"))
+                if fname == "config.json":
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+                else:
+                    digest.update(str(os.path.getsize(path)).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def _get_disk_cache_key(self, chunks, voice_id, decoding):
+        """Stable digest of the normalized text, voice, decoding options, model revision and output format"""
+        payload = json.dumps([chunks, voice_id, decoding, self.model_revision, AUDIO_FORMAT_ID], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count_tokens(self, text):
+        return len(self.processor.tokenizer.tokenize(text))
+
+    def _decoding_options(self, decoding=None):
+        """The engine's DecodingOptions with a request's overrides ({"threshold": 0.6, ...}) applied"""
+        if not decoding:
+            return self.decoding
+        options = self.decoding._replace(**decoding)
+        # Bounds the decoder steps a chunk can take, whatever the request asks for
+        return options._replace(maxlenratio=min(options.maxlenratio, self.decoding.maxlenratio))
+
+    def _resolve_voice_id(self, voice):
+        """Map a display name ("US Male 1") or a raw speaker id ("bdl") to a loaded embedding id"""
+        if voice in self.voice_embeddings:
+            return voice
+        voice_id = self.voice_map.get(voice, "slt")
+        if voice_id not in self.voice_embeddings:
+            logger.warning(f"Voice ID {voice_id} not found, falling back to default")
+            voice_id = "slt" if "slt" in self.voice_embeddings else list(self.voice_embeddings.keys())[0]
+        return voice_id
+
+    def _synthesize_batch(self, texts, voice_ids, listeners=None, decodings=None):
+        """Run one padded forward pass over several chunks and return a waveform per chunk"""
+        listeners = listeners or [None] * len(texts)
+        decodings = [decoding or self.decoding for decoding in decodings or [None] * len(texts)]
+
+        if self.runtime == "onnx":
+            inputs = self.processor(text=texts, padding=True, return_tensors="np")
+            stopping = StoppingCriteria(inputs["attention_mask"].sum(axis=-1).tolist(), self.model_config.reduction_factor, decodings)
+            speaker_embeddings = np.concatenate([self.voice_embeddings[voice_id].cpu().numpy() for voice_id in voice_ids])
+            steps = self.onnx_model.decode_steps(inputs["input_ids"], inputs["attention_mask"], speaker_embeddings, stopping)
+            return self._vocode_steps(steps, stopping, listeners, self.onnx_model.render)
+
+        inputs = self.processor(text=texts, padding=True, return_tensors="pt").to(self.device)
+        stopping = StoppingCriteria(inputs["attention_mask"].sum(dim=-1).tolist(), self.model_config.reduction_factor, decodings)
+        speaker_embeddings = torch.cat([self.voice_embeddings[voice_id] for voice_id in voice_ids], dim=0)
+
+        with inference_context(self.precision, self.device):
+            steps = decode_steps(
+                self.model,
+                inputs["input_ids"],
+                speaker_embeddings,
+                stopping,
+                attention_mask=inputs["attention_mask"],
+            )
+            steps = ((spectrum.float().cpu().numpy(), rows, stopped) for spectrum, rows, stopped in steps)
+            return self._vocode_steps(steps, stopping, listeners, self._render)
+
+    def _render(self, mel, start, stop):
+        """Postnet over a (frames, num_mel_bins) array, then the vocoded samples of rows start:stop"""
+        with inference_context(self.precision, self.device):
+            mel = torch.from_numpy(mel).to(self.device).unsqueeze(0)
+            mel = self.model.speech_decoder_postnet.postnet(mel)[:, start:stop]
+            return self.vocoder(mel)[0].float().cpu().numpy()
+
+    def _vocode_steps(self, steps, stopping, listeners, render):
+        """Vocode every chunk from (spectrum, rows, stopped) decoder steps, those with a listener as they decode"""
+        postnet_frames = postnet_context_frames(self.model_config)
+        vocoders = [
+            IncrementalVocoder(render, postnet_frames, self.hop_length, listener, window_frames=self.vocoder_window_frames)
+            for listener in listeners
+        ]
+        waveforms = [None] * len(vocoders)
+        decode_time = 0.0
+        steps = iter(steps)
+        while True:
+            start_time = time.perf_counter()
+            step = next(steps, None)
+            decode_time += time.perf_counter() - start_time
+            if step is None:
+                break
+            spectrum, rows, stopped = step
+            for i, row in enumerate(rows):
+                vocoders[row].feed(spectrum[i])
+            # A chunk's last piece goes out as soon as its own stop token fires
+            for row in stopped:
+                waveforms[row] = vocoders[row].finish()
+        self.decoding_stats.record(stopping, decode_time)
+        return waveforms
+
+    def _submit_chunk(self, chunk, voice_id, decoding, deadline=None, progressive=False):
+        """Queue a chunk for synthesis; the returned future resolves to PCM16 once it is cached.
+
+        Cancelling the returned future takes the chunk out of the scheduler queue.
+        With `progressive` the chunk is vocoded incrementally and the future's
+        `pieces` attribute (a _PcmPieces) delivers its audio while it is decoded.
+        """
+        pcm_future = Future()
+        pieces = None
+        listener = None
+        if progressive:
+            pieces = _PcmPieces()
+            pcm_future.pieces = pieces
+            listener = lambda samples, last: pieces.push(float_to_pcm16(samples), last)
+
+        def on_done(future):
+            try:
+                pcm = float_to_pcm16(future.result())
+            except BaseException as e:
+                if pieces is not None:
+                    pieces.fail(e)
+                try:
+                    pcm_future.set_exception(e)
+                except InvalidStateError:
+                    pass
+                return
+            self.chunk_cache.put((chunk, voice_id, decoding), pcm)
+            try:
+                pcm_future.set_result(pcm)
+            except InvalidStateError:
+                # Cancelled after the forward pass had started, the result is still cached
+                pass
+
+        waveform_future = self.batch_scheduler.submit(
+            chunk, voice_id, deadline=deadline, listener=listener, decoding=decoding
+        )
+        waveform_future.add_done_callback(on_done)
+        pcm_future.add_done_callback(lambda done: done.cancelled() and waveform_future.cancel())
+        return pcm_future
+
+    def _submit_chunk_shared(self, chunk, voice_id, decoding, deadline=None, progressive=False):
+        # A chunk already being synthesized for another request is awaited, not queued again
+        return self.inflight_chunks.share(
+            (chunk, voice_id, decoding),
+            lambda: self._submit_chunk(chunk, voice_id, decoding, deadline, progressive),
+        )
+
+    def _get_chunk_future(self, chunk, voice_id, decoding, deadline=None, progressive=False):
+        """Future for a chunk's PCM16, already resolved when the chunk is cached"""
+        pcm = self.chunk_cache.get((chunk, voice_id, decoding))
+        if pcm is not None:
+            future = Future()
+            future.set_result(pcm)
+            return future
+        return self._submit_chunk_shared(chunk, voice_id, decoding, deadline, progressive)
+
+    def _abandon_chunks(self, pending, voice_id, decoding):
+        """Give up on (chunk, future) pairs; chunks no other request waits for leave the queue"""
+        abandoned = 0
+        for chunk, future in pending:
+            if not future.done() and self.inflight_chunks.abandon((chunk, voice_id, decoding), future):
+                abandoned += 1
+        with self._cancel_lock:
+            self.cancelled_requests += 1
+            self.abandoned_chunks += abandoned
+        logger.info(f"Request cancelled, dropped {abandoned} queued chunks")
+
+    def _synthesize_chunks(self, chunks, voice_id, decoding, token=NEVER_CANCELLED):
+        """Synthesize all chunks of one request and return their PCM16 buffers in the original order"""
+        if not self.parallel_chunks:
+            pcm_chunks = []
+            for chunk in chunks:
+                # Checked between chunks so an abandoned request stops queueing work
+                token.check()
+                future = self._get_chunk_future(chunk, voice_id, decoding, token.deadline)
+                try:
+                    pcm_chunks.append(token.wait(future))
+                except RequestCancelled:
+                    self._abandon_chunks([(chunk, future)], voice_id, decoding)
+                    raise
+            return pcm_chunks
+
+        # Submit every chunk up front so they share forward passes; submitting in length
+        # order keeps similarly sized chunks in the same batch and reduces padding
+        token.check()
+        futures = [None] * len(chunks)
+        for i in sorted(range(len(chunks)), key=lambda i: len(chunks[i])):
+            futures[i] = self._get_chunk_future(chunks[i], voice_id, decoding, token.deadline)
+        try:
+            return [token.wait(future) for future in futures]
+        except RequestCancelled:
+            self._abandon_chunks(zip(chunks, futures), voice_id, decoding)
+            raise
+
+    def stream(self, text, voice="default", lookahead=2, token=NEVER_CANCELLED, decoding=None):
+        """Yield (chunk, pcm, elapsed, is_last) as the audio becomes ready.
+
+        Chunks are taken from the incremental preprocessor and up to `lookahead`
+        of them are queued ahead of the one being returned, so normalization,
+        synthesis and sending overlap and the first chunk starts right away.
+        With incremental vocoding a chunk arrives as several short pieces while it
+        is decoded; `chunk` is its text on the first piece and None on the rest.
+        Raises RequestCancelled once `token` fires; closing the generator early
+        also drops the queued chunks. `decoding` overrides fields of the engine's
+        DecodingOptions for this request.
+        """
+        voice_id = self._resolve_voice_id(voice)
+        decoding = self._decoding_options(decoding)
+        chunk_iter = iter_tts_chunks(text, **self.chunking)
+        pending = deque()
+
+        def fill():
+            while len(pending) < lookahead + 1:
+                token.check()
+                chunk = next(chunk_iter, None)
+                if chunk is None:
+                    return
+                future = self._get_chunk_future(chunk, voice_id, decoding, token.deadline, self.incremental_vocoding)
+                pending.append((chunk, time.time(), future))
+
+        try:
+            fill()
+            while pending:
+                chunk, start_time, future = pending[0]
+                pieces = getattr(future, "pieces", None)
+                if pieces is None:
+                    # Cached, or joined a synthesis of the whole chunk started by another request
+                    pcm = token.wait(future)
+                    pending.popleft()
+                    elapsed = time.time() - start_time
+                    # Refill before yielding so the next chunks synthesize while this one is sent
+                    fill()
+                    yield chunk, pcm, elapsed, not pending
+                    continue
+
+                text_chunk = chunk
+                piece = pieces.first
+                while piece is not None:
+                    pcm, piece = token.wait(piece)
+                    elapsed = time.time() - start_time
+                    if piece is None:
+                        pending.popleft()
+                        fill()
+                    yield text_chunk, pcm, elapsed, piece is None and not pending
+                    text_chunk = None
+        except (RequestCancelled, GeneratorExit):
+            if pending:
+                self._abandon_chunks([(chunk, future) for chunk, _, future in pending], voice_id, decoding)
+            raise
+
+    def queue_depth(self):
+        """Chunks waiting for a forward pass"""
+        return self.batch_scheduler.queue_depth()
+
+    def shutdown(self):
+        """Finish the queued chunks and persist the disk cache index"""
+        self.batch_scheduler.shutdown()
+        if self.disk_cache:
+            self.disk_cache.flush()
+
+    def get_stats(self):
+        return {
+            "batching": self.batch_scheduler.get_stats(),
+            "audio_cache": self.audio_cache.get_stats(),
+            "inflight_requests": self.inflight_requests.get_stats(),
+            "inflight_chunks": self.inflight_chunks.get_stats(),
+            "cancellation": {
+                "requests": self.cancelled_requests,
+                "abandoned_chunks": self.abandoned_chunks,
+            },
+            "chunk_cache": self.chunk_cache.get_stats(),
+            "decoding": self.decoding_stats.get_stats(),
+            "startup_seconds": self.startup_times,
+            "disk_cache": self.disk_cache.get_stats() if self.disk_cache else None,
+        }
+
+    def generate(self, text, voice="default", token=NEVER_CANCELLED, decoding=None):
         try:
+            decoding = self._decoding_options(decoding)
+
             # First check if we have this exact text+voice combination cached
-            cache_key = self._get_cache_key(text, voice)
-            if cache_key in self.audio_cache:
+            cache_key = self._get_cache_key(text, voice, decoding)
+            cached_result = self.audio_cache.get(cache_key)
+            if cached_result is not None:
                 logger.info(f"Cache hit for text: '{text[:50]}...'")
-                cached_result = self.audio_cache[cache_key]
                 return cached_result
-                
-            chunks = preprocess_for_tts(text)
+
+            chunks = preprocess_for_tts(text, **self.chunking)
             if not chunks:
                 raise ValueError("Text is empty after preprocessing.")
-                
-            voice_id = self.voice_map.get(voice, "slt")
-            if voice_id not in self.voice_embeddings:
-                logger.warning(f"Voice ID {voice_id} not found, falling back to default")
-                voice_id = "slt" if "slt" in self.voice_embeddings else list(self.voice_embeddings.keys())[0]
-                
-            audio_bytes = b""
-            start_time = time.time()
-            
-            for chunk in chunks:
-                chunk_audio, _, _ = self.generate_single_chunk(chunk, voice_id)
-                audio_bytes += chunk_audio
-                
-            elapsed = time.time() - start_time
-            logger.info(f"Generated {len(chunks)} chunks ({len(audio_bytes)} bytes) in {elapsed:.2f}s")
-            
-            # Cache the result if it's not too large
-            if len(audio_bytes) < 10 * 1024 * 1024:  # 10MB limit
-                if len(self.audio_cache) >= self.max_cache_size:
-                    # Remove oldest item if cache is full
-                    oldest_key = next(iter(self.audio_cache))
-                    del self.audio_cache[oldest_key]
-                    
-                self.audio_cache[cache_key] = (audio_bytes, chunks, elapsed)
-                
-            return audio_bytes, chunks, elapsed
-            
+
+            voice_id = self._resolve_voice_id(voice)
+
+            # Requests that normalize to the same chunks and voice (retries, several users
+            # submitting one story) wait for the first one instead of synthesizing again
+            while True:
+                try:
+                    result = self.inflight_requests.do(
+                        (tuple(chunks), voice_id, decoding),
+                        lambda: self._generate_uncached(text, chunks, voice_id, decoding, token),
+                        wait=token.wait,
+                    )
+                    break
+                except RequestCancelled:
+                    if token.cancelled():
+                        raise
+                    # The call we joined was cancelled by its own caller, run it again
+            self.audio_cache.put(cache_key, result)
+            return result
+
+        except RequestCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error during TTS generation: {str(e)}", exc_info=True)
             raise
-            
-    def generate_single_chunk(self, text, voice="default"):
-        try:
-            start_time = time.time()
-            
-            # Determine the voice embedding to use
-            voice_id = self.voice_map.get(voice, "slt")
-            if voice_id not in self.voice_embeddings:
-                logger.warning(f"Voice ID {voice_id} not found, falling back to default")
-                voice_id = "slt" if "slt" in self.voice_embeddings else list(self.voice_embeddings.keys())[0]
-                
-            voice_embedding = self.voice_embeddings[voice_id]
-            
-            # Tokenize the text
-            inputs = self.processor(text=text, return_tensors="pt").to(self.device)
-            
-            # Check batch size of inputs to ensure compatibility
-            batch_size = inputs.input_ids.shape[0]
-            if voice_embedding.shape[0] != 1 and voice_embedding.shape[0] != batch_size:
-                # Ensure speaker_embeddings has the correct batch dimension
-                voice_embedding = voice_embedding.expand(batch_size, -1)
-                
-            # Generate speech
-            with torch.no_grad():
-                speech = self.model.generate(**inputs, speaker_embeddings=voice_embedding)
-                
-            # Convert to waveform
-            with torch.no_grad():
-                waveform = self.vocoder(speech).cpu().squeeze(0)
-                buffer = io.BytesIO()
-                torchaudio.save(buffer, waveform.unsqueeze(0), sample_rate=16000, format="wav")
-                audio_bytes = buffer.getvalue()
-                
+
+    def _generate_uncached(self, text, chunks, voice_id, decoding, token=NEVER_CANCELLED):
+        start_time = time.time()
+
+        disk_key = self._get_disk_cache_key(chunks, voice_id, decoding)
+        audio_bytes = self.disk_cache.get(disk_key) if self.disk_cache else None
+        if audio_bytes is not None:
             elapsed = time.time() - start_time
-            return audio_bytes, [text], elapsed
-            
-        except Exception as e:
-            logger.error(f"Error during single chunk TTS generation: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            logger.info(f"Disk cache hit for text: '{text[:50]}...' ({len(audio_bytes)} bytes)")
+        else:
+            # Keep raw PCM per chunk and write a single WAV header over all of it
+            pcm_chunks = self._synthesize_chunks(chunks, voice_id, decoding, token)
+            audio_bytes = build_wav(pcm_chunks)
+
+            elapsed = time.time() - start_time
+            logger.info(f"Generated {len(chunks)} chunks ({len(audio_bytes)} bytes) in {elapsed:.2f}s")
+
+            if self.disk_cache:
+                try:
+                    self.disk_cache.put(disk_key, audio_bytes)
+                except OSError as e:
+                    logger.warning(f"Failed to write disk cache entry: {str(e)}")
+
+        return audio_bytes, chunks, elapsed
+
+    def generate_chunk_pcm(self, text, voice="default", token=NEVER_CANCELLED, decoding=None):
+        """Synthesize one chunk and return its raw PCM16 samples, without a WAV header"""
+        start_time = time.time()
+
+        # Determine the voice embedding to use
+        voice_id = self._resolve_voice_id(voice)
+
+        # Served from the chunk cache, or queued and synthesized together with chunks
+        # from other in-flight requests
+        pcm = self._synthesize_chunks([text], voice_id, self._decoding_options(decoding), token)[0]
+
+        elapsed = time.time() - start_time
+        return pcm, elapsed
@@ -0,0 +1,245 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cancellation import CancellationToken, RequestCancelled, NEVER_CANCELLED
+
+logger = logging.getLogger("worker_pool")
+
+# Engine replica owned by this process when running as a pool worker
+_engine = None
+# Shared by all workers of a pool, see _worker_broadcast
+_barrier = None
+
+
+def partition_cores(num_workers):
+    """Split the CPUs this process may use into `num_workers` contiguous groups"""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * num_workers
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < num_workers:
+        return [None] * num_workers
+    size = len(cores) // num_workers
+    return [set(cores[i * size:(i + 1) * size]) for i in range(num_workers)]
+
+
+def load_shared_weights(model_dir):
+    """Load the model and vocoder once and move their tensors to shared memory for the workers"""
+    from transformers import SpeechT5ForTextToSpeech, SpeechT5HifiGan
+
+    weights = {
+        "model": SpeechT5ForTextToSpeech.from_pretrained(os.path.join(model_dir, "speecht5_tts")).state_dict(),
+        "vocoder": SpeechT5HifiGan.from_pretrained(os.path.join(model_dir, "speecht5_hifigan")).state_dict(),
+    }
+    for state_dict in weights.values():
+        for tensor in state_dict.values():
+            tensor.share_memory_()
+    return weights
+
+
+def _init_worker(barrier, core_sets, threads_per_worker, engine_kwargs, log_level):
+    global _engine, _barrier
+    _barrier = barrier
+    logging.basicConfig(
+        level=log_level,
+        format=f'%(asctime)s - %(name)s[{os.getpid()}] - %(levelname)s - %(message)s',
+    )
+
+    cores = core_sets.get()
+    if cores:
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    # Each replica gets its own slice of the machine instead of all of them oversubscribing every core
+    threads = threads_per_worker or (len(cores) if cores else None)
+    if threads:
+        torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from tts_engine import TextToSpeechEngine
+    _engine = TextToSpeechEngine(**engine_kwargs)
+    logger.info(f"Worker {os.getpid()} ready on cores {sorted(cores) if cores else 'all'} with {torch.get_num_threads()} threads")
+
+
+def _worker_ping():
+    return os.getpid()
+
+
+def _worker_broadcast(fn, *args):
+    # Every copy blocks here until all workers hold one, so no worker can pick up two
+    _barrier.wait()
+    return fn(*args)
+
+
+def _worker_generate(text, voice, timeout, decoding):
+    # Deadlines cross the process boundary as a remaining time, not a clock value
+    return _engine.generate(text, voice=voice, token=CancellationToken.with_timeout(timeout), decoding=decoding)
+
+
+def _worker_preprocess(text):
+    # The whole text at once: a generator cannot be handed across the process boundary,
+    # so unlike TextToSpeechEngine.stream() the first chunk waits for the last one
+    from text_preprocessing import preprocess_for_tts
+    return preprocess_for_tts(text, **_engine.chunking)
+
+
+def _worker_shutdown():
+    _engine.shutdown()
+
+
+def _worker_warm_up(batch_sizes):
+    _engine.warm_up(batch_sizes)
+
+
+def _worker_precompute(phrases):
+    _engine.precompute(phrases)
+
+
+def _worker_chunk_pcm(chunk, voice, timeout, decoding):
+    return _engine.generate_chunk_pcm(chunk, voice=voice, token=CancellationToken.with_timeout(timeout), decoding=decoding)
+
+
+class ProcessWorkerPool:
+    """Dispatches synthesis to worker processes that each own a TextToSpeechEngine replica.
+
+    Exposes the same generate()/stream()/get_stats() surface as the engine, so the
+    gRPC servicer can use either.
+    """
+
+    def __init__(self, num_workers, engine_kwargs, threads_per_worker=None, pin_cores=True, share_weights=False):
+        import torch.multiprocessing as torch_mp
+
+        self.num_workers = num_workers
+        # torch's spawn context pickles tensors as shared-memory handles
+        ctx = torch_mp.get_context("spawn")
+
+        engine_kwargs = dict(engine_kwargs)
+        # The onnx runtime has its own sessions per worker, there are no torch weights to share
+        if share_weights and engine_kwargs.get("runtime", "torch") == "torch":
+            logger.info("Loading weights into shared memory for the worker processes")
+            engine_kwargs["shared_weights"] = load_shared_weights(engine_kwargs.get("model_dir", "./models"))
+
+        core_sets = ctx.Queue()
+        for cores in (partition_cores(num_workers) if pin_cores else [None] * num_workers):
+            core_sets.put(cores)
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(ctx.Barrier(num_workers), core_sets, threads_per_worker, engine_kwargs,
+                      logging.getLogger().getEffectiveLevel()),
+        )
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self.startup_times = {}
+
+        # Workers are spawned on demand; a ping to each starts all of them now, and returns
+        # once every replica has loaded, before serving traffic
+        start_time = time.perf_counter()
+        pids = self._broadcast(_worker_ping)
+        self.startup_times["workers"] = time.perf_counter() - start_time
+        logger.info(f"Started {len(set(pids))} TTS worker processes, all ready: {sorted(pids)}")
+
+    def _broadcast(self, fn, *args):
+        """fn(*args) run once in every worker, their results"""
+        futures = [self._executor.submit(_worker_broadcast, fn, *args) for _ in range(self.num_workers)]
+        return [future.result() for future in futures]
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            self._in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    def _cancel(self, futures):
+        # Calls a worker has already picked up run to completion, the rest never start
+        cancelled = sum(1 for future in futures if future.cancel())
+        with self._lock:
+            self._cancelled += cancelled
+
+    def generate(self, text, voice="default", token=NEVER_CANCELLED, decoding=None):
+        future = self._submit(_worker_generate, text, voice, token.remaining(), decoding)
+        try:
+            return token.wait(future)
+        except RequestCancelled:
+            self._cancel([future])
+            raise
+
+    def stream(self, text, voice="default", token=NEVER_CANCELLED, decoding=None):
+        """Yield (chunk, pcm, elapsed, is_last) with the chunks of one request spread over the workers"""
+        chunks = token.wait(self._submit(_worker_preprocess, text))
+        chunk_iter = iter(chunks)
+        pending = deque()
+
+        def fill():
+            while len(pending) < self.num_workers:
+                token.check()
+                chunk = next(chunk_iter, None)
+                if chunk is None:
+                    return
+                pending.append((chunk, time.time(), self._submit(_worker_chunk_pcm, chunk, voice, token.remaining(), decoding)))
+
+        try:
+            fill()
+            while pending:
+                chunk, start_time, future = pending[0]
+                pcm, _ = token.wait(future)
+                pending.popleft()
+                elapsed = time.time() - start_time
+                fill()
+                yield chunk, pcm, elapsed, not pending
+        except (RequestCancelled, GeneratorExit):
+            self._cancel([future for _, _, future in pending])
+            raise
+
+    def warm_up(self, batch_sizes=(1,)):
+        """Run TextToSpeechEngine.warm_up in every worker, so none serves its first requests cold"""
+        start_time = time.perf_counter()
+        self._broadcast(_worker_warm_up, batch_sizes)
+        self.startup_times["warm_up"] = time.perf_counter() - start_time
+
+    def precompute(self, phrases):
+        """Precompute `phrases` in every worker's caches"""
+        start_time = time.perf_counter()
+        # One worker synthesizes them into the shared disk cache, the rest then load them from there
+        self._submit(_worker_precompute, phrases).result()
+        self._broadcast(_worker_precompute, phrases)
+        self.startup_times["phrases"] = time.perf_counter() - start_time
+
+    def queue_depth(self):
+        """Calls submitted to the workers and not yet finished"""
+        with self._lock:
+            return self._in_flight
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+            }
+
+    def shutdown(self):
+        self._broadcast(_worker_shutdown)
+        self._executor.shutdown(wait=True, cancel_futures=True)
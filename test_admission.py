@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, estimate_cost
+
+
+def test_token_budget_rejects_with_retry_after():
+    controller = AdmissionController(max_inflight_tokens=100, initial_tokens_per_second=10.0)
+    controller.admit("a", 80)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("b", 50)
+
+    assert rejected.value.reason == "token_budget"
+    # 30 tokens over budget, or at least the request's own 50, at 10 tokens per second
+    assert rejected.value.retry_after == 5
+    assert controller.get_stats()["rejected"] == {"token_budget": 1}
+
+
+def test_retry_after_is_capped():
+    controller = AdmissionController(max_inflight_tokens=100, initial_tokens_per_second=1.0, max_retry_after=7)
+    controller.admit("a", 100)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("b", 1000)
+    assert rejected.value.retry_after == 7
+
+
+def test_oversized_request_runs_alone():
+    controller = AdmissionController(max_inflight_tokens=100)
+    ticket = controller.admit("a", 500)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("b", 1)
+    controller.release(ticket)
+    controller.admit("b", 1)
+
+
+def test_per_client_limit():
+    controller = AdmissionController(max_inflight_tokens=0, max_requests_per_client=2)
+    tickets = [controller.admit("a", 10), controller.admit("a", 10)]
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("a", 10)
+    assert rejected.value.reason == "client_concurrency"
+
+    # Other clients are not affected, and a release frees a slot
+    controller.admit("b", 10)
+    controller.release(tickets[0])
+    controller.admit("a", 10)
+
+
+def test_queue_depth_limit():
+    depth = [5]
+    controller = AdmissionController(max_inflight_tokens=0, max_queue_depth=5, queue_depth_fn=lambda: depth[0])
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("a", 10)
+    assert rejected.value.reason == "queue_depth"
+    depth[0] = 4
+    controller.admit("a", 10)
+
+
+def test_waits_for_capacity_before_rejecting():
+    controller = AdmissionController(max_inflight_tokens=100, max_wait_ms=2000)
+    ticket = controller.admit("a", 100)
+    threading.Timer(0.05, controller.release, args=(ticket,)).start()
+
+    controller.admit("b", 50)
+    assert controller.get_stats()["deferred"] == 1
+
+
+def test_admit_async_rejects_after_waiting():
+    controller = AdmissionController(max_inflight_tokens=100, max_wait_ms=100)
+    controller.admit("a", 100)
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(controller.admit_async("b", 10))
+    assert controller.get_stats()["deferred"] == 1
+
+
+def test_cost_charges_digits_for_spelled_out_numbers():
+    assert estimate_cost("I have cats.") == len("I have cats.")
+    assert estimate_cost("I have 2 cats.") >= len("I have two cats.")
+    assert estimate_cost("In 2024 it cost $1200.") > estimate_cost("In 1 it cost $1.")
@@ -0,0 +1,103 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_format import (
+    OUTPUT_FORMATS,
+    SAMPLE_RATE,
+    WAV_HEADER_SIZE,
+    StreamEncoder,
+    build_wav,
+    encode_pcm,
+    float_to_pcm16,
+    pcm16_to_float,
+    streaming_wav_header,
+    transcode_wav,
+    wav_header,
+)
+
+
+def _tone(seconds=0.25, frequency=440.0):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def test_build_wav_joins_chunks_behind_one_header():
+    chunks = [float_to_pcm16(_tone()), float_to_pcm16(_tone(frequency=220.0))]
+    data = build_wav(chunks)
+
+    assert len(data) == WAV_HEADER_SIZE + sum(len(chunk) for chunk in chunks)
+    with wave.open(io.BytesIO(data)) as f:
+        assert f.getframerate() == SAMPLE_RATE
+        assert f.getnchannels() == 1
+        assert f.getsampwidth() == 2
+        assert f.readframes(f.getnframes()) == b"".join(chunks)
+
+
+def test_header_matches_the_wave_module():
+    pcm = float_to_pcm16(_tone())
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm)
+    assert buffer.getvalue()[:WAV_HEADER_SIZE] == wav_header(len(pcm))
+
+
+def test_pcm16_roundtrip_and_clipping():
+    samples = np.array([-2.0, -1.0, -0.5, 0.0, 0.5, 1.0, 2.0], dtype=np.float32)
+    restored = pcm16_to_float(float_to_pcm16(samples))
+    assert np.allclose(restored, np.clip(samples, -1.0, 1.0), atol=1 / 32767)
+
+
+def _decode(data):
+    samples, rate = sf.read(io.BytesIO(data), dtype="int16")
+    assert rate == SAMPLE_RATE
+    return samples
+
+
+def test_flac_is_lossless():
+    pcm = float_to_pcm16(_tone())
+    assert _decode(encode_pcm(pcm, "flac")).tobytes() == pcm
+
+
+@pytest.mark.parametrize("audio_format", ["ogg", "mp3"])
+def test_lossy_formats_decode_to_about_the_same_length(audio_format):
+    pcm = float_to_pcm16(_tone(seconds=1.0))
+    samples = _decode(encode_pcm(pcm, audio_format))
+    assert abs(len(samples) - SAMPLE_RATE) < SAMPLE_RATE * 0.1
+
+
+def test_transcode_wav_matches_encode_pcm():
+    pcm = float_to_pcm16(_tone())
+    assert transcode_wav(build_wav([pcm]), "wav") == build_wav([pcm])
+    assert _decode(transcode_wav(build_wav([pcm]), "flac")).tobytes() == pcm
+
+
+# Header bytes only known once the stream is complete, sent as placeholders: FLAC's
+# STREAMINFO block, and the first MP3 frame, which carries the LAME tag
+FINAL_HEADER_BYTES = {"flac": 42, "mp3": 288}
+
+
+@pytest.mark.parametrize("audio_format", OUTPUT_FORMATS)
+def test_stream_encoder_pieces_concatenate_into_one_file(audio_format):
+    pieces = [float_to_pcm16(_tone(frequency=f)) for f in (220.0, 330.0, 440.0)]
+    encoder = StreamEncoder(audio_format)
+    data = b"".join(encoder.encode(pcm, last=i == len(pieces) - 1) for i, pcm in enumerate(pieces))
+    encoder.close()
+
+    if audio_format == "wav":
+        assert data[:WAV_HEADER_SIZE] == streaming_wav_header()
+        assert data[WAV_HEADER_SIZE:] == b"".join(pieces)
+    elif audio_format in FINAL_HEADER_BYTES:
+        whole = encode_pcm(b"".join(pieces), audio_format)
+        skip = FINAL_HEADER_BYTES[audio_format]
+        assert len(data) == len(whole)
+        assert data[skip:] == whole[skip:]
+    else:
+        expected = sum(len(pcm) for pcm in pieces) // 2
+        assert abs(len(_decode(data)) - expected) < expected * 0.1
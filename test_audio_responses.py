@@ -0,0 +1,26 @@
+import pytest
+
+from audio_responses import JSON_MEDIA_TYPE, MULTIPART_MEDIA_TYPE, negotiate, parse_accept
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON_MEDIA_TYPE),
+    ("", JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    ("application/json", JSON_MEDIA_TYPE),
+    ("audio/wav", "audio/wav"),
+    ("audio/mpeg, application/json;q=0.5", "audio/mpeg"),
+    ("application/json;q=0.5, audio/flac", "audio/flac"),
+    ("audio/*", "audio/wav"),
+    ("multipart/mixed", MULTIPART_MEDIA_TYPE),
+    ("text/html", None),
+    ("audio/wav;q=0", None),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_parse_accept_orders_by_quality_then_position():
+    assert parse_accept("audio/ogg;q=0.8, audio/wav, audio/mpeg;q=0.8, text/plain;q=bad") == [
+        ("audio/wav", 1.0), ("audio/ogg", 0.8), ("audio/mpeg", 0.8),
+    ]
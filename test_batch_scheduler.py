@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from batch_scheduler import BatchScheduler
+
+
+class RecordingBatchFn:
+    """Upper-cases each text and records the batches it was called with"""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, texts, voice_ids, listeners, decodings):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+
+def test_concurrent_submissions_share_a_batch():
+    batch_fn = RecordingBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=200)
+    futures = [scheduler.submit(text, 0) for text in ("a", "b", "c", "d")]
+
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", "C", "D"]
+    assert batch_fn.batches == [["a", "b", "c", "d"]]
+    assert scheduler.get_stats()["batch_size_histogram"] == {4: 1}
+    scheduler.shutdown()
+
+
+def test_batches_are_capped_at_max_batch_size():
+    gate = threading.Event()
+    batch_fn = RecordingBatchFn(gate)
+    scheduler = BatchScheduler(batch_fn, max_batch_size=2, max_wait_ms=1)
+    # The first batch blocks in batch_fn while the rest queue up behind it
+    futures = [scheduler.submit("first", 0)]
+    futures += [scheduler.submit(str(i), 0) for i in range(5)]
+    gate.set()
+
+    assert [future.result(timeout=5) for future in futures] == ["FIRST", "0", "1", "2", "3", "4"]
+    assert all(len(batch) <= 2 for batch in batch_fn.batches)
+    scheduler.shutdown()
+
+
+def test_single_item_is_flushed_after_max_wait():
+    scheduler = BatchScheduler(RecordingBatchFn(), max_batch_size=8, max_wait_ms=10)
+    assert scheduler.submit("solo", 0).result(timeout=5) == "SOLO"
+    scheduler.shutdown()
+
+
+def test_batch_failure_reaches_every_caller():
+    def failing(texts, voice_ids, listeners, decodings):
+        raise RuntimeError("model crashed")
+
+    scheduler = BatchScheduler(failing, max_batch_size=2, max_wait_ms=50)
+    futures = [scheduler.submit("a", 0), scheduler.submit("b", 0)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=5)
+    scheduler.shutdown()
+
+
+def test_wrong_result_count_fails_the_batch():
+    scheduler = BatchScheduler(lambda texts, *_: [], max_batch_size=1, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="returned 0 results"):
+        scheduler.submit("a", 0).result(timeout=5)
+    scheduler.shutdown()
+
+
+def test_submit_after_shutdown_raises():
+    scheduler = BatchScheduler(RecordingBatchFn())
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit("a", 0)
+
+
+def test_earliest_deadline_goes_first():
+    gate = threading.Event()
+    batch_fn = RecordingBatchFn(gate)
+    scheduler = BatchScheduler(batch_fn, max_batch_size=1, max_wait_ms=1)
+    blocker = scheduler.submit("blocker", 0)
+    while scheduler.queue_depth():
+        time.sleep(0.001)
+
+    futures = [
+        scheduler.submit("none", 0),
+        scheduler.submit("late", 0, deadline=time.monotonic() + 30),
+        scheduler.submit("soon", 0, deadline=time.monotonic() + 10),
+        scheduler.submit("later", 0, deadline=time.monotonic() + 20),
+    ]
+    gate.set()
+    blocker.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+
+    assert batch_fn.batches == [["blocker"], ["soon"], ["later"], ["late"], ["none"]]
+    scheduler.shutdown()
+
+
+def test_cancelled_items_are_dropped_unsynthesized():
+    gate = threading.Event()
+    batch_fn = RecordingBatchFn(gate)
+    scheduler = BatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=1)
+    blocker = scheduler.submit("blocker", 0)
+    while scheduler.queue_depth():
+        time.sleep(0.001)
+
+    keep = scheduler.submit("keep", 0)
+    drop = scheduler.submit("drop", 0)
+    assert drop.cancel()
+    gate.set()
+
+    assert blocker.result(timeout=5) == "BLOCKER"
+    assert keep.result(timeout=5) == "KEEP"
+    assert all("drop" not in batch for batch in batch_fn.batches)
+    assert scheduler.get_stats()["dropped_cancelled"] == 1
+    scheduler.shutdown()
@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from cancellation import CancellationToken, RequestCancelled
+
+# What sync gRPC's context.time_remaining() returns for a call without a deadline
+NO_GRPC_DEADLINE = 9.223372036854776e18
+
+
+def _resolve_later(future, value, delay=0.05):
+    threading.Timer(delay, future.set_result, args=(value,)).start()
+
+
+def test_wait_without_deadline_returns_result():
+    token = CancellationToken.with_timeout(None)
+    future = Future()
+    _resolve_later(future, "pcm")
+    assert token.wait(future) == "pcm"
+
+
+@pytest.mark.parametrize("timeout", [NO_GRPC_DEADLINE, float("inf"), threading.TIMEOUT_MAX * 2])
+def test_huge_timeout_means_no_deadline(timeout):
+    token = CancellationToken.with_timeout(timeout)
+    assert token.deadline is None
+    assert not token.expired()
+
+    future = Future()
+    _resolve_later(future, "pcm")
+    assert token.wait(future) == "pcm"
+
+
+def test_huge_explicit_deadline_does_not_overflow_wait():
+    token = CancellationToken(time.monotonic() + NO_GRPC_DEADLINE)
+    future = Future()
+    _resolve_later(future, "pcm")
+    assert token.wait(future) == "pcm"
+
+
+def test_wait_raises_when_deadline_passes():
+    token = CancellationToken.with_timeout(0.05)
+    start = time.monotonic()
+    with pytest.raises(RequestCancelled, match="deadline"):
+        token.wait(Future())
+    assert time.monotonic() - start < 1.0
+    assert token.cancelled()
+
+
+def test_wait_raises_when_cancelled():
+    token = CancellationToken()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(RequestCancelled, match="cancelled"):
+        token.wait(Future())
+
+
+def test_callback_runs_once_and_right_away_after_cancel():
+    token = CancellationToken()
+    calls = []
+    token.add_callback(lambda: calls.append("before"))
+    token.cancel()
+    token.cancel()
+    token.add_callback(lambda: calls.append("after"))
+    assert calls == ["before", "after"]
+
+
+def test_wait_does_not_keep_callbacks():
+    token = CancellationToken()
+    for _ in range(100):
+        future = Future()
+        _resolve_later(future, "pcm", delay=0.001)
+        token.wait(future)
+        token.wait(future)
+    assert token._callbacks == []
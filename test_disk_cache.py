@@ -0,0 +1,82 @@
+import os
+
+from disk_cache import DiskCache, INDEX_FILE
+
+
+def _cache(tmp_path, max_bytes=100):
+    # No background flusher, the tests call flush() themselves
+    return DiskCache(str(tmp_path), max_bytes=max_bytes, index_flush_interval=0)
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.put("ab12", b"audio")
+    assert "ab12" in cache
+    assert cache.get("ab12") == b"audio"
+    assert cache.get("cd34") is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_by_bytes(tmp_path):
+    cache = _cache(tmp_path, max_bytes=100)
+    cache.put("aa", b"x" * 40)
+    cache.put("bb", b"x" * 40)
+    cache.get("aa")
+    cache.put("cc", b"x" * 40)
+
+    assert cache.get("bb") is None
+    assert cache.get("aa") is not None
+    assert cache.get("cc") is not None
+    assert cache.get_stats()["bytes"] == 80
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_entry_larger_than_budget_is_refused(tmp_path):
+    cache = _cache(tmp_path, max_bytes=10)
+    assert not cache.put("aa", b"x" * 11)
+    assert "aa" not in cache
+
+
+def test_put_does_not_write_index_until_flush(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("aa", b"audio")
+    assert not os.path.exists(tmp_path / INDEX_FILE)
+
+    cache.flush()
+    reloaded = _cache(tmp_path)
+    assert reloaded.get_stats()["entries"] == 1
+    assert reloaded.get_stats()["bytes"] == 5
+
+
+def test_processes_sharing_a_directory_share_the_budget(tmp_path):
+    first = _cache(tmp_path, max_bytes=100)
+    second = _cache(tmp_path, max_bytes=100)
+    first.put("aa", b"x" * 40)
+    first.put("bb", b"x" * 40)
+    first.flush()
+
+    # The second cache learns of the first one's entries when it writes the index
+    second.put("cc", b"x" * 40)
+    second.flush()
+    assert second.get_stats()["bytes"] == 80
+    assert "aa" not in second
+    assert second.get("bb") is not None
+
+    # ... and the first one sees that eviction on its next write
+    first.put("dd", b"x" * 10)
+    first.flush()
+    assert first.get_stats()["bytes"] == 90
+    assert first.get("aa") is None
+
+
+def test_own_evictions_are_not_merged_back(tmp_path):
+    cache = _cache(tmp_path, max_bytes=100)
+    cache.put("aa", b"x" * 60)
+    cache.flush()
+    cache.put("bb", b"x" * 60)
+    cache.flush()
+
+    reloaded = _cache(tmp_path, max_bytes=100)
+    assert reloaded.get_stats()["entries"] == 1
+    assert reloaded.get("bb") is not None
@@ -0,0 +1,105 @@
+import asyncio
+import socket
+
+import grpc
+import pytest
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+from common import service_pb2, service_pb2_grpc
+from grpc_channels import HEALTH_SERVICE_NAME, ChannelPool
+
+
+class NamedServicer(service_pb2_grpc.TTSServiceServicer):
+    """Answers Generate with its own name, so a test can tell which server a stub reached"""
+
+    def __init__(self, name):
+        self.name = name
+
+    async def Generate(self, request, context):
+        return service_pb2.AudioReply(audio_data=self.name.encode())
+
+
+async def _start_server(name, status):
+    server = grpc.aio.server()
+    service_pb2_grpc.add_TTSServiceServicer_to_server(NamedServicer(name), server)
+    health_service = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_service, server)
+    await health_service.set(HEALTH_SERVICE_NAME, status)
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    return server, f"127.0.0.1:{port}"
+
+
+def _unused_target():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def _with_servers(test, *statuses):
+    started = [await _start_server(name, status) for name, status in zip("ab", statuses)]
+    try:
+        return await test([target for _, target in started])
+    finally:
+        for server, _ in started:
+            await server.stop(None)
+
+
+async def _reached(pool, calls):
+    return [(await pool.stub().Generate(service_pb2.TextRequest(text="hi"))).audio_data.decode() for _ in range(calls)]
+
+
+def test_stubs_are_handed_out_round_robin():
+    async def test(targets):
+        pool = ChannelPool(targets)
+        try:
+            return await _reached(pool, 4)
+        finally:
+            await pool.close()
+
+    serving = health_pb2.HealthCheckResponse.SERVING
+    assert asyncio.run(_with_servers(test, serving, serving)) == ["a", "b", "a", "b"]
+
+
+def test_round_robin_covers_every_channel_of_a_target():
+    async def test(targets):
+        pool = ChannelPool(targets, channels_per_target=2)
+        try:
+            return await _reached(pool, 4)
+        finally:
+            await pool.close()
+
+    serving = health_pb2.HealthCheckResponse.SERVING
+    assert asyncio.run(_with_servers(test, serving, serving)) == ["a", "a", "b", "b"]
+
+
+def test_check_health_reports_each_target():
+    dead = _unused_target()
+
+    async def test(targets):
+        pool = ChannelPool(targets + [dead], channels_per_target=2)
+        try:
+            return targets, await pool.check_health(timeout=1.0)
+        finally:
+            await pool.close()
+
+    targets, statuses = asyncio.run(_with_servers(
+        test, health_pb2.HealthCheckResponse.SERVING, health_pb2.HealthCheckResponse.NOT_SERVING,
+    ))
+    assert statuses == {targets[0]: "SERVING", targets[1]: "NOT_SERVING", dead: "UNAVAILABLE"}
+
+
+def test_closed_pool_refuses_calls():
+    async def test(targets):
+        pool = ChannelPool(targets, channels_per_target=2)
+        await pool.close()
+        with pytest.raises(grpc.aio.UsageError):
+            await pool.stub().Generate(service_pb2.TextRequest(text="hi"))
+        return True
+
+    assert asyncio.run(_with_servers(test, health_pb2.HealthCheckResponse.SERVING))
+
+
+def test_pool_needs_a_target():
+    with pytest.raises(ValueError):
+        ChannelPool([])
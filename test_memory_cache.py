@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from memory_cache import LRUCache, SingleFlight
+
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", b"xxxx")
+    cache.put("b", b"xxxx")
+    cache.get("a")
+    cache.put("c", b"xxxx")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"xxxx"
+    assert cache.get("c") == b"xxxx"
+    stats = cache.get_stats()
+    assert stats["bytes"] == 8
+    assert stats["evictions"] == 1
+
+
+def test_lru_replacing_a_key_updates_its_size():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", b"x" * 8)
+    cache.put("a", b"x" * 2)
+    cache.put("b", b"x" * 8)
+    assert cache.get("a") == b"xx"
+    assert cache.get_stats()["bytes"] == 10
+
+
+def test_lru_refuses_values_larger_than_the_budget():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", b"x" * 5)
+    assert not cache.put("big", b"x" * 11)
+    assert cache.get("a") == b"x" * 5
+    assert len(cache) == 1
+
+
+def test_lru_custom_size_function():
+    cache = LRUCache(max_bytes=100, size_fn=lambda value: value["size"])
+    cache.put("a", {"size": 60})
+    cache.put("b", {"size": 60})
+    assert cache.get("a") is None
+    assert cache.get("b") == {"size": 60}
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", compute)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # Followers register before the leader finishes
+    while flight.get_stats()["coalesced"] < 3:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.get_stats() == {"in_flight": 0, "executions": 1, "coalesced": 3, "abandoned": 0}
+
+
+def test_single_flight_shares_the_leaders_exception_then_forgets_it():
+    def fail():
+        raise ValueError("boom")
+
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "second try") == "second try"
+
+
+def test_share_cancels_only_when_the_last_caller_abandons():
+    flight = SingleFlight()
+    future = Future()
+    assert flight.share("key", lambda: future) is future
+    assert flight.share("key", lambda: Future()) is future
+
+    assert not flight.abandon("key", future)
+    assert not future.cancelled()
+    assert flight.abandon("key", future)
+    assert future.cancelled()
+
+    # A new caller starts a fresh call instead of joining the cancelled one
+    fresh = Future()
+    assert flight.share("key", lambda: fresh) is fresh
+
+
+def test_share_forgets_finished_calls():
+    flight = SingleFlight()
+    future = Future()
+    flight.share("key", lambda: future)
+    future.set_result("pcm")
+    fresh = Future()
+    assert flight.share("key", lambda: fresh) is fresh
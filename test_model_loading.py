@@ -0,0 +1,67 @@
+import os
+import time
+
+import torch
+
+from model_loading import PACKED_EMBEDDINGS, PACKED_NAMES, load_pretrained, load_voice_embeddings
+
+
+def _write_voices(emb_dir, voices):
+    for name, values in voices.items():
+        torch.save(torch.tensor(values).unsqueeze(0), os.path.join(emb_dir, f"{name}.pt"))
+
+
+def test_embeddings_are_packed_then_mapped(tmp_path):
+    _write_voices(tmp_path, {"slt": [1.0, 2.0], "bdl": [3.0, 4.0]})
+
+    first = load_voice_embeddings(str(tmp_path), "cpu")
+    assert (tmp_path / PACKED_EMBEDDINGS).exists() and (tmp_path / PACKED_NAMES).exists()
+
+    second = load_voice_embeddings(str(tmp_path), "cpu")
+    assert sorted(second) == ["bdl", "slt"]
+    for name in first:
+        assert second[name].shape == (1, 2)
+        assert torch.equal(first[name], second[name])
+    assert torch.equal(second["slt"], torch.tensor([[1.0, 2.0]]))
+
+
+def test_changed_embedding_is_repacked(tmp_path):
+    _write_voices(tmp_path, {"slt": [1.0, 2.0]})
+    load_voice_embeddings(str(tmp_path), "cpu")
+
+    # A newer .pt file than the packed array
+    _write_voices(tmp_path, {"slt": [5.0, 6.0]})
+    later = time.time() + 1
+    os.utime(tmp_path / "slt.pt", (later, later))
+    assert torch.equal(load_voice_embeddings(str(tmp_path), "cpu")["slt"], torch.tensor([[5.0, 6.0]]))
+
+    _write_voices(tmp_path, {"awb": [7.0, 8.0]})
+    assert sorted(load_voice_embeddings(str(tmp_path), "cpu")) == ["awb", "slt"]
+
+
+def test_broken_embedding_is_skipped(tmp_path):
+    _write_voices(tmp_path, {"slt": [1.0, 2.0]})
+    (tmp_path / "bad.pt").write_bytes(b"not a tensor")
+    assert sorted(load_voice_embeddings(str(tmp_path), "cpu")) == ["slt"]
+
+
+def test_mapped_embeddings_are_writable(tmp_path):
+    _write_voices(tmp_path, {"slt": [1.0, 2.0]})
+    load_voice_embeddings(str(tmp_path), "cpu")
+    embedding = load_voice_embeddings(str(tmp_path), "cpu")["slt"]
+    # Copy-on-write: changing the tensor does not touch the file
+    embedding += 1
+    assert torch.equal(load_voice_embeddings(str(tmp_path), "cpu")["slt"], torch.tensor([[1.0, 2.0]]))
+
+
+def test_load_pretrained_matches_from_pretrained(tmp_path):
+    from transformers import SpeechT5HifiGan, SpeechT5HifiGanConfig
+
+    torch.manual_seed(0)
+    SpeechT5HifiGan(SpeechT5HifiGanConfig(upsample_initial_channel=16)).save_pretrained(tmp_path)
+
+    mapped = load_pretrained(SpeechT5HifiGan, SpeechT5HifiGanConfig, str(tmp_path), "cpu")
+    expected = SpeechT5HifiGan.from_pretrained(str(tmp_path)).eval()
+    assert not mapped.training
+    for (name, tensor), (_, expected_tensor) in zip(mapped.state_dict().items(), expected.state_dict().items()):
+        assert torch.equal(tensor, expected_tensor), name
@@ -0,0 +1,81 @@
+import warnings
+
+import numpy as np
+import pytest
+import torch
+
+# Exporting needs the onnx package from requirements-export.txt
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from export_onnx import export_all
+from onnx_backend import OnnxSpeechT5
+from speecht5_decoding import DecodingOptions, StoppingCriteria, decode_steps
+
+# Stop scores sum reduction_factor (2) probabilities, so rows run to their length limit
+UNREACHABLE = 3.0
+
+
+@pytest.fixture(scope="module")
+def tiny_models(tmp_path_factory):
+    from transformers import SpeechT5Config, SpeechT5ForTextToSpeech, SpeechT5HifiGan, SpeechT5HifiGanConfig
+
+    torch.manual_seed(0)
+    config = SpeechT5Config(
+        vocab_size=81, hidden_size=32, encoder_layers=2, decoder_layers=2, encoder_attention_heads=2,
+        decoder_attention_heads=2, encoder_ffn_dim=64, decoder_ffn_dim=64, speech_decoder_prenet_units=16,
+        speech_decoder_postnet_units=16, speaker_embedding_dim=8, num_mel_bins=8,
+        # Without dropout the prenet masks are all equal, so both runtimes see the same inputs
+        speech_decoder_prenet_dropout=0.0,
+    )
+    model = SpeechT5ForTextToSpeech(config).eval()
+    vocoder = SpeechT5HifiGan(SpeechT5HifiGanConfig(model_in_dim=8, upsample_initial_channel=16)).eval()
+
+    onnx_dir = tmp_path_factory.mktemp("onnx")
+    # The tracer warns about every shape check in the modeling code
+    with torch.inference_mode(), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        export_all(model, vocoder, str(onnx_dir))
+    return model, vocoder, OnnxSpeechT5(str(onnx_dir))
+
+
+def _collect(steps, num_rows):
+    spectra = {row: [] for row in range(num_rows)}
+    for spectrum, rows, _ in steps:
+        for pos, row in enumerate(rows):
+            spectra[row].append(np.asarray(spectrum[pos]))
+    return [np.concatenate(spectra[row]) for row in range(num_rows)]
+
+
+def test_onnx_decode_steps_match_pytorch(tiny_models):
+    model, _, onnx_model = tiny_models
+    torch.manual_seed(2)
+    pad = model.config.pad_token_id
+    input_ids = torch.full((2, 14), pad)
+    input_ids[0, :5] = torch.randint(4, 81, (5,))
+    input_ids[1] = torch.randint(4, 81, (14,))
+    attention_mask = (input_ids != pad).long()
+    speaker_embeddings = torch.randn(2, 8)
+    lengths = attention_mask.sum(dim=1).tolist()
+    options = [DecodingOptions(threshold=UNREACHABLE, minlenratio=0.0, maxlenratio=2.0)] * 2
+
+    with torch.inference_mode():
+        expected = _collect(decode_steps(model, input_ids, speaker_embeddings, StoppingCriteria(lengths, 2, options), attention_mask), 2)
+    actual = _collect(onnx_model.decode_steps(input_ids.numpy(), attention_mask.numpy(), speaker_embeddings.numpy(),
+                                              StoppingCriteria(lengths, 2, options)), 2)
+
+    # The short row leaves the batch early in both runtimes
+    assert [len(rows) for rows in actual] == [len(rows) for rows in expected] == [10, 28]
+    for onnx_rows, torch_rows in zip(actual, expected):
+        np.testing.assert_allclose(onnx_rows, torch_rows, rtol=1e-4, atol=1e-4)
+
+
+def test_onnx_render_matches_pytorch(tiny_models):
+    model, vocoder, onnx_model = tiny_models
+    mel = np.random.default_rng(0).standard_normal((20, 8)).astype(np.float32)
+
+    with torch.inference_mode():
+        postnet = model.speech_decoder_postnet.postnet(torch.from_numpy(mel).unsqueeze(0))
+        expected = vocoder(postnet[:, 4:16])[0].numpy()
+
+    np.testing.assert_allclose(onnx_model.render(mel, 4, 16), expected, rtol=1e-4, atol=1e-4)
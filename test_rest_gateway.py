@@ -0,0 +1,46 @@
+import asyncio
+import ipaddress
+import json
+import os
+import tempfile
+
+# The gateway sets up file logging on import
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp())
+
+import pytest
+from starlette.requests import Request
+
+import rest_gateway
+
+
+def _request(host, client_id=None):
+    headers = [(b"x-client-id", client_id.encode())] if client_id else []
+    return Request({"type": "http", "method": "POST", "path": "/generate", "headers": headers, "client": (host, 5000)})
+
+
+@pytest.fixture
+def trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rest_gateway, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/24")])
+
+
+def test_header_ignored_from_untrusted_callers(trusted_proxies):
+    assert rest_gateway.client_metadata(_request("203.0.113.7", "alice")) == (("x-client-id", "203.0.113.7"),)
+
+
+def test_header_used_from_trusted_proxy(trusted_proxies):
+    assert rest_gateway.client_metadata(_request("10.0.0.5", "alice")) == (("x-client-id", "alice"),)
+
+
+def test_trusted_proxy_without_header_uses_its_address(trusted_proxies):
+    assert rest_gateway.client_metadata(_request("10.0.0.5")) == (("x-client-id", "10.0.0.5"),)
+
+
+def test_no_trusted_proxies_by_default():
+    assert rest_gateway.client_metadata(_request("10.0.0.5", "alice")) == (("x-client-id", "10.0.0.5"),)
+
+
+def test_health_check_before_the_channel_pool_exists(monkeypatch):
+    monkeypatch.setattr(rest_gateway, "channel_pool", None)
+    response = asyncio.run(rest_gateway.health_check())
+    assert response.status_code == 503
+    assert json.loads(response.body) == {"status": "unhealthy", "dependencies": {"grpc_server": "down"}, "servers": {}}
@@ -0,0 +1,204 @@
+import asyncio
+import ipaddress
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# The server sets up file logging on import
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp())
+
+import grpc
+import pytest
+
+from common import service_pb2, service_pb2_grpc
+from admission import AdmissionController
+import server
+
+
+class FakeContext:
+    """The parts of grpc.ServicerContext the token and client id helpers use"""
+
+    def __init__(self, time_remaining=None, peer="ipv4:10.0.0.5:53422", metadata=()):
+        self._time_remaining = time_remaining
+        self._peer = peer
+        self._metadata = metadata
+        self.callbacks = []
+
+    def time_remaining(self):
+        return self._time_remaining
+
+    def peer(self):
+        return self._peer
+
+    def invocation_metadata(self):
+        return self._metadata
+
+    def set_details(self, details):
+        self.details = details
+
+    def set_code(self, code):
+        self.code = code
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+
+def test_call_without_deadline_gets_a_token_without_deadline():
+    # What sync gRPC reports for a call without a deadline
+    context = FakeContext(9.223372036854776e18)
+    token = server._cancellation_token(context)
+
+    assert token.deadline is None
+    future = Future()
+    future.set_result(b"pcm")
+    assert token.wait(future) == b"pcm"
+
+    # The RPC ending cancels the token
+    context.callbacks[0]()
+    assert token.cancelled()
+
+
+def test_call_with_deadline_keeps_it():
+    token = server._cancellation_token(FakeContext(5.0))
+    assert 4.0 < token.remaining() <= 5.0
+
+
+@pytest.fixture
+def trusted_proxies(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/24"), ipaddress.ip_network("::1/128")])
+
+
+def test_client_id_metadata_ignored_from_untrusted_peers(trusted_proxies):
+    context = FakeContext(peer="ipv4:203.0.113.7:40000", metadata=(("x-client-id", "alice"),))
+    assert server._client_id(context) == "ipv4:203.0.113.7"
+
+
+def test_client_id_metadata_used_from_trusted_proxy(trusted_proxies):
+    assert server._client_id(FakeContext(metadata=(("x-client-id", "alice"),))) == "alice"
+    assert server._client_id(FakeContext(peer="ipv6:[::1]:40000", metadata=(("x-client-id", "bob"),))) == "bob"
+
+
+def test_trusted_proxy_without_metadata_uses_its_address(trusted_proxies):
+    assert server._client_id(FakeContext()) == "ipv4:10.0.0.5"
+
+
+def test_client_id_metadata_ignored_without_trusted_proxies():
+    context = FakeContext(metadata=(("x-client-id", "alice"),))
+    assert server._client_id(context) == "ipv4:10.0.0.5"
+    assert not server._is_trusted_proxy("unix:/tmp/tts.sock")
+
+
+def test_load_phrases_skips_blanks_and_comments(tmp_path):
+    path = tmp_path / "phrases.txt"
+    path.write_text("# greetings\nOnce upon a time\n\n   \n  The end.  \n  # indented comment\n", encoding="utf-8")
+    assert server.load_phrases(str(path)) == ["Once upon a time", "The end."]
+
+
+def test_load_phrases_without_a_file():
+    assert server.load_phrases("") == []
+    assert server.load_phrases("/nonexistent/phrases.txt") == []
+
+
+class PieceEngine:
+    """Streams two text chunks, the first vocoded in two pieces"""
+
+    def stream(self, text, voice=None, token=None, decoding=None):
+        yield "Once upon a time.", b"\x01\x00" * 4, 0.1, False
+        yield None, b"\x02\x00" * 4, 0.2, False
+        yield "The end.", b"\x03\x00" * 4, 0.3, True
+
+
+@pytest.fixture
+def ready(monkeypatch):
+    """Sets up a ready server around the engine passed to it"""
+
+    def install(engine):
+        monkeypatch.setattr(server, "tts_engine", engine)
+        monkeypatch.setattr(server, "admission_controller", AdmissionController())
+        monkeypatch.setattr(server.engine_ready, "is_set", lambda: True)
+
+    return install
+
+
+def test_stream_replies_count_text_chunks_not_pieces(ready):
+    ready(PieceEngine())
+    context = FakeContext()
+    replies = list(server.TTSServiceServicer().StreamGenerate(service_pb2.TextRequest(text="Once upon a time. The end."), context))
+
+    assert [reply.chunk_index for reply in replies] == [1, 1, 2]
+    assert [reply.total_chunks for reply in replies] == [0, 0, 2]
+    assert [list(reply.chunks) for reply in replies] == [["Once upon a time."], [], ["The end."]]
+    # Only the first reply carries the WAV header
+    assert [reply.format for reply in replies] == ["wav", "pcm_s16le", "pcm_s16le"]
+    assert server.admission_controller.get_stats()["inflight_requests"] == 0
+
+
+class BlockingEngine:
+    """Streams one chunk, then waits for the call to be cancelled or fails the stream"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.finished = threading.Event()
+
+    def stream(self, text, voice=None, token=None, decoding=None):
+        try:
+            yield "Once upon a time.", b"\x01\x00" * 4, 0.1, False
+            if self.fail:
+                raise RuntimeError("model crashed")
+            token.wait(Future())
+        finally:
+            self.finished.set()
+
+
+async def _stream_over_aio(engine, cancel_after_first):
+    """StreamGenerate over an in-process grpc.aio server: the first reply, then a cancel or the failure"""
+    executor = ThreadPoolExecutor(max_workers=2)
+    grpc_server = grpc.aio.server()
+    service_pb2_grpc.add_TTSServiceServicer_to_server(server.AsyncTTSServiceServicer(executor), grpc_server)
+    port = grpc_server.add_insecure_port("127.0.0.1:0")
+    await grpc_server.start()
+    try:
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            call = service_pb2_grpc.TTSServiceStub(channel).StreamGenerate(service_pb2.TextRequest(text="Once upon a time."))
+            first = await call.read()
+            if cancel_after_first:
+                call.cancel()
+            else:
+                with pytest.raises(grpc.aio.AioRpcError):
+                    await call.read()
+            code = await call.code()
+
+        # The handler's cleanup runs once the call has ended on the server
+        for _ in range(500):
+            if engine.finished.is_set() and server.admission_controller.get_stats()["inflight_requests"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return first, code, await call.details()
+    finally:
+        await grpc_server.stop(None)
+        executor.shutdown(wait=True)
+
+
+def test_aio_stream_cancelled_by_the_client_releases_its_slot(ready):
+    engine = BlockingEngine()
+    ready(engine)
+    first, code, _ = asyncio.run(_stream_over_aio(engine, cancel_after_first=True))
+
+    assert first.chunks == ["Once upon a time."]
+    assert code == grpc.StatusCode.CANCELLED
+    # The engine's stream stopped (through the token) and the admission slot is free again
+    assert engine.finished.is_set()
+    assert server.admission_controller.get_stats()["inflight_requests"] == 0
+
+
+def test_aio_stream_failure_releases_its_slot(ready):
+    engine = BlockingEngine(fail=True)
+    ready(engine)
+    first, code, details = asyncio.run(_stream_over_aio(engine, cancel_after_first=False))
+
+    assert first.chunk_index == 1
+    assert code == grpc.StatusCode.INTERNAL
+    assert details == "model crashed"
+    assert engine.finished.is_set()
+    assert server.admission_controller.get_stats()["inflight_requests"] == 0
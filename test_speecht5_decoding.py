@@ -0,0 +1,164 @@
+import numpy as np
+import pytest
+import torch
+
+from speecht5_decoding import DEFAULT_DECODING, DecodingOptions, IncrementalVocoder, StoppingCriteria, decode_steps
+
+HOP_LENGTH = 4
+POSTNET_FRAMES = 2
+
+
+def render(mel, start, stop):
+    """Stand-in for postnet + vocoder with a receptive field of POSTNET_FRAMES + 1 frames.
+
+    The "postnet" averages each frame with its POSTNET_FRAMES neighbours on either
+    side, the "vocoder" turns each frame into HOP_LENGTH samples that also depend on
+    the next frame; both repeat the edge frames at the borders of `mel`.
+    """
+    padded = np.pad(mel, ((POSTNET_FRAMES, POSTNET_FRAMES), (0, 0)), mode="edge")
+    window = 2 * POSTNET_FRAMES + 1
+    post = np.stack([padded[i:i + window].mean(axis=0) for i in range(len(mel))])
+    voc = post[start:stop]
+    following = np.concatenate([voc[1:], voc[-1:]]) if len(voc) else voc
+    frame_values = voc.sum(axis=1) + 0.5 * following.sum(axis=1)
+    ramp = np.linspace(0.0, 1.0, HOP_LENGTH, endpoint=False, dtype=np.float32)
+    return (frame_values[:, None] * (1.0 + ramp)).astype(np.float32).reshape(-1)
+
+
+def _steps(num_frames, reduction_factor=2, num_mel_bins=3, seed=0):
+    rng = np.random.default_rng(seed)
+    mel = rng.standard_normal((num_frames, num_mel_bins)).astype(np.float32)
+    return mel, [mel[i:i + reduction_factor] for i in range(0, num_frames, reduction_factor)]
+
+
+@pytest.mark.parametrize("num_frames", [2, 30, 64, 101])
+@pytest.mark.parametrize("window_frames", [4, 16])
+def test_incremental_vocoding_matches_whole_utterance(num_frames, window_frames):
+    mel, steps = _steps(num_frames)
+    pieces = []
+    vocoder = IncrementalVocoder(render, POSTNET_FRAMES, HOP_LENGTH, listener=lambda samples, last: pieces.append((samples, last)),
+                                 window_frames=window_frames, context_frames=4, overlap_frames=2)
+    for frames in steps:
+        vocoder.feed(frames)
+    samples = vocoder.finish()
+
+    whole = render(mel, 0, num_frames)
+    assert samples.shape == whole.shape
+    np.testing.assert_allclose(samples, whole, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(np.concatenate([piece for piece, _ in pieces]), whole, rtol=1e-5, atol=1e-5)
+    assert [last for _, last in pieces] == [False] * (len(pieces) - 1) + [True]
+
+
+def test_listener_gets_audio_before_the_utterance_ends():
+    _, steps = _steps(100)
+    pieces = []
+    vocoder = IncrementalVocoder(render, POSTNET_FRAMES, HOP_LENGTH, listener=lambda samples, last: pieces.append(samples),
+                                 window_frames=8, context_frames=4, overlap_frames=2)
+    for frames in steps[:len(steps) // 2]:
+        vocoder.feed(frames)
+    assert sum(len(piece) for piece in pieces) > 0
+
+
+def test_without_listener_finish_renders_in_one_pass():
+    mel, steps = _steps(40)
+    calls = []
+
+    def counting_render(mel, start, stop):
+        calls.append((start, stop))
+        return render(mel, start, stop)
+
+    vocoder = IncrementalVocoder(counting_render, POSTNET_FRAMES, HOP_LENGTH)
+    for frames in steps:
+        vocoder.feed(frames)
+    np.testing.assert_array_equal(vocoder.finish(), render(mel, 0, 40))
+    assert calls == [(0, 40)]
+
+
+def test_rows_stop_on_threshold_within_their_own_length_limits():
+    options = [DecodingOptions(threshold=0.5, minlenratio=2.0, maxlenratio=4.0)] * 3
+    # Text lengths 4, 8 and 8 with reduction factor 2: min/max steps 4/8, 8/16 and 8/16
+    stopping = StoppingCriteria([4, 8, 8], 2, options)
+    while stopping.active:
+        # Row 2 wants to stop right away, the others never do
+        stopping.step([0.0 if row != 2 else 1.0 for row in stopping.active])
+
+    assert stopping.row_steps == [8, 16, 8]
+    assert stopping.truncated == [0, 1]
+    # Row 0 and 2 stop together at step 8, then row 1 runs alone for 8 more steps
+    assert stopping.skipped_row_steps == 2 * 8
+
+
+def test_default_options_never_stop_before_the_threshold():
+    stopping = StoppingCriteria([10], 2, [DEFAULT_DECODING])
+    assert stopping.step([0.4]) == []
+    assert stopping.step([0.6]) == [0]
+    assert stopping.active == []
+    assert stopping.truncated == []
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    from transformers import SpeechT5Config, SpeechT5ForTextToSpeech
+
+    torch.manual_seed(0)
+    config = SpeechT5Config(
+        vocab_size=81, hidden_size=32, encoder_layers=2, decoder_layers=2, encoder_attention_heads=2,
+        decoder_attention_heads=2, encoder_ffn_dim=64, decoder_ffn_dim=64, speech_decoder_prenet_units=16,
+        speech_decoder_postnet_units=16, speaker_embedding_dim=8, num_mel_bins=8,
+        # Without dropout the prenet is deterministic, so both loops can be compared exactly
+        speech_decoder_prenet_dropout=0.0,
+    )
+    return SpeechT5ForTextToSpeech(config).eval()
+
+
+# Stop scores sum reduction_factor (2) probabilities, so rows run to their length limit
+UNREACHABLE = 3.0
+
+
+def _decode(model, input_ids, speaker_embeddings, options, attention_mask=None):
+    lengths = (input_ids != model.config.pad_token_id).sum(dim=1).tolist()
+    stopping = StoppingCriteria(lengths, model.config.reduction_factor, [options] * len(lengths))
+    spectra = {row: [] for row in range(len(lengths))}
+    for spectrum, rows, _ in decode_steps(model, input_ids, speaker_embeddings, stopping, attention_mask):
+        for pos, row in enumerate(rows):
+            spectra[row].append(spectrum[pos])
+    return [torch.cat(spectra[row]) for row in range(len(lengths))], stopping
+
+
+def test_decode_steps_matches_generate_speech(tiny_model):
+    torch.manual_seed(1)
+    input_ids = torch.randint(4, 81, (1, 12))
+    speaker_embeddings = torch.randn(1, 8)
+    options = DecodingOptions(threshold=UNREACHABLE, minlenratio=0.0, maxlenratio=3.0)
+
+    (spectrogram,), _ = _decode(tiny_model, input_ids, speaker_embeddings, options)
+    with torch.inference_mode():
+        # generate_speech returns the spectrogram after the postnet
+        expected = tiny_model.generate_speech(input_ids, speaker_embeddings, threshold=options.threshold,
+                                              minlenratio=options.minlenratio, maxlenratio=options.maxlenratio)
+        postnet = tiny_model.speech_decoder_postnet.postnet(spectrogram.unsqueeze(0)).squeeze(0)
+
+    assert len(spectrogram) == 2 * int(12 * 3.0 / 2)
+    torch.testing.assert_close(postnet, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_batched_rows_decode_like_single_rows(tiny_model):
+    torch.manual_seed(2)
+    pad = tiny_model.config.pad_token_id
+    short, long = torch.randint(4, 81, (5,)), torch.randint(4, 81, (14,))
+    input_ids = torch.full((2, 14), pad)
+    input_ids[0, :5] = short
+    input_ids[1] = long
+    attention_mask = (input_ids != pad).long()
+    speaker_embeddings = torch.randn(2, 8)
+    options = DecodingOptions(threshold=UNREACHABLE, minlenratio=0.0, maxlenratio=2.0)
+
+    batched, stopping = _decode(tiny_model, input_ids, speaker_embeddings, options, attention_mask)
+    alone_short, _ = _decode(tiny_model, short[None], speaker_embeddings[:1], options)
+    alone_long, _ = _decode(tiny_model, long[None], speaker_embeddings[1:], options)
+
+    # The short row leaves the batch at its own length limit instead of the padded one
+    assert batched[0].shape == alone_short[0].shape
+    assert stopping.skipped_row_steps > 0
+    torch.testing.assert_close(batched[0], alone_short[0], rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(batched[1], alone_long[0], rtol=1e-4, atol=1e-4)
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+import text_preprocessing as tp
+from bench_preprocessing import legacy_normalize, make_story
+
+EDGE_CASES = [
+    "",
+    "No numbers here.",
+    "It cost $5 and then £12.50, or €3.",
+    "Sales rose 45% on the 3rd day.",
+    "We met at 10:30 on 2024-01-05.",
+    "The 21st century began in 2001.",
+    "Rooms 101, 102 and 103 were free.",
+    "A ratio of 3:45:12 and 12:30%.",
+    "Prices: 5$10, 7% $3, 2nd$4, 1st%.",
+    "Dates like 2020-13-45 are invalid, 1999-12-31 is not.",
+    "2024-01-05:30 and 2024-01-05 10:15.",
+    "Full-width １２３ digits and ％ signs: ５０％.",
+    "Numbers glued to words: abc123 and 456def.",
+    "Decimals 3.14 and 0.5, versions 1.2.3.",
+]
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_normalize_text_matches_multi_pass_pipeline(text):
+    assert tp.normalize_text(text) == legacy_normalize(text)
+
+
+def test_normalize_text_matches_multi_pass_pipeline_on_stories():
+    rng = random.Random(1234)
+    for _ in range(50):
+        story = make_story(rng, 8)
+        assert tp.normalize_text(story) == legacy_normalize(story)
+
+
+def test_chunks_respect_token_budget_and_keep_every_word():
+    rng = random.Random(99)
+    story = " ".join(make_story(rng, 40) for _ in range(3))
+    chunks = tp.preprocess_for_tts(story, max_tokens=120, min_tokens=20)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 120 + 20 for chunk in chunks)
+    assert " ".join(chunks) == tp.normalize_text(story)
+
+
+def test_long_sentence_splits_at_clauses_then_spaces():
+    clause = "the little fox ran over the hill"
+    sentence = ", ".join([clause] * 6) + "."
+    chunks = tp.preprocess_for_tts(sentence, max_tokens=80, min_tokens=10)
+
+    assert all(len(chunk) <= 90 for chunk in chunks)
+    assert all(chunk.startswith("the little fox") for chunk in chunks)
+
+    word = "supercalifragilistic"
+    chunks = tp.preprocess_for_tts(" ".join([word] * 10), max_tokens=45, min_tokens=0)
+    assert all(len(chunk) <= 45 for chunk in chunks)
+    assert " ".join(chunks) == " ".join([word] * 10) + "."
+
+
+def test_tiny_fragment_merges_into_neighbour():
+    # The joining space counts as a token, so the two sentences need 95
+    text = "A" * 90 + ". Hi."
+    assert tp.preprocess_for_tts(text, max_tokens=92, min_tokens=10) == ["A" * 90 + ". Hi."]
+    assert tp.preprocess_for_tts(text, max_tokens=92, min_tokens=0) == ["A" * 90 + ".", "Hi."]
+
+
+def test_custom_token_counter():
+    # Count words instead of characters; the space joining two sentences adds one
+    chunks = tp.preprocess_for_tts("one two three. four five six. seven eight nine.", max_tokens=7, min_tokens=0,
+                                   count_tokens=lambda text: len(text.split()))
+    assert chunks == ["one two three. four five six.", "seven eight nine."]
+
+
+def test_empty_text_has_no_chunks():
+    assert tp.preprocess_for_tts("   ") == []
+
+
+def test_chunks_are_yielded_before_the_rest_is_normalized(monkeypatch):
+    normalized = []
+    normalize_text = tp.normalize_text
+    monkeypatch.setattr(tp, "normalize_text", lambda text: normalized.append(text) or normalize_text(text))
+
+    sentences = [f"Sentence number {i} is here." for i in range(50)]
+    chunks = tp.iter_tts_chunks(" ".join(sentences), max_tokens=60, min_tokens=0)
+    first = next(chunks)
+
+    assert first.startswith("Sentence number zero")
+    assert len(normalized) < 10
+    assert [first, *chunks] == tp.preprocess_for_tts(" ".join(sentences), max_tokens=60, min_tokens=0)
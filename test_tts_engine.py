@@ -0,0 +1,327 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from audio_format import build_wav, float_to_pcm16
+from cancellation import CancellationToken, RequestCancelled
+from tts_engine import TextToSpeechEngine
+
+# Each sentence is its own chunk with a 16 token budget (one token per character)
+FOX, DOG, CAT = "The fox ran.", "A dog slept.", "Cats sat."
+
+
+def _waveform(text):
+    return np.array([ord(c) / 256.0 for c in text], dtype=np.float32)
+
+
+def _pcm(text):
+    return float_to_pcm16(_waveform(text))
+
+
+class StepGate:
+    """Lets one forward pass through per step(), or all of them after set()"""
+
+    def __init__(self):
+        self._steps = threading.Semaphore(0)
+        self._entered = threading.Condition()
+        self.passes = 0
+
+    def wait(self):
+        with self._entered:
+            self.passes += 1
+            self._entered.notify_all()
+        self._steps.acquire()
+
+    def wait_for_pass(self, n):
+        """Block until the n-th forward pass has started"""
+        with self._entered:
+            assert self._entered.wait_for(lambda: self.passes >= n, timeout=5)
+
+    def step(self):
+        self._steps.release()
+
+    def set(self):
+        self._steps.release(100)
+
+
+class StubEngine(TextToSpeechEngine):
+    """The engine without models: a chunk's waveform encodes its text, and the batches are recorded"""
+
+    def __init__(self, gate=None, **kwargs):
+        self.gate = gate
+        self.batches = []
+        self.batch_voices = []
+        kwargs.setdefault("max_chunk_tokens", 16)
+        kwargs.setdefault("min_chunk_tokens", 1)
+        kwargs.setdefault("disk_cache_max_bytes", 0)
+        kwargs.setdefault("incremental_vocoding", False)
+        super().__init__(**kwargs)
+
+    def _load_models(self):
+        self.processor = SimpleNamespace(tokenizer=SimpleNamespace(tokenize=list))
+        self.model_config = SimpleNamespace(max_text_positions=600)
+
+    def _load_embeddings(self):
+        self.voice_embeddings = {"slt": None, "bdl": None, "default": None}
+
+    def _get_model_revision(self):
+        return "stub"
+
+    def _synthesize_batch(self, texts, voice_ids, listeners=None, decodings=None):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(list(texts))
+        self.batch_voices.append(list(voice_ids))
+        waveforms = [_waveform(text) for text in texts]
+        # Progressive chunks get their audio in two pieces
+        for waveform, listener in zip(waveforms, listeners or []):
+            if listener is not None:
+                half = len(waveform) // 2
+                listener(waveform[:half], False)
+                listener(waveform[half:], True)
+        return waveforms
+
+    def synthesized(self):
+        return [text for batch in self.batches for text in batch]
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    engines = []
+
+    def make(**kwargs):
+        kwargs.setdefault("cache_dir", str(tmp_path / "cache"))
+        engine = StubEngine(**kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        if engine.gate is not None:
+            engine.gate.set()
+        engine.shutdown()
+
+
+def test_parallel_chunks_are_reassembled_in_text_order(make_engine):
+    engine = make_engine(max_batch_size=8, max_batch_wait_ms=200)
+    audio, chunks, _ = engine.generate(f"{FOX} {DOG} {CAT}")
+    assert chunks == [FOX, DOG, CAT]
+    assert audio == build_wav([_pcm(FOX), _pcm(DOG), _pcm(CAT)])
+    # Submitted shortest first so similar lengths share a batch, in one forward pass
+    assert engine.batches == [[CAT, FOX, DOG]]
+
+
+def test_sequential_chunks_are_reassembled_in_text_order(make_engine):
+    engine = make_engine(parallel_chunks=False, max_batch_wait_ms=1)
+    audio, chunks, _ = engine.generate(f"{FOX} {DOG} {CAT}")
+    assert audio == build_wav([_pcm(FOX), _pcm(DOG), _pcm(CAT)])
+    assert engine.batches == [[FOX], [DOG], [CAT]]
+
+
+def test_concurrent_requests_join_a_chunk_in_flight(make_engine):
+    gate = StepGate()
+    engine = make_engine(gate=gate, max_batch_size=1, max_batch_wait_ms=1)
+    first = engine._get_chunk_future(FOX, "slt", engine.decoding)
+    second = engine._get_chunk_future(FOX, "slt", engine.decoding)
+    assert second is first
+    # Another voice is a different chunk
+    other_voice = engine._get_chunk_future(FOX, "bdl", engine.decoding)
+    assert other_voice is not first
+
+    gate.set()
+    assert first.result(timeout=5) == _pcm(FOX)
+    other_voice.result(timeout=5)
+    assert engine.synthesized() == [FOX, FOX]
+    assert engine.inflight_chunks.get_stats()["coalesced"] == 1
+
+
+def test_cancelled_request_drops_its_queued_chunks(make_engine):
+    gate = StepGate()
+    engine = make_engine(gate=gate, max_batch_size=1, max_batch_wait_ms=1)
+    token = CancellationToken()
+    errors = []
+
+    def run():
+        try:
+            engine.generate(f"{FOX} {DOG} {CAT}", token=token)
+        except RequestCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    # CAT is in the (blocked) forward pass, FOX and DOG wait behind it
+    gate.wait_for_pass(1)
+    while engine.queue_depth() < 2:
+        time.sleep(0.001)
+    token.cancel()
+    thread.join(5)
+    gate.set()
+    engine.batch_scheduler.shutdown()
+
+    assert len(errors) == 1
+    # CAT's forward pass still finishes and is cached, the queued chunks never run
+    assert engine.synthesized() == [CAT]
+    assert engine.get_stats()["cancellation"] == {"requests": 1, "abandoned_chunks": 3}
+    assert engine.batch_scheduler.get_stats()["dropped_cancelled"] == 2
+    assert engine.chunk_cache.get((CAT, "default", engine.decoding)) == _pcm(CAT)
+
+
+def test_abandoning_a_shared_chunk_keeps_it_for_the_other_request(make_engine):
+    gate = StepGate()
+    engine = make_engine(gate=gate, max_batch_size=1, max_batch_wait_ms=1)
+    # A blocker holds the model so the shared chunk stays queued
+    engine._get_chunk_future(CAT, "slt", engine.decoding)
+    gate.wait_for_pass(1)
+    mine = engine._get_chunk_future(FOX, "slt", engine.decoding)
+    theirs = engine._get_chunk_future(FOX, "slt", engine.decoding)
+
+    engine._abandon_chunks([(FOX, mine)], "slt", engine.decoding)
+    assert not theirs.cancelled()
+    assert engine.abandoned_chunks == 0
+
+    # The last interested request leaving takes it out of the queue
+    engine._abandon_chunks([(FOX, theirs)], "slt", engine.decoding)
+    assert theirs.cancelled()
+    assert engine.abandoned_chunks == 1
+    gate.set()
+    engine.batch_scheduler.shutdown()
+    assert engine.synthesized() == [CAT]
+
+
+def test_stream_queues_lookahead_chunks_ahead_of_the_one_returned(make_engine):
+    engine = make_engine(max_batch_wait_ms=1)
+    submitted = []
+    submit = engine.batch_scheduler.submit
+    engine.batch_scheduler.submit = lambda text, *args, **kwargs: submitted.append(text) or submit(text, *args, **kwargs)
+
+    text = f"{FOX} {DOG} {CAT} The end."
+    stream = engine.stream(text, lookahead=1)
+    seen = []
+    for chunk, pcm, _, is_last in stream:
+        seen.append((chunk, pcm, is_last, len(submitted)))
+
+    assert [chunk for chunk, *_ in seen] == [FOX, DOG, CAT, "The end."]
+    assert [pcm for _, pcm, *_ in seen] == [_pcm(FOX), _pcm(DOG), _pcm(CAT), _pcm("The end.")]
+    assert [is_last for *_, is_last, _ in seen] == [False, False, False, True]
+    # The returned chunk plus one ahead are queued before it is handed out, no more
+    assert [count for *_, count in seen] == [3, 4, 4, 4]
+
+
+def test_stream_delivers_progressive_pieces(make_engine):
+    engine = make_engine(incremental_vocoding=True, max_batch_wait_ms=1)
+    pieces = list(engine.stream(f"{FOX} {DOG}"))
+
+    assert [chunk for chunk, *_ in pieces] == [FOX, None, DOG, None]
+    assert [is_last for *_, is_last in pieces] == [False, False, False, True]
+    assert pieces[0][1] + pieces[1][1] == _pcm(FOX)
+    assert pieces[2][1] + pieces[3][1] == _pcm(DOG)
+
+
+def test_closing_a_stream_abandons_its_queued_chunks(make_engine):
+    gate = StepGate()
+    engine = make_engine(gate=gate, max_batch_size=1, max_batch_wait_ms=1)
+    stream = engine.stream(f"{FOX} {DOG} {CAT}", lookahead=2)
+    gate.step()
+    assert next(stream)[0] == FOX
+    # DOG is in the (blocked) forward pass and CAT waits behind it
+    gate.wait_for_pass(2)
+    assert engine.queue_depth() == 1
+    stream.close()
+    gate.set()
+    engine.batch_scheduler.shutdown()
+
+    assert engine.get_stats()["cancellation"] == {"requests": 1, "abandoned_chunks": 2}
+    assert engine.synthesized() == [FOX, DOG]
+    assert engine.batch_scheduler.get_stats()["dropped_cancelled"] == 1
+    # DOG was cached anyway, CAT never ran
+    assert engine.chunk_cache.get((DOG, "default", engine.decoding)) == _pcm(DOG)
+
+
+def test_overlapping_request_is_served_from_the_chunk_cache(make_engine):
+    engine = make_engine(max_batch_wait_ms=1)
+    engine.generate(f"{FOX} {DOG}")
+    batches = len(engine.batches)
+
+    # Another text made of the same chunks misses the whole-request cache only
+    audio, chunks, _ = engine.generate(f"{DOG} {FOX}")
+    assert chunks == [DOG, FOX]
+    assert audio == build_wav([_pcm(DOG), _pcm(FOX)])
+    assert len(engine.batches) == batches
+    assert engine.chunk_cache.get_stats()["hits"] == 2
+
+
+def test_repeated_stream_is_served_from_the_chunk_cache(make_engine):
+    engine = make_engine(incremental_vocoding=True, max_batch_wait_ms=1)
+    first = list(engine.stream(f"{FOX} {DOG}"))
+    engine.batch_scheduler.submit = lambda *args, **kwargs: pytest.fail("cached chunk reached the scheduler")
+
+    # Cached chunks come back whole, not in pieces
+    second = list(engine.stream(f"{FOX} {DOG}"))
+    assert [(chunk, pcm, is_last) for chunk, pcm, _, is_last in second] == [
+        (FOX, _pcm(FOX), False),
+        (DOG, _pcm(DOG), True),
+    ]
+    assert b"".join(pcm for _, pcm, _, _ in first) == _pcm(FOX) + _pcm(DOG)
+    # Both cache paths feed one another: generate() of the streamed text synthesizes nothing
+    assert engine.generate(f"{FOX} {DOG}")[0] == build_wav([_pcm(FOX), _pcm(DOG)])
+
+
+def test_chunk_is_cached_before_its_future_resolves(make_engine):
+    engine = make_engine(max_batch_wait_ms=1)
+    seen = []
+
+    def on_done(future):
+        # A request arriving right after the shared future is forgotten must hit the cache
+        seen.append(engine.chunk_cache.get((FOX, "slt", engine.decoding)))
+        seen.append(engine._get_chunk_future(FOX, "slt", engine.decoding).done())
+
+    future = engine._get_chunk_future(FOX, "slt", engine.decoding)
+    future.add_done_callback(on_done)
+    assert future.result(timeout=5) == _pcm(FOX)
+    assert seen == [_pcm(FOX), True]
+    assert engine.synthesized() == [FOX]
+
+
+def test_chunk_cache_is_keyed_by_voice_and_decoding(make_engine):
+    engine = make_engine(max_batch_wait_ms=1)
+    engine.generate(FOX, voice="bdl")
+    engine.generate(FOX, voice="bdl", decoding={"threshold": 0.7})
+    engine.generate(FOX, voice="slt")
+    assert engine.synthesized() == [FOX, FOX, FOX]
+    assert engine.chunk_cache.get_stats()["hits"] == 0
+
+
+def test_warm_up_runs_every_batch_size_over_every_voice(make_engine):
+    engine = make_engine(incremental_vocoding=True)
+    engine.warm_up(batch_sizes=(1, 2), text="Hello there.")
+
+    # voice_map names resolve to the two loaded voices; the last pass is the incremental vocoder
+    assert engine.batch_voices == [["bdl"], ["slt"], ["bdl", "slt"], ["bdl"]]
+    assert all(text == "Hello there." for text in engine.synthesized())
+    assert "warm_up" in engine.startup_times
+
+
+def test_precompute_synthesizes_each_phrase_once_per_voice(make_engine):
+    engine = make_engine(max_batch_wait_ms=1)
+    engine.precompute([FOX, f"{DOG} {CAT}"])
+
+    synthesized = sorted(zip(engine.synthesized(), (voice for batch in engine.batch_voices for voice in batch)))
+    assert synthesized == sorted((chunk, voice) for chunk in (FOX, DOG, CAT) for voice in ("bdl", "slt"))
+    # Every name clients may send is answered from the whole-request cache
+    for voice in engine.voice_map:
+        assert engine.audio_cache.get(engine._get_cache_key(FOX, voice, engine.decoding)) is not None
+
+
+def test_precompute_skips_phrases_already_in_the_disk_cache(make_engine):
+    first = make_engine(max_batch_wait_ms=1, disk_cache_max_bytes=1024 * 1024)
+    first.precompute([FOX])
+    first.disk_cache.flush()
+
+    # A restart (or another worker) mounting the same cache directory loads them from disk
+    second = make_engine(max_batch_wait_ms=1, disk_cache_max_bytes=1024 * 1024)
+    second.precompute([FOX])
+    assert second.batches == []
+    assert second.generate(FOX, "US Male 1")[0] == first.generate(FOX, "US Male 1")[0]
@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import worker_pool
+from cancellation import CancellationToken, RequestCancelled
+from worker_pool import ProcessWorkerPool
+
+
+class StubEngine:
+    """What the worker functions call on a replica; "slow" work waits for `gate`"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.chunking = {"max_tokens": 16, "min_tokens": 1}
+        self.generated = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, name, *args):
+        with self._lock:
+            self.calls.append((name, threading.get_ident()) + args)
+
+    def generate(self, text, voice="default", token=None, decoding=None):
+        if text.startswith("slow"):
+            self.gate.wait(5)
+        self.generated.append(text)
+        return text.upper().encode(), [text], 0.0
+
+    def generate_chunk_pcm(self, text, voice="default", token=None, decoding=None):
+        # The first chunk takes longest, so the ones behind it finish first
+        if text == "The fox ran.":
+            time.sleep(0.1)
+        self.generated.append(text)
+        return text.encode(), 0.0
+
+    def warm_up(self, batch_sizes):
+        self._record("warm_up", tuple(batch_sizes))
+
+    def precompute(self, phrases):
+        self._record("precompute", tuple(phrases))
+
+    def shutdown(self):
+        self._record("shutdown")
+
+
+class ThreadWorkers(ThreadPoolExecutor):
+    """Runs the worker functions on threads sharing one stub replica, with the pool's barrier"""
+
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        super().__init__(max_workers, initializer=self._init, initargs=(initargs[0],))
+
+    @staticmethod
+    def _init(barrier):
+        worker_pool._barrier = barrier
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = StubEngine()
+    monkeypatch.setattr(worker_pool, "_engine", engine)
+    monkeypatch.setattr(worker_pool, "_barrier", None)
+    monkeypatch.setattr(worker_pool, "ProcessPoolExecutor", ThreadWorkers)
+    yield engine
+    engine.gate.set()
+
+
+def test_broadcast_runs_once_in_every_worker(engine):
+    pool = ProcessWorkerPool(3, {}, pin_cores=False)
+    pool.warm_up((1, 4))
+    pool.shutdown()
+
+    for name in ("warm_up", "shutdown"):
+        calls = [call for call in engine.calls if call[0] == name]
+        assert len(calls) == 3
+        # No worker picked up two copies while another got none
+        assert len({call[1] for call in calls}) == 3
+    assert {call[2] for call in engine.calls if call[0] == "warm_up"} == {(1, 4)}
+
+
+def test_precompute_fills_the_disk_cache_once_then_every_worker(engine):
+    pool = ProcessWorkerPool(2, {}, pin_cores=False)
+    pool.precompute(["Once upon a time."])
+    pool.shutdown()
+
+    assert [call[2] for call in engine.calls if call[0] == "precompute"] == [("Once upon a time.",)] * 3
+    assert set(pool.startup_times) == {"workers", "phrases"}
+
+
+def test_cancelled_call_that_has_not_started_never_runs(engine):
+    pool = ProcessWorkerPool(1, {}, pin_cores=False)
+    busy = threading.Thread(target=pool.generate, args=("slow story",))
+    busy.start()
+    while pool.queue_depth() < 1:
+        time.sleep(0.001)
+
+    # The only worker is busy, so this call is still queued when its deadline passes
+    with pytest.raises(RequestCancelled):
+        pool.generate("queued story", token=CancellationToken.with_timeout(0.05))
+    engine.gate.set()
+    busy.join(5)
+    pool.shutdown()
+
+    assert engine.generated == ["slow story"]
+    stats = pool.get_stats()
+    assert stats["cancelled"] == 1
+    assert stats["completed"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_generate_returns_the_worker_result(engine):
+    pool = ProcessWorkerPool(2, {}, pin_cores=False)
+    assert pool.generate("The end.") == (b"THE END.", ["The end."], 0.0)
+    pool.shutdown()
+
+
+def test_stream_yields_chunks_in_text_order(engine):
+    pool = ProcessWorkerPool(3, {}, pin_cores=False)
+    text = "The fox ran. A dog slept. Cats sat. The end."
+    replies = list(pool.stream(text))
+    pool.shutdown()
+
+    expected = ["The fox ran.", "A dog slept.", "Cats sat.", "The end."]
+    assert [chunk for chunk, *_ in replies] == expected
+    assert [pcm for _, pcm, *_ in replies] == [chunk.encode() for chunk in expected]
+    assert [is_last for *_, is_last in replies] == [False, False, False, True]
+    # The workers finished the chunks behind the first one before it; the last chunk is
+    # only queued once the first is returned, num_workers chunks are in flight at a time
+    assert set(engine.generated[:2]) == {"A dog slept.", "Cats sat."}
+    assert engine.generated[2:] == ["The fox ran.", "The end."]